@@ -0,0 +1,56 @@
+"""
+Per-request analysis context for Eclipse Shield.
+The user's task answers travel with each analysis as an immutable value
+instead of living on the shared ProductivityAnalyzer, so one analyzer can
+serve concurrent requests from threaded or green-threaded workers without
+one user's context leaking into another's analysis.
+"""
+
+from dataclasses import dataclass, field
+from functools import cached_property
+from types import MappingProxyType
+from typing import Any, Mapping
+
+from coalesce import context_fingerprint
+
+
+@dataclass(frozen=True, eq=False)
+class AnalysisContext:
+    """Immutable task context (question -> answer) for one analysis request."""
+
+    answers: Mapping[str, str] = field(default_factory=dict)
+
+    def __post_init__(self):
+        # Copy, then expose read-only, so later changes by the caller cannot reach us.
+        object.__setattr__(self, 'answers', MappingProxyType(dict(self.answers)))
+
+    @classmethod
+    def from_request(cls, context: Any) -> 'AnalysisContext':
+        """Build from a request's context: a dict, or a list of {question, answer} items."""
+        if isinstance(context, list):
+            answers = {}
+            for qa in context:
+                if isinstance(qa, dict):
+                    question = qa.get('question', '')
+                    answer = qa.get('answer', '')
+                    if question and answer:
+                        answers[question] = answer
+            return cls(answers)
+        return cls(context if isinstance(context, dict) else {})
+
+    def __bool__(self) -> bool:
+        return bool(self.answers)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, AnalysisContext) and dict(self.answers) == dict(other.answers)
+
+    def __hash__(self) -> int:
+        return hash(self.fingerprint)
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """Stable short hash of the answers (see coalesce.context_fingerprint)."""
+        return context_fingerprint(self.answers)
+
+
+EMPTY_CONTEXT = AnalysisContext()
@@ -1,6 +1,14 @@
-from flask import Flask, request, jsonify, make_response, send_from_directory, render_template, session, redirect
+from flask import Flask, request, jsonify, make_response, send_from_directory, render_template, session, redirect, g
 from flask_cors import CORS
 from script import ProductivityAnalyzer
+from coalesce import SingleFlight, coalesce_key
+from verdict_cache import create_verdict_cache, shared_verdict_key
+from ttl_cache import TTLCache
+from canonical import canonical_url
+from analysis_context import AnalysisContext
+from log_config import LOG_LEVEL
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, CACHE_LOOKUPS, render_metrics, timed_endpoint
+from tracing import DEBUG_TRACE, SERVER_TIMING, add_server_timing_headers, current_trace, decided_by, end_trace, span, start_trace
 import logging
 from functools import lru_cache
 from urllib.parse import urlparse
@@ -32,11 +40,11 @@ app = Flask(__name__,
 )
 app.secret_key = 'secret_key_here' # CHANGE THIS IN PRODUCTION
 
-# Enable detailed logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Logging level comes from LOG_LEVEL (set LOG_LEVEL=DEBUG for detailed logging)
+logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 app.logger.handlers = logger.handlers # Use the same handlers
-app.logger.setLevel(logging.DEBUG) # Set Flask app logger level too
+app.logger.setLevel(LOG_LEVEL) # Set Flask app logger level too
 
 # --- PID File Configuration ---
 PID_FILE = "flask_app.pid" # Name of the file to store the PID
@@ -114,9 +122,10 @@ atexit.register(remove_pid_file)
 
 
 # Configure CORS (Keep existing CORS config)
+CORS_ORIGINS = ["http://localhost:5000", "chrome-extension://*"]
 CORS(app,
      resources={r"/*": {
-         "origins": ["http://localhost:5000", "chrome-extension://*"],
+         "origins": CORS_ORIGINS,
          "methods": ["GET", "POST", "OPTIONS"],
          "allow_headers": ["Content-Type", "Authorization", "Accept"],
          "supports_credentials": True,
@@ -125,31 +134,56 @@ CORS(app,
      }})
 
 analyzer = ProductivityAnalyzer()
+# Collapses identical concurrent analyses (same URL, domain and context) into one model call
+analysis_flight = SingleFlight()
+# Cache shared by all workers (Redis via REDIS_URL); None keeps caching per worker
+shared_cache = create_verdict_cache()
 
 # Cache structure and functions (Keep existing)
-url_cache = {
-    'data': {},
-    'timestamps': {},
-    'session_ids': {}
-}
 CACHE_DURATION = 60
+BATCH_MAX_URLS = 100 # Maximum URLs accepted by /analyze/batch in one request
+CACHE_MAX_ENTRIES = int(os.getenv("ECLIPSE_SHIELD_CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.getenv("ECLIPSE_SHIELD_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Per-worker verdict cache keyed by (canonical URL, domain); entries are tagged with the session ID
+url_cache = TTLCache(CACHE_DURATION, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES)
+
 def clear_expired_cache():
-    # ... (keep existing implementation)
-    current_time = time.time()
-    expired = []
-    lock = threading.Lock() # Add lock for thread safety if clearing from multiple places
-    with lock:
-        for url in list(url_cache['timestamps']): # Iterate over copy of keys
-            if current_time - url_cache['timestamps'][url] > CACHE_DURATION:
-                expired.append(url)
-
-        for url in expired:
-            if url in url_cache['data']: del url_cache['data'][url]
-            if url in url_cache['timestamps']: del url_cache['timestamps'][url]
-            if url in url_cache['session_ids']: del url_cache['session_ids'][url]
-        if expired:
-            logger.debug(f"Cleared {len(expired)} expired cache entries.")
+    expired = url_cache.expire()
+    if expired:
+        logger.debug("clear_expired_cache - Cleared %s expired cache entries.", expired)
+
+def invalidate_policy_verdicts(old_policy, new_policy, change):
+    """Drop cached verdicts that the reloaded settings.json may have changed."""
+    stale = url_cache.delete_where(lambda key: change.affects(*key))
+    logger.info("invalidate_policy_verdicts - Policy reloaded (%s -> %s); invalidated %s cached verdicts.", old_policy.version, new_policy.version, stale)
+
+analyzer.policy_watcher.add_listener(invalidate_policy_verdicts)
+
+
+TRACED_ENDPOINTS = {'analyze', 'analyze_batch', 'get_question'}
 
+@app.before_request
+def start_request_trace():
+    """Trace the analysis endpoints; spans from the analyzer land in this trace."""
+    if request.endpoint in TRACED_ENDPOINTS:
+        g.trace, g.trace_token = start_trace(request.endpoint)
+
+# Registered before after_request below, so it runs after it (Flask runs after_request hooks in reverse)
+# and merges Server-Timing into the CORS expose list instead of being overwritten
+@app.after_request
+def add_server_timing(response):
+    """Report the request's stage timings and deciding stage in a Server-Timing header."""
+    trace = g.get('trace')
+    if trace is not None and SERVER_TIMING:
+        add_server_timing_headers(response.headers, trace, request.headers.get('Origin'), CORS_ORIGINS)
+    return response
+
+@app.teardown_request
+def end_request_trace(error=None):
+    token = g.pop('trace_token', None)
+    if token is not None:
+        end_trace(token)
 
 @app.after_request
 def after_request(response):
@@ -166,6 +200,14 @@ def after_request(response):
             })
     return response
 
+def timed_jsonify(payload):
+    """jsonify under the 'serialize' stage, adding the trace when the client asked for it."""
+    trace = current_trace()
+    if DEBUG_TRACE and trace is not None and (request.get_json(silent=True) or {}).get('debug_trace') is True:
+        payload = dict(payload, trace=trace.to_dict())
+    with span('serialize'):
+        return jsonify(payload)
+
 # --- Routes (Keep existing routes) ---
 
 @app.route('/matrix-animation')
@@ -228,12 +270,20 @@ def extension_files(filename):
         app.logger.error(f"Error serving {filename}: {e}")
         return f"Error loading {filename}", 404
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics summed over all workers."""
+    response = make_response(render_metrics())
+    response.headers['Content-Type'] = METRICS_CONTENT_TYPE
+    return response
+
 @app.route('/get_question', methods=['POST'])
+@timed_endpoint('get_question')
 def get_question():
     # ... (keep existing implementation)
     try:
         data = request.get_json()
-        app.logger.debug(f"Received get_question request with data: {data}")
+        app.logger.debug("get_question - Received request with data: %s", data)
         domain = data.get('domain')
         context = data.get('context', {})
         if not domain:
@@ -241,7 +291,7 @@ def get_question():
         response = analyzer.get_next_question(domain, context)
         return jsonify(response)
     except Exception as e:
-        app.logger.error(f"Error in get_question: {e}")
+        app.logger.error("get_question - Error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/contextualize', methods=['POST'])
@@ -257,15 +307,16 @@ def contextualize():
         session['domain'] = domain
         return jsonify({"status": "success"})
     except Exception as e:
-        app.logger.error(f"Error in contextualize: {e}")
+        app.logger.error("contextualize - Error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/analyze', methods=['POST'])
+@timed_endpoint('analyze')
 def analyze():
     # ... (keep existing implementation)
     try:
         data = request.get_json()
-        logger.debug(f"Received analyze request with data: {data}")
+        logger.debug("analyze - Received request with data: %s", data)
         # ... (rest of analyze logic remains the same)
         url = data.get('url')
         domain = data.get('domain')
@@ -277,43 +328,44 @@ def analyze():
         if not url or not domain:
             return jsonify({'error': 'Missing required fields'}), 400
 
-        clear_expired_cache()
-
-        cache_key = f"{url}-{domain}"
-        current_time = time.time()
-
-        if (cache_key in url_cache['data'] and
-            url_cache['session_ids'].get(cache_key) == session_id and # Use .get for safety
-            current_time - url_cache['timestamps'].get(cache_key, 0) <= CACHE_DURATION): # Use .get for safety
-            logger.debug(f"Cache hit for {url}")
-            return jsonify(url_cache['data'][cache_key])
-
-        # Convert context array to dictionary format
-        if isinstance(context, list):
-            context_dict = {}
-            for qa in context:
-                if isinstance(qa, dict):
-                    question = qa.get('question', '')
-                    answer = qa.get('answer', '')
-                    if question and answer:
-                        context_dict[question] = answer
-            logger.debug(f"Converted context to dictionary: {context_dict}")
-        else:
-            context_dict = context if isinstance(context, dict) else {}
-
-        analyzer.context_data = context_dict
-        logger.info(f"Set analyzer context to: {context_dict}")
+        with span('canonicalize'):
+            cache_key = (canonical_url(url), domain)
+        with span('cache'):
+            cached = url_cache.get(cache_key, session_id)
+        CACHE_LOOKUPS.inc(layer='url_cache', result='miss' if cached is None else 'hit')
+        if cached is not None:
+            logger.debug("analyze - Cache hit for %s", url)
+            decided_by('cache')
+            return timed_jsonify(cached)
+
+        # The context travels with this request only; the shared analyzer is never mutated
+        analysis_context = AnalysisContext.from_request(context)
+        context_dict = dict(analysis_context.answers)
+
+        # Shared entries are keyed by context rather than session, like the verdict store
+        shared_key = shared_verdict_key(analyzer.policy.version, domain, context_dict, url)
+        if shared_cache is not None:
+            with span('cache'):
+                shared = shared_cache.get(shared_key)
+            CACHE_LOOKUPS.inc(layer='shared', result='miss' if shared is None else 'hit')
+            if shared is not None:
+                logger.debug("analyze - Shared cache hit for %s", url)
+                decided_by('shared_cache')
+                url_cache.set(cache_key, shared, session_id)
+                return timed_jsonify(shared)
+
+        logger.debug("analyze - Analyzing with context: %s", context_dict)
 
         try:
             additional_signals = {}
             if is_direct_visit:
                 additional_signals['is_direct_visit'] = True
-                logger.debug(f"Processing direct visit for URL: {url}")
+                logger.debug("analyze - Processing direct visit for URL: %s", url)
 
             search_query = None
             is_search_engine_referrer = False
             if referrer:
-                logger.debug(f"Processing referrer information: {referrer}")
+                logger.debug("analyze - Processing referrer information: %s", referrer)
                 parsed_referrer = urlparse(referrer)
                 if any(search_domain in parsed_referrer.netloc.lower() for search_domain in
                        ['google.com', 'bing.com', 'duckduckgo.com', 'yahoo.com', 'brave.com', 'startpage.com']):
@@ -328,19 +380,20 @@ def analyze():
                                 from urllib.parse import unquote_plus
                                 search_query = unquote_plus(value)
                                 additional_signals['search_query'] = search_query
-                                logger.debug(f"Extracted search query: {search_query}")
+                                logger.debug("analyze - Extracted search query: %s", search_query)
                                 break
 
             url_signals = analyzer._analyze_url_components(url)
             if additional_signals:
                 url_signals.update(additional_signals)
-                logger.debug(f"Enhanced URL signals with referrer/direct visit data: {url_signals}")
+                logger.debug("analyze - Enhanced URL signals with referrer/direct visit data: %s", url_signals)
 
-            context_relevance = analyzer._check_context_relevance(url, url_signals)
+            context_relevance = analyzer._check_context_relevance(url, url_signals, analysis_context)
 
             if is_search_engine_referrer and search_query:
                 if len(search_query.strip()) < 3:
-                    logger.info(f"Blocking URL due to very short search query: '{search_query}'")
+                    logger.info("analyze - Blocking URL due to very short search query: '%s'", search_query)
+                    decided_by('search_query')
                     # ... (return block response)
                     return jsonify({
                         'isProductive': False,
@@ -351,7 +404,8 @@ def analyze():
                         'search_query_blocked': True
                     })
                 if context_dict and context_relevance.get('score', 0) < 0.4:
-                    logger.info(f"Blocking URL due to low context relevance for search query: '{search_query}', score: {context_relevance.get('score', 0)}")
+                    logger.info("analyze - Blocking URL due to low context relevance for search query: '%s', score: %s", search_query, context_relevance.get('score', 0))
+                    decided_by('search_query')
                     # ... (return block response)
                     return jsonify({
                         'isProductive': False,
@@ -362,8 +416,11 @@ def analyze():
                         'search_query_blocked': True
                     })
 
-            analysis_result = analyzer.analyze_website(url, domain)
-            logger.info(f"Analysis result for {url}: {analysis_result}")
+            analysis_result = analysis_flight.do(
+                coalesce_key(url, domain, context_dict),
+                lambda: analyzer.analyze_website(url, domain, analysis_context)
+            )
+            logger.debug("analyze - Analysis result for %s: %s", url, analysis_result)
 
             result = {
                 'isProductive': analysis_result['isProductive'],
@@ -376,18 +433,18 @@ def analyze():
                 'direct_visit': is_direct_visit
             }
 
-            url_cache['data'][cache_key] = result
-            url_cache['timestamps'][cache_key] = current_time
-            url_cache['session_ids'][cache_key] = session_id
-            logger.debug(f"Cached result for {url}")
+            url_cache.set(cache_key, result, session_id)
+            if shared_cache is not None:
+                shared_cache.set(shared_key, result, CACHE_DURATION)
+            logger.debug("analyze - Cached result for %s", url)
 
             if is_direct_visit:
-                logger.info(f"Direct visit analysis result for {url}: isProductive={result['isProductive']}, explanation={result['explanation']}")
+                logger.debug("analyze - Direct visit analysis result for %s: isProductive=%s, explanation=%s", url, result['isProductive'], result['explanation'])
 
-            return jsonify(result)
+            return timed_jsonify(result)
 
         except Exception as e:
-            logger.exception(f"Error analyzing URL internal block: {url}") # Log stack trace
+            logger.exception("analyze - Error analyzing URL internal block: %s", url) # Log stack trace
             return jsonify({
                 'error': str(e),
                 'isProductive': False, # Default to non-productive on error
@@ -402,6 +459,91 @@ def analyze():
             'explanation': f'Error processing request: {str(e)}'
         }), 500
 
+@app.route('/analyze/batch', methods=['POST'])
+@timed_endpoint('analyze_batch')
+def analyze_batch():
+    """Analyze a list of URLs (e.g. every link on a page) that share one domain and context."""
+    try:
+        data = request.get_json()
+        logger.debug("analyze_batch - Received request with data: %s", data)
+        urls = data.get('urls')
+        domain = data.get('domain')
+        context = data.get('context', [])
+        session_id = data.get('session_id')
+
+        if not urls or not domain or not isinstance(urls, list):
+            return jsonify({'error': 'Missing required fields'}), 400
+        if not all(isinstance(url, str) and url for url in urls):
+            return jsonify({'error': 'Every entry in urls must be a non-empty string'}), 400
+        if len(urls) > BATCH_MAX_URLS:
+            return jsonify({'error': f'Too many URLs (maximum {BATCH_MAX_URLS} per batch)'}), 400
+
+        # URLs that canonicalize alike (tracking parameters, fragments, ...) are looked up
+        # and analyzed once; results are keyed by canonical URL.
+        with span('canonicalize'):
+            keys = {url: canonical_url(url) for url in urls}
+        results = {}
+        distinct = dict.fromkeys(keys.values())
+        with span('cache'):
+            for key in distinct:
+                cached = url_cache.get((key, domain), session_id)
+                if cached is not None:
+                    results[key] = cached
+        CACHE_LOOKUPS.inc(len(results), layer='url_cache', result='hit')
+        CACHE_LOOKUPS.inc(len(distinct) - len(results), layer='url_cache', result='miss')
+        decided_by('cache', len(results))
+        pending = {}
+        for url, key in keys.items():
+            if key not in results and key not in pending:
+                pending[key] = url # First spelling seen is the one analyzed
+        analysis_context = AnalysisContext.from_request(context)
+        context_dict = dict(analysis_context.answers)
+        policy_version = analyzer.policy.version
+        if pending and shared_cache is not None:
+            shared_keys = {shared_verdict_key(policy_version, domain, context_dict, key): key for key in pending}
+            with span('cache'):
+                shared_hits = shared_cache.get_many(shared_keys)
+            CACHE_LOOKUPS.inc(len(shared_hits), layer='shared', result='hit')
+            CACHE_LOOKUPS.inc(len(shared_keys) - len(shared_hits), layer='shared', result='miss')
+            decided_by('shared_cache', len(shared_hits))
+            for shared_key, shared in shared_hits.items():
+                key = shared_keys[shared_key]
+                url_cache.set((key, domain), shared, session_id)
+                results[key] = shared
+                del pending[key]
+        logger.debug("analyze_batch - Cache hits: %s, pending: %s", len(results), len(pending))
+
+        if pending:
+            logger.debug("analyze_batch - Analyzing with context: %s", context_dict)
+
+            fresh = {}
+            pending_urls = list(pending.values())
+            # The signals and context relevance the analysis computed are reused for the response
+            analyzed = analyzer.analyze_batch_with_signals(pending_urls, domain, analysis_context)
+            for url, (analysis_result, url_signals, context_relevance) in zip(pending_urls, analyzed):
+                result = {
+                    'isProductive': analysis_result['isProductive'],
+                    'explanation': analysis_result['explanation'],
+                    'confidence': get_confidence_score(url_signals, context_relevance),
+                    'signals': url_signals,
+                    'context_relevance': context_relevance,
+                    'context_used': context_dict,
+                    'referrer_data': None,
+                    'direct_visit': False
+                }
+                key = keys[url]
+                url_cache.set((key, domain), result, session_id)
+                results[key] = result
+                fresh[shared_verdict_key(policy_version, domain, context_dict, key)] = result
+            if shared_cache is not None:
+                shared_cache.set_many(fresh, CACHE_DURATION)
+
+        return timed_jsonify({'results': [dict(results[keys[url]], url=url) for url in urls]})
+
+    except Exception as e:
+        logger.exception("Error in analyze batch endpoint")
+        return jsonify({'error': str(e)}), 500
+
 
 def get_confidence_score(signals: dict, relevance: dict) -> float:
     # ... (keep existing implementation)
@@ -0,0 +1,5 @@
+"""
+Benchmarks for Eclipse Shield.
+Standalone measurement scripts; run them with `python -m benchmarks.<name>`
+from the repository root.
+"""
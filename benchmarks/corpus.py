@@ -0,0 +1,132 @@
+"""
+Benchmark corpora for Eclipse Shield.
+Deterministic URL mixes per domain (allowed tools, blocked sites, search
+pages, unknown sites that reach the model) and task contexts of increasing
+size, so benchmark runs on different machines and commits see the same
+inputs.
+"""
+
+import random
+from typing import Dict, List, Tuple
+
+from analysis_context import AnalysisContext
+
+SEED = 20240611
+
+# (host, paths) per kind of site. Paths may contain {q} for a search query.
+_SITES = {
+    'dev': [
+        ('github.com', ['/python/cpython/pulls', '/pallets/flask/issues/{n}', '/search?q={q}']),
+        ('stackoverflow.com', ['/questions/{n}/how-to-{slug}', '/search?q={q}']),
+        ('docs.python.org', ['/3/library/{slug}.html', '/3/tutorial/index.html']),
+        ('developer.mozilla.org', ['/en-US/docs/Web/API/{slug}']),
+        ('pypi.org', ['/project/{slug}/']),
+    ],
+    'learning': [
+        ('en.wikipedia.org', ['/wiki/{slug}']),
+        ('www.khanacademy.org', ['/math/{slug}']),
+        ('scholar.google.com', ['/scholar?q={q}']),
+        ('arxiv.org', ['/abs/2401.{n}']),
+        ('canvas.instructure.com', ['/courses/{n}/assignments']),
+    ],
+    'office': [
+        ('docs.google.com', ['/document/d/{n}/edit']),
+        ('mail.google.com', ['/mail/u/0/#inbox']),
+        ('www.notion.so', ['/workspace/{slug}-{n}']),
+        ('app.slack.com', ['/client/T{n}/C{n}']),
+        ('outlook.office.com', ['/mail/inbox']),
+    ],
+    'social': [
+        ('www.facebook.com', ['/{slug}', '/groups/{n}']),
+        ('twitter.com', ['/{slug}/status/{n}']),
+        ('www.instagram.com', ['/p/{n}/']),
+        ('www.reddit.com', ['/r/{slug}/comments/{n}/']),
+        ('www.tiktok.com', ['/@{slug}/video/{n}']),
+    ],
+    'entertainment': [
+        ('www.youtube.com', ['/watch?v={n}', '/results?search_query={q}']),
+        ('www.netflix.com', ['/watch/{n}']),
+        ('store.steampowered.com', ['/app/{n}/{slug}']),
+        ('www.twitch.tv', ['/{slug}']),
+        ('www.espn.com', ['/nba/game/_/gameId/{n}']),
+    ],
+    'search': [
+        ('www.google.com', ['/search?q={q}']),
+        ('www.bing.com', ['/search?q={q}']),
+        ('duckduckgo.com', ['/?q={q}']),
+    ],
+    'unknown': [
+        ('blog.example.org', ['/{slug}', '/posts/{n}/{slug}']),
+        ('news.example.net', ['/article/{n}']),
+        ('shop.example.com', ['/products/{slug}?ref=home']),
+        ('forum.example.io', ['/t/{slug}/{n}']),
+    ],
+}
+
+_SLUGS = ['asyncio', 'dataclasses', 'fetch', 'linear-algebra', 'photosynthesis', 'quarterly-report',
+          'game-night', 'memes', 'cooking', 'travel', 'requests', 'numpy', 'roadmap', 'thesis-draft']
+_QUERIES = ['python asyncio tutorial', 'how to center a div', 'photosynthesis diagram',
+            'funny cat videos', 'best pizza near me', 'quarterly report template',
+            'linear algebra eigenvalues', 'nba scores', 'flask blueprint example', 'x']
+_TRACKING = ['', '', '', 'utm_source=newsletter&utm_medium=email', 'fbclid=IwAR0abc', 'gclid=Cj0KCQ']
+
+# Share of each kind of site in a domain's traffic
+MIXES = {
+    'work': {'dev': 3, 'office': 3, 'social': 1, 'entertainment': 1, 'search': 2, 'unknown': 2},
+    'school': {'learning': 4, 'dev': 1, 'office': 1, 'social': 1, 'entertainment': 1, 'search': 2, 'unknown': 1},
+    'personal': {'learning': 1, 'dev': 1, 'social': 2, 'entertainment': 2, 'search': 3, 'unknown': 3},
+}
+
+
+def random_url(rng: random.Random, kind: str) -> str:
+    """One URL of the given kind of site ('dev', 'social', 'search', ...), tracking parameters included at random."""
+    host, paths = rng.choice(_SITES[kind])
+    path = rng.choice(paths).format(
+        n=rng.randint(1000, 99999),
+        slug=rng.choice(_SLUGS),
+        q=rng.choice(_QUERIES).replace(' ', '+'),
+    )
+    url = f"https://{host}{path}"
+    tracking = rng.choice(_TRACKING)
+    if tracking:
+        url += ('&' if '?' in url else '?') + tracking
+    return url
+
+
+def url_corpus(domain: str, size: int = 500, seed: int = SEED) -> List[str]:
+    """size URLs drawn from the domain's traffic mix (the same list for the same arguments)."""
+    rng = random.Random(f"{seed}:{domain}")
+    kinds = [kind for kind, weight in MIXES[domain].items() for _ in range(weight)]
+    return [random_url(rng, rng.choice(kinds)) for _ in range(size)]
+
+
+def domain_corpora(size: int = 500, seed: int = SEED) -> Dict[str, List[str]]:
+    return {domain: url_corpus(domain, size, seed) for domain in MIXES}
+
+
+_ANSWERS = [
+    "I'm writing a python asyncio tutorial for my thesis",
+    "Researching photosynthesis diagrams for a biology assignment",
+    "Preparing the quarterly report template and roadmap slides",
+    "Reviewing flask blueprint examples and requests documentation",
+    "Studying linear algebra eigenvalues with numpy for the exam",
+    "Debugging how to center a div in the company dashboard",
+    "Collecting sources on dataclasses and typing for a code review",
+    "Planning the sprint with notion and slack threads from the team",
+]
+
+
+def contexts() -> Dict[str, AnalysisContext]:
+    """Task contexts with 0, 1, 3 and 8 answers (empty, small, medium, large)."""
+    def build(count: int) -> AnalysisContext:
+        return AnalysisContext({f"Question {i + 1}?": _ANSWERS[i] for i in range(count)})
+    return {'empty': build(0), 'small': build(1), 'medium': build(3), 'large': build(8)}
+
+
+def question_histories() -> List[Tuple[str, List[dict]]]:
+    """(domain, Q&A history) pairs for get_next_question, from a first question to a long history."""
+    histories = []
+    for domain in MIXES:
+        for count in (0, 1, 2, 4):
+            histories.append((domain, [{'question': f"Question {i + 1}?", 'answer': _ANSWERS[i]} for i in range(count)]))
+    return histories
@@ -0,0 +1,72 @@
+"""
+Deterministic stand-in for the Gemini model in Eclipse Shield benchmarks.
+Answers analysis prompts with ALLOW or BLOCK chosen from a hash of each URL
+under review and question prompts with a follow-up question until the
+history has enough answers, optionally after a fixed delay, so benchmark
+numbers measure the analyzer rather than the network.
+"""
+
+import asyncio
+import hashlib
+import re
+import threading
+import time
+
+_URL_LINE = re.compile(r"^\s*- URL: (\S+)", re.MULTILINE)
+_ANSWER_LINE = re.compile(r"^\s*A: ", re.MULTILINE)
+
+
+class FakeResponse:
+    __slots__ = ('text',)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Drop-in for genai.GenerativeModel (generate_content and generate_content_async).
+
+    Args:
+        latency: Seconds each call waits before answering (0 answers immediately).
+        block_ratio: Share of URLs, by hash, that get a BLOCK verdict.
+        answers_needed: Q&A pairs after which question prompts get 'DONE'.
+    """
+
+    def __init__(self, latency: float = 0.0, block_ratio: float = 0.4, answers_needed: int = 2):
+        self.latency = latency
+        self.block_ratio = block_ratio
+        self.answers_needed = answers_needed
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _verdict(self, url: str) -> str:
+        bucket = int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=4).digest(), 'big')
+        if bucket / 0xFFFFFFFF < self.block_ratio:
+            return f"BLOCK: {url} is not related to the user's task."
+        return f"ALLOW: {url} is relevant to the user's task."
+
+    def reply(self, prompt: str) -> str:
+        """The text the model answers prompt with; the same prompt always gets the same text.
+
+        Batched analysis prompts (several URLs) get one numbered verdict per URL.
+        """
+        with self._lock:
+            self.calls += 1
+        urls = _URL_LINE.findall(prompt)
+        if len(urls) > 1:
+            return '\n'.join(f"{number}. {self._verdict(url)}" for number, url in enumerate(urls, 1))
+        if urls:
+            return self._verdict(urls[0])
+        if len(_ANSWER_LINE.findall(prompt)) >= self.answers_needed:
+            return "DONE"
+        return "What specific outcome are you working towards?"
+
+    def generate_content(self, contents: str, **kwargs) -> FakeResponse:
+        if self.latency:
+            time.sleep(self.latency)
+        return FakeResponse(self.reply(contents))
+
+    async def generate_content_async(self, contents: str, **kwargs) -> FakeResponse:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return FakeResponse(self.reply(contents))
@@ -0,0 +1,366 @@
+"""
+Navigation-trace load generator for the Eclipse Shield HTTP API.
+Builds browsing sessions like the extension produces them (a few
+/get_question rounds, then page visits with bursts, revisits, search pages
+followed by result clicks, and static asset fetches) and replays them
+against a running server, closed-loop (a fixed number of users, each waiting
+for its previous response) or open-loop (requests arrive at a fixed rate no
+matter how the server keeps up). It reports throughput, latency percentiles,
+error and 429 rates, and the share of /analyze calls answered from the
+verdict caches (read from the Server-Timing decision).
+
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 --users 50 --duration 60
+    python -m benchmarks.loadgen --mode open --rates 10,20,40,80 --duration 30 --slo-ms 500
+
+Pair it with the stub model (ECLIPSE_SHIELD_MODEL_BACKEND=stub or http) so
+the server, not Gemini, is what saturates. secure_app limits /analyze per
+client address; --spoof-clients sends a distinct X-Forwarded-For per user,
+which the app honours behind ProxyFix.
+"""
+
+import argparse
+import http.client
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks import corpus
+from benchmarks.runner import percentile
+
+STATIC_PATHS = ('/popup.js', '/block.html')
+# Server-Timing decisions that mean the verdict was reused rather than computed, in
+# lookup order: per-worker cache, shared (Redis) cache, SQLite verdict store, and
+# joining an identical analysis already in flight
+CACHE_DECISIONS = ('cache', 'shared_cache', 'verdict_store', 'coalesced')
+_DECISION = re.compile(r'decision;desc="([^"]*)"')
+
+
+def _step(kind: str, method: str, path: str, body: Optional[dict] = None, think: float = 0.0) -> dict:
+    return {'kind': kind, 'method': method, 'path': path, 'body': body, 'think': round(think, 3)}
+
+
+def _search_query(url: str) -> str:
+    params = parse_qs(urlparse(url).query)
+    for name in ('q', 'search_query'):
+        if params.get(name):
+            return params[name][0]
+    return ''
+
+
+def build_session(rng: random.Random, user: int, visits: int, think: float = 1.0, burst_prob: float = 0.15,
+                  repeat_prob: float = 0.25, search_prob: float = 0.2, static_prob: float = 0.1) -> dict:
+    """One user's session: contextualization, then visits page by page.
+
+    think is the mean pause (seconds, exponentially distributed) before each
+    navigation; requests inside a burst are sent back to back.
+    """
+    domain, history = rng.choice([item for item in corpus.question_histories() if len(item[1]) >= 2])
+    session_id = f"load-{user}"
+    steps = [_step('static', 'GET', rng.choice(STATIC_PATHS))]
+    for answered in range(len(history) + 1):
+        steps.append(_step('question', 'POST', '/get_question',
+                           {'domain': domain, 'context': history[:answered]},
+                           think=rng.expovariate(1 / (think * 3)) if answered else 0.0))
+
+    kinds = [kind for kind, weight in corpus.MIXES[domain].items() for _ in range(weight) if kind != 'search']
+    visited: List[str] = []
+
+    def analyze(url: str, pause: float, **extra) -> None:
+        body = {'url': url, 'domain': domain, 'context': history, 'session_id': session_id}
+        body.update(extra)
+        steps.append(_step('analyze', 'POST', '/analyze', body, think=pause))
+        visited.append(url)
+
+    for _ in range(visits):
+        pause = rng.expovariate(1 / think) if think else 0.0
+        roll = rng.random()
+        if visited and roll < repeat_prob:
+            analyze(rng.choice(visited), pause, is_direct_visit=True)
+        elif roll < repeat_prob + search_prob:
+            search = corpus.random_url(rng, 'search')
+            analyze(search, pause, search_query=_search_query(search))
+            # The result click usually follows a few seconds later
+            analyze(corpus.random_url(rng, rng.choice(kinds)), rng.expovariate(1 / think) if think else 0.0)
+        else:
+            analyze(corpus.random_url(rng, rng.choice(kinds)), pause, is_direct_visit=True)
+        if rng.random() < burst_prob:
+            # Tabs restored or links opened together
+            for _ in range(rng.randint(2, 5)):
+                analyze(corpus.random_url(rng, rng.choice(kinds)), 0.0, is_direct_visit=True)
+        if rng.random() < static_prob:
+            steps.append(_step('static', 'GET', rng.choice(STATIC_PATHS)))
+    return {'user': user, 'domain': domain, 'steps': steps}
+
+
+def build_trace(users: int, visits: int, seed: int = corpus.SEED, **options) -> List[dict]:
+    """Sessions for users simulated users (the same trace for the same arguments)."""
+    rng = random.Random(seed)
+    return [build_session(rng, user, visits, **options) for user in range(users)]
+
+
+def load_trace(path: str) -> List[dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_trace(trace: List[dict], path: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        for session in trace:
+            f.write(json.dumps(session) + '\n')
+
+
+class Results:
+    """Thread-safe tally of latencies, statuses and cache decisions per endpoint kind."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.decisions: Counter = Counter()
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, latency: float, status: int, decision: Optional[str] = None) -> None:
+        with self._lock:
+            self.latencies[kind].append(latency)
+            self.statuses[kind][status] += 1
+            if decision:
+                self.decisions[decision] += 1
+
+    def summary(self) -> dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        with self._lock:
+            kinds = {kind: sorted(values) for kind, values in self.latencies.items()}
+            statuses = {kind: Counter(counts) for kind, counts in self.statuses.items()}
+            decisions = Counter(self.decisions)
+        report = {'elapsed_s': round(elapsed, 3), 'endpoints': {}}
+        every = sorted(value for values in kinds.values() for value in values)
+        for kind, values in list(kinds.items()) + [('all', every)]:
+            counts = statuses.get(kind) if kind != 'all' else sum(statuses.values(), Counter())
+            total = len(values)
+            ok = sum(count for status, count in counts.items() if 200 <= status < 400)
+            report['endpoints'][kind] = {
+                'requests': total,
+                'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+                'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+                'p90_ms': round(percentile(values, 0.90) * 1000, 2),
+                'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+                'max_ms': round(values[-1] * 1000, 2) if values else 0.0,
+                'error_rate': round((total - ok) / total, 4) if total else 0.0,
+                'rate_limited': counts.get(429, 0),
+                'statuses': {str(status): count for status, count in sorted(counts.items())},
+            }
+        decided = sum(decisions.values())
+        report['cache_hit_ratio'] = (round(sum(decisions[d] for d in CACHE_DECISIONS) / decided, 4)
+                                     if decided else None)
+        report['cache_hit_ratios'] = {d: round(decisions[d] / decided, 4) for d in CACHE_DECISIONS} if decided else {}
+        report['decisions'] = dict(decisions.most_common())
+        return report
+
+
+class Client:
+    """Keep-alive HTTP connection per worker thread."""
+
+    def __init__(self, base_url: str, timeout: float, spoof_clients: bool):
+        parsed = urlparse(base_url)
+        self.https = parsed.scheme == 'https'
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or (443 if self.https else 80)
+        self.timeout = timeout
+        self.spoof_clients = spoof_clients
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            factory = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            connection = self._local.connection = factory(self.host, self.port, timeout=self.timeout)
+        return connection
+
+    def send(self, step: dict, user: int):
+        """(status, Server-Timing decision) for one step; status 0 means no response."""
+        headers = {'Accept': 'application/json'}
+        body = None
+        if step['body'] is not None:
+            body = json.dumps(step['body']).encode('utf-8')  # bytes go out with the headers in one packet
+            headers['Content-Type'] = 'application/json'
+        if self.spoof_clients:
+            headers['X-Forwarded-For'] = f"10.{(user >> 16) & 255}.{(user >> 8) & 255}.{user & 255}"
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(step['method'], step['path'], body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                decision = _DECISION.search(response.getheader('Server-Timing') or '')
+                return response.status, decision.group(1) if decision else None
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                self._local.connection = None
+                if attempt:  # A stale keep-alive connection gets one retry
+                    return 0, None
+        return 0, None
+
+
+def run_closed(client: Client, trace: List[dict], concurrency: int, duration: float, think_scale: float) -> Results:
+    """concurrency users replay sessions back to back, each waiting for its previous response."""
+    results = Results()
+    deadline = results.started + duration
+    next_session = iter(range(sys.maxsize))
+    lock = threading.Lock()
+
+    def user_loop() -> None:
+        while time.perf_counter() < deadline:
+            with lock:
+                index = next(next_session)
+            session = trace[index % len(trace)]
+            user = session['user'] + len(trace) * (index // len(trace))
+            for step in session['steps']:
+                if step['think'] and think_scale:
+                    time.sleep(step['think'] * think_scale)
+                if time.perf_counter() >= deadline:
+                    return
+                start = time.perf_counter()
+                status, decision = client.send(step, user)
+                results.record(step['kind'], time.perf_counter() - start, status,
+                               decision if step['kind'] == 'analyze' else None)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(user_loop)
+    results.finished = time.perf_counter()
+    return results
+
+
+def run_open(client: Client, trace: List[dict], rate: float, concurrency: int, duration: float,
+             seed: int = corpus.SEED) -> Results:
+    """Requests arrive as a Poisson process at rate per second, served by up to concurrency threads.
+
+    Sessions are interleaved round-robin, keeping each session's own order.
+    Latency is measured from the scheduled arrival, so time spent queued
+    behind a saturated server counts (no coordinated omission); requests
+    queued for longer than the client timeout are recorded as failures.
+    """
+    rng = random.Random(seed)
+    results = Results()
+    cursors = [0] * len(trace)
+    arrival = results.started
+    deadline = results.started + duration
+
+    def fire(step: dict, user: int, scheduled: float) -> None:
+        if time.perf_counter() - scheduled > client.timeout:
+            # Queued longer than the client would wait: count it as a timeout instead of sending it late
+            results.record(step['kind'], time.perf_counter() - scheduled, 0)
+            return
+        status, decision = client.send(step, user)
+        results.record(step['kind'], time.perf_counter() - scheduled, status,
+                       decision if step['kind'] == 'analyze' else None)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        turn = 0
+        while True:
+            arrival += rng.expovariate(rate)
+            if arrival >= deadline:
+                break
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            index = turn % len(trace)
+            turn += 1
+            session = trace[index]
+            step = session['steps'][cursors[index] % len(session['steps'])]
+            cursors[index] += 1
+            pool.submit(fire, step, session['user'], arrival)
+    results.finished = time.perf_counter()
+    return results
+
+
+def print_report(report: dict, title: str = '') -> None:
+    if title:
+        print(title)
+    print(f"{'endpoint':<10} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} "
+          f"{'max ms':>9} {'errors':>8} {'429s':>6}")
+    for kind, row in report['endpoints'].items():
+        print(f"{kind:<10} {row['requests']:>9} {row['throughput_rps']:>9.1f} {row['p50_ms']:>9.1f} "
+              f"{row['p90_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['max_ms']:>9.1f} "
+              f"{row['error_rate']:>8.2%} {row['rate_limited']:>6}")
+    ratio = report['cache_hit_ratio']
+    layers = ', '.join(f"{layer} {share:.1%}" for layer, share in report['cache_hit_ratios'].items())
+    print(f"/analyze cache hit ratio: {'n/a (no Server-Timing)' if ratio is None else f'{ratio:.1%} ({layers})'}; "
+          f"decisions: {report['decisions']}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay browsing traces against the Eclipse Shield API.")
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="Server base URL")
+    parser.add_argument('--mode', choices=('closed', 'open'), default='closed')
+    parser.add_argument('--users', type=int, default=20, help="Sessions in the generated trace")
+    parser.add_argument('--visits', type=int, default=30, help="Page visits per session")
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help="Closed: simultaneous users (default --users). Open: maximum requests in flight "
+                             "(default 256)")
+    parser.add_argument('--rates', default='20', help="Open mode: comma-separated arrival rates (req/s) to step through")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds per run (per rate in open mode)")
+    parser.add_argument('--think', type=float, default=1.0, help="Mean think time between navigations (seconds)")
+    parser.add_argument('--think-scale', type=float, default=1.0,
+                        help="Closed mode: multiply think times (0 replays as fast as responses allow)")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument('--slo-ms', type=float, default=1000.0,
+                        help="Open mode: p99 above this marks the rate as saturated")
+    parser.add_argument('--spoof-clients', action='store_true',
+                        help="Send a distinct X-Forwarded-For per user so per-IP limits apply per user")
+    parser.add_argument('--seed', type=int, default=corpus.SEED)
+    parser.add_argument('--trace', help="Replay sessions from this JSONL file instead of generating them")
+    parser.add_argument('--save-trace', help="Write the generated sessions to this JSONL file")
+    parser.add_argument('--output', '-o', help="Write the report(s) as JSON")
+    args = parser.parse_args(argv)
+
+    if args.trace:
+        trace = load_trace(args.trace)
+    else:
+        trace = build_trace(args.users, args.visits, args.seed, think=args.think)
+    if args.save_trace:
+        save_trace(trace, args.save_trace)
+    if not trace:
+        parser.error("The trace has no sessions")
+    client = Client(args.url, args.timeout, args.spoof_clients)
+
+    if args.mode == 'closed':
+        concurrency = args.concurrency or len(trace)
+        report = run_closed(client, trace, concurrency, args.duration, args.think_scale).summary()
+        report.update(mode='closed', concurrency=concurrency)
+        print_report(report, f"Closed loop, {concurrency} users, {args.duration:g}s against {args.url}")
+        reports = [report]
+    else:
+        concurrency = args.concurrency or 256
+        reports = []
+        saturated_at = None
+        for rate in (float(value) for value in args.rates.split(',') if value.strip()):
+            report = run_open(client, trace, rate, concurrency, args.duration, args.seed).summary()
+            achieved = report['endpoints']['all']['throughput_rps']
+            saturated = (achieved < rate * 0.95 or report['endpoints']['all']['p99_ms'] > args.slo_ms)
+            report.update(mode='open', offered_rps=rate, concurrency=concurrency, saturated=saturated)
+            print_report(report, f"\nOpen loop, {rate:g} req/s offered, {achieved:.1f} achieved"
+                                 f"{' (SATURATED)' if saturated else ''}")
+            reports.append(report)
+            if saturated and saturated_at is None:
+                saturated_at = rate
+        if len(reports) > 1:
+            print(f"\nSaturation: {'not reached' if saturated_at is None else f'{saturated_at:g} req/s'} "
+                  f"(p99 SLO {args.slo_ms:g} ms)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(reports if len(reports) > 1 else reports[0], f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
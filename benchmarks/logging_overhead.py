@@ -0,0 +1,140 @@
+"""
+Logging overhead benchmark for Eclipse Shield.
+Runs the analyzer's per-request work that does not call the model (rules,
+context relevance, prompt building and response parsing) under several
+logging setups and reports the time logging adds per request compared with
+logging switched off.
+
+    python -m benchmarks.logging_overhead --requests 2000
+
+Setups:
+  legacy        analyzer at DEBUG, synchronous RotatingFileHandler (the old wsgi.py setup)
+  debug-queued  analyzer at DEBUG, same file handler behind the queue listener
+  info-queued   analyzer at INFO (the new default), queue listener
+  info-sampled  info-queued with analyze_website records sampled at 10%
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log_config
+from analysis_context import AnalysisContext
+from log_config import LOG_FORMAT, configure_logging, stop_logging
+
+URLS = [
+    ("https://github.com/python/cpython/pulls", "work"),
+    ("https://www.facebook.com/some.page", "work"),
+    ("https://example.com/gaming/news", "work"),
+    ("https://docs.python.org/3/library/asyncio-task.html", "school"),
+    ("https://www.google.com/search?q=python+asyncio+tutorial", "personal"),
+    ("https://blog.example.org/asyncio-patterns?utm_source=x", "personal"),
+    ("https://www.youtube.com/watch?v=dQw4w9WgXcQ", "personal"),
+    ("https://news.ycombinator.com/item?id=1", "work"),
+]
+
+CONTEXT = AnalysisContext({
+    "What task are you working on?": "Writing a python asyncio tutorial for my thesis",
+    "Which sites do you need?": "python docs, stack overflow and github",
+})
+
+
+class _Response:
+    text = "ALLOW: Documentation relevant to the user's task."
+
+
+def run_requests(analyzer, count: int) -> float:
+    """Seconds spent on count analyses (the model call itself is not made)."""
+    start = time.perf_counter()
+    for i in range(count):
+        url, domain = URLS[i % len(URLS)]
+        result, ai_request = analyzer._analyze_before_ai(url, domain, CONTEXT)
+        if ai_request is not None:
+            analyzer._build_analysis_prompt(ai_request)
+            analyzer._parse_analysis_response(ai_request, _Response())
+    return time.perf_counter() - start
+
+
+def _file_handler(directory: str, name: str) -> logging.Handler:
+    handler = RotatingFileHandler(os.path.join(directory, name), maxBytes=10*1024*1024,
+                                  backupCount=1, encoding='utf-8')
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return handler
+
+
+def _reset_root() -> None:
+    stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def configure_setup(setup: str, directory: str, analyzer_logger: logging.Logger) -> None:
+    _reset_root()
+    root = logging.getLogger()
+    if setup == 'off':
+        root.setLevel(logging.CRITICAL)
+        analyzer_logger.setLevel(logging.CRITICAL)
+    elif setup == 'legacy':
+        root.setLevel(logging.INFO)
+        root.addHandler(_file_handler(directory, 'legacy.log'))
+        analyzer_logger.setLevel(logging.DEBUG)
+    elif setup == 'debug-queued':
+        configure_logging([_file_handler(directory, 'debug-queued.log')], level=logging.INFO, sample_rates={})
+        analyzer_logger.setLevel(logging.DEBUG)
+    elif setup == 'info-queued':
+        configure_logging([_file_handler(directory, 'info-queued.log')], level=logging.INFO, sample_rates={})
+        analyzer_logger.setLevel(logging.INFO)
+    elif setup == 'info-sampled':
+        configure_logging([_file_handler(directory, 'info-sampled.log')], level=logging.INFO,
+                          sample_rates={'analyze_website': 0.1})
+        analyzer_logger.setLevel(logging.INFO)
+    else:
+        raise ValueError(f"Unknown setup: {setup}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure per-request logging overhead of the analyzer.")
+    parser.add_argument('--requests', type=int, default=2000, help="Analyses per setup (default 2000)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per setup; the fastest is reported")
+    parser.add_argument('--setups', default='legacy,debug-queued,info-queued,info-sampled',
+                        help="Comma-separated setups to compare against 'off'")
+    args = parser.parse_args(argv)
+
+    import script
+    analyzer = script.ProductivityAnalyzer()
+    analyzer.verdict_store = None  # Measure logging, not SQLite
+    # Template verdicts learn from the parsed responses and would start answering
+    # mid-run; the fast path depends on fastpath_model.json. Keep both off so every
+    # setup runs the same stages.
+    analyzer.template_verdicts = None
+    analyzer.fastpath = None
+
+    setups = ['off'] + [name.strip() for name in args.setups.split(',') if name.strip()]
+    timings = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for setup in setups:
+            configure_setup(setup, directory, script.logger)
+            run_requests(analyzer, min(args.requests, 200))  # Warm caches and the automata
+            timings[setup] = min(run_requests(analyzer, args.requests) for _ in range(args.repeat))
+            stop_logging()  # Drain the queue so the next setup starts idle
+        _reset_root()
+        script.logger.setLevel(log_config.ANALYZER_LOG_LEVEL)
+
+    baseline = timings['off'] / args.requests
+    print(f"{'setup':<14} {'us/request':>11} {'logging us/request':>19}")
+    for setup in setups:
+        per_request = timings[setup] / args.requests
+        print(f"{setup:<14} {per_request * 1e6:>11.1f} {(per_request - baseline) * 1e6:>19.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""
+Analyzer benchmark suite for Eclipse Shield.
+Times the analyzer's hot paths (analyze_website per domain,
+_check_context_relevance per context size and per 1000-URL batch,
+_analyze_url_components and get_next_question) against the deterministic corpora in benchmarks.corpus and
+the fake model in benchmarks.fake_model, and compares runs so regressions
+show up before a change is merged.
+
+    python -m benchmarks.runner run --output results.json
+    python -m benchmarks.runner compare baseline.json results.json --threshold 0.10
+
+compare exits with status 1 when any benchmark's throughput drops, or its
+p50/p99 latency grows, by more than the threshold.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import corpus
+from benchmarks.fake_model import FakeGenerativeModel
+
+FORMAT_VERSION = 1
+# URLs per _check_context_relevance_many call; the corpus is cycled to fill each batch
+RELEVANCE_BATCH = 1000
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def measure(operation: Callable[[object], object], inputs: Sequence, repeat: int, warmup: int = 1) -> dict:
+    """Run operation on every input repeat times (after warmup untimed passes) and summarize latencies."""
+    for _ in range(warmup):
+        for item in inputs:
+            operation(item)
+    clock = time.perf_counter_ns
+    latencies: List[int] = []
+    record = latencies.append
+    for _ in range(repeat):
+        for item in inputs:
+            start = clock()
+            operation(item)
+            record(clock() - start)
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        'ops': len(latencies),
+        'ops_per_sec': round(len(latencies) / (total / 1e9), 1) if total else 0.0,
+        'mean_us': round(total / len(latencies) / 1e3, 3) if latencies else 0.0,
+        'p50_us': round(percentile(latencies, 0.50) / 1e3, 3),
+        'p99_us': round(percentile(latencies, 0.99) / 1e3, 3),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5, check=True).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def build_analyzer(latency: float, learned_stages: bool = False):
+    """Analyzer wired to the fake model, with no verdict store and no per-minute limit.
+
+    URL template verdicts and the fast path classifier answer from what earlier
+    analyses (or fastpath_model.json) taught them, so unless learned_stages is
+    set they are off and every pass measures the same path to the model.
+    """
+    import script
+    analyzer = script.ProductivityAnalyzer(model=FakeGenerativeModel(latency=latency))
+    analyzer.verdict_store = None  # Every run must reach the model, not a verdict from the last one
+    if not learned_stages:
+        analyzer.template_verdicts = None
+        analyzer.fastpath = None
+    analyzer.max_analyses_per_minute = sys.maxsize
+    return analyzer
+
+
+def run_suite(analyzer, urls: int, repeat: int, only: Optional[str] = None) -> Dict[str, dict]:
+    """Results keyed by benchmark name, e.g. 'analyze_website[work]'."""
+    corpora = corpus.domain_corpora(urls)
+    contexts = corpus.contexts()
+    all_urls = [url for domain_urls in corpora.values() for url in domain_urls]
+
+    cases = []
+    for domain, domain_urls in corpora.items():
+        cases.append((f"analyze_website[{domain}]", domain_urls,
+                      lambda url, domain=domain: analyzer.analyze_website(url, domain, contexts['medium'])))
+    for size, context in contexts.items():
+        cases.append((f"_check_context_relevance[{size}]", all_urls,
+                      lambda url, context=context: analyzer._check_context_relevance(url, context=context)))
+    batches = []
+    for first in range(0, len(all_urls), RELEVANCE_BATCH):
+        batch = [all_urls[(first + i) % len(all_urls)] for i in range(RELEVANCE_BATCH)]
+        batches.append((batch, [analyzer._analyze_url_components(url) for url in batch]))
+    cases.append(("_check_context_relevance_many[large]", batches,
+                  lambda batch: analyzer._check_context_relevance_many(*batch, contexts['large'])))
+    cases.append(("_analyze_url_components", all_urls, analyzer._analyze_url_components))
+    cases.append(("get_next_question", corpus.question_histories(),
+                  lambda item: analyzer.get_next_question(*item)))
+
+    results = {}
+    for name, inputs, operation in cases:
+        if only and only not in name:
+            continue
+        results[name] = measure(operation, inputs, repeat)
+        print(f"{name:<36} {results[name]['ops_per_sec']:>12.1f} ops/s  "
+              f"p50 {results[name]['p50_us']:>9.1f} us  p99 {results[name]['p99_us']:>9.1f} us", file=sys.stderr)
+    return results
+
+
+def compare(baseline: dict, current: dict, threshold: float, min_delta_us: float) -> List[str]:
+    """Describe every benchmark that regressed by more than threshold (a fraction, 0.10 = 10%)."""
+    regressions = []
+    base_results = baseline.get('benchmarks', {})
+    for name, result in current.get('benchmarks', {}).items():
+        base = base_results.get(name)
+        if base is None:
+            continue
+        if base['ops_per_sec'] and result['ops_per_sec'] < base['ops_per_sec'] * (1 - threshold):
+            regressions.append(f"{name}: throughput {base['ops_per_sec']:.1f} -> {result['ops_per_sec']:.1f} ops/s "
+                               f"({result['ops_per_sec'] / base['ops_per_sec'] - 1:+.1%})")
+        for key in ('p50_us', 'p99_us'):
+            # Ignore sub-microsecond jitter on the fastest benchmarks
+            if (result[key] > base[key] * (1 + threshold) and result[key] - base[key] >= min_delta_us):
+                regressions.append(f"{name}: {key[:3]} {base[key]:.1f} -> {result[key]:.1f} us "
+                                   f"({result[key] / base[key] - 1 if base[key] else float('inf'):+.1%})")
+    return regressions
+
+
+def _load(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the analyzer's hot paths with a fake model.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Run the suite and write JSON results")
+    run_parser.add_argument('--output', '-o', help="Results file (default: print to stdout)")
+    run_parser.add_argument('--urls', type=int, default=300, help="URLs per domain corpus (default 300)")
+    run_parser.add_argument('--repeat', type=int, default=5, help="Timed passes over each corpus (default 5)")
+    run_parser.add_argument('--latency', type=float, default=0.0, help="Fake model latency in seconds (default 0)")
+    run_parser.add_argument('--only', help="Run only benchmarks whose name contains this text")
+    run_parser.add_argument('--learned-stages', action='store_true',
+                            help="Keep URL template verdicts and the fast path classifier on")
+
+    compare_parser = commands.add_parser('compare', help="Flag regressions of a run against a baseline")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help="Allowed relative slowdown (default 0.10 = 10%%)")
+    compare_parser.add_argument('--min-delta-us', type=float, default=1.0,
+                                help="Ignore latency increases smaller than this many microseconds (default 1)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        regressions = compare(_load(args.baseline), _load(args.current), args.threshold, args.min_delta_us)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if not regressions:
+            print(f"No regressions beyond {args.threshold:.0%}")
+        return 1 if regressions else 0
+
+    analyzer = build_analyzer(args.latency, args.learned_stages)
+    results = {
+        'format': FORMAT_VERSION,
+        'metadata': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'urls_per_domain': args.urls,
+            'repeat': args.repeat,
+            'model_latency': args.latency,
+            'learned_stages': args.learned_stages,
+        },
+        'benchmarks': run_suite(analyzer, args.urls, args.repeat, args.only),
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
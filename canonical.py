@@ -0,0 +1,102 @@
+"""
+URL canonicalization for Eclipse Shield.
+Maps the many spellings of one page (tracking parameters, fragments, default
+ports, host case, trailing slashes, query order) to a single canonical URL.
+The canonical form is only used as a lookup key for the verdict caches, the
+verdict store and request coalescing; rules and the model still see the URL
+as requested.
+"""
+
+import os
+from functools import lru_cache
+from typing import Iterable
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that identify a campaign or click rather than content.
+# Entries ending in '*' match by prefix. Override with a comma-separated
+# ECLIPSE_SHIELD_TRACKING_PARAMS.
+DEFAULT_TRACKING_PARAMS = (
+    'utm_*', 'fbclid', 'gclid', 'dclid', 'gclsrc', 'gbraid', 'wbraid', 'msclkid', 'yclid',
+    'twclid', 'ttclid', 'li_fat_id', 'igshid', 'mc_cid', 'mc_eid', '_ga', '_gl',
+    '_hsenc', '_hsmi', 'mkt_tok', 'vero_id', 'oly_anon_id', 'oly_enc_id', 'rb_clickid',
+    'ref_src', 'ref_url', 'spm', 'scm',
+)
+
+TRACKING_PARAMS = tuple(
+    name.strip() for name in os.getenv("ECLIPSE_SHIELD_TRACKING_PARAMS", ",".join(DEFAULT_TRACKING_PARAMS)).split(",")
+    if name.strip()
+)
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+class UrlCanonicalizer:
+    """Builds canonical lookup keys for URLs.
+
+    - scheme and host are lowercased, the host is IDNA-encoded and loses a trailing dot
+    - default ports (80 for http, 443 for https) are dropped
+    - an empty path becomes '/', other paths lose a trailing slash
+    - tracking parameters are removed and the rest are sorted
+    - the fragment is removed
+
+    URLs that cannot be parsed are returned stripped but otherwise unchanged.
+    """
+
+    def __init__(self, tracking_params: Iterable[str] = TRACKING_PARAMS):
+        names = [name.lower() for name in tracking_params]
+        self._exact = frozenset(name for name in names if not name.endswith('*'))
+        self._prefixes = tuple(name[:-1] for name in names if name.endswith('*'))
+
+    def is_tracking_param(self, name: str) -> bool:
+        name = name.lower()
+        return name in self._exact or name.startswith(self._prefixes)
+
+    def canonicalize(self, url: str) -> str:
+        url = url.strip()
+        try:
+            parts = urlsplit(url)
+            port = parts.port
+        except ValueError:
+            return url
+        scheme = parts.scheme.lower()
+        host = parts.hostname or ''
+        if not scheme or not host:
+            return url
+
+        host = host.rstrip('.')
+        try:
+            host = host.encode('idna').decode('ascii')
+        except UnicodeError:
+            pass  # Not IDNA-encodable (e.g. an over-long label); keep the lowercased form
+        if ':' in host:
+            host = f"[{host}]"  # IPv6 literal
+        netloc = host
+        if port is not None and port != _DEFAULT_PORTS.get(scheme):
+            netloc = f"{host}:{port}"
+        if parts.username is not None:
+            userinfo = parts.netloc.rpartition('@')[0]
+            netloc = f"{userinfo}@{netloc}"
+
+        path = parts.path or '/'
+        if len(path) > 1 and path.endswith('/'):
+            path = path.rstrip('/') or '/'
+
+        query = ''
+        if parts.query:
+            params = [
+                (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                if not self.is_tracking_param(name)
+            ]
+            query = urlencode(sorted(params))
+
+        return urlunsplit((scheme, netloc, path, query, ''))
+
+
+_default = UrlCanonicalizer()
+
+
+@lru_cache(maxsize=8192)
+def canonical_url(url: str) -> str:
+    """Canonical form of url using the configured tracking-parameter list."""
+    return _default.canonicalize(url)
+
@@ -0,0 +1,202 @@
+"""
+Request coalescing for Eclipse Shield.
+Identical analyses that are in flight at the same time (the extension firing
+/analyze from several navigation events, or several tabs opening one URL) are
+collapsed into a single model call: the first caller computes, concurrent
+callers wait for its result. Within a worker this uses per-key events; across
+gunicorn workers a per-key file lock and a short-lived result file are used.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from canonical import canonical_url
+from tracing import span, decided_by
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalesce within the worker only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+COALESCE_DIR = os.getenv(
+    "ECLIPSE_SHIELD_COALESCE_DIR",
+    os.path.join(tempfile.gettempdir(), "eclipse-shield-inflight")
+)
+# Longest time a worker waits for another worker's result before computing itself
+COALESCE_WAIT = float(os.getenv("ECLIPSE_SHIELD_COALESCE_WAIT", "30"))
+# Result files older than this are never reused and are pruned
+RESULT_TTL = 60
+_LOCK_POLL_INTERVAL = 0.05
+_PRUNE_EVERY = 256
+
+
+def context_fingerprint(context: Any) -> str:
+    """Stable short hash of the task context an analysis was made under."""
+    encoded = json.dumps(dict(context) if context else {}, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:16]
+
+
+def coalesce_key(url: str, domain: str, context: Any) -> str:
+    """Key identifying an analysis: canonical URL + domain + context fingerprint."""
+    return f"{domain}|{context_fingerprint(context)}|{canonical_url(url)}"
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Run at most one computation per key at a time and share its result.
+
+    do(key, fn) returns fn()'s result. Threads in this process that ask for the
+    same key while it is running wait for the leader's result instead of
+    calling fn. If lock_dir is set (and fcntl is available), the leader also
+    holds a per-key flock while computing and publishes a JSON result file, so
+    a leader in another worker process is waited on the same way. Results
+    shared across workers must therefore be JSON serializable.
+    """
+
+    def __init__(self, lock_dir: Optional[str] = COALESCE_DIR, wait_timeout: float = COALESCE_WAIT):
+        self.wait_timeout = wait_timeout
+        self.lock_dir = lock_dir if fcntl is not None else None
+        if self.lock_dir:
+            try:
+                os.makedirs(self.lock_dir, mode=0o700, exist_ok=True)
+            except OSError as e:
+                logger.warning("SingleFlight - cannot use %s for cross-worker coalescing: %s", self.lock_dir, e)
+                self.lock_dir = None
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._runs = 0
+        self.coalesced = 0  # Calls answered by another caller's computation
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            logger.debug("SingleFlight.do - waiting on in-flight analysis for %s", key)
+            with span('coalesce_wait'):
+                call.done.wait()
+            with self._lock:
+                self.coalesced += 1
+            if call.error is not None:
+                raise call.error
+            decided_by('coalesced')
+            return call.result
+
+        try:
+            call.result = self._run_shared(key, fn)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _run_shared(self, key: str, fn: Callable[[], Any]) -> Any:
+        if not self.lock_dir:
+            return fn()
+
+        base = os.path.join(self.lock_dir, hashlib.sha256(key.encode('utf-8')).hexdigest()[:32])
+        started = time.time()
+        try:
+            fd = os.open(base + '.lock', os.O_CREAT | os.O_RDWR, 0o600)
+        except OSError as e:
+            logger.warning("SingleFlight._run_shared - lock file unavailable, computing locally: %s", e)
+            return fn()
+
+        try:
+            with span('coalesce_wait'):
+                acquired = self._acquire(fd)
+            if not acquired:
+                # Another worker's leader is still at it past our patience; don't fail the request.
+                logger.warning("SingleFlight._run_shared - timed out waiting for another worker on %s", key)
+                return fn()
+
+            shared = self._read_result(base + '.json', started)
+            if shared is not None:
+                with self._lock:
+                    self.coalesced += 1
+                logger.debug("SingleFlight._run_shared - reused result from another worker for %s", key)
+                decided_by('coalesced')
+                return shared['result']
+
+            result = fn()
+            self._write_result(base + '.json', result)
+            return result
+        finally:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+            self._maybe_prune()
+
+    def _acquire(self, fd: int) -> bool:
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(_LOCK_POLL_INTERVAL)
+
+    @staticmethod
+    def _read_result(path: str, not_before: float) -> Optional[dict]:
+        """Return a result published since not_before (i.e. while we waited), else None."""
+        try:
+            with open(path, 'r') as f:
+                shared = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(shared, dict) or shared.get('written', 0) < not_before:
+            return None
+        return shared
+
+    @staticmethod
+    def _write_result(path: str, result: Any) -> None:
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'written': time.time(), 'result': result}, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.debug("SingleFlight._write_result - result not shared across workers: %s", e)
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def _maybe_prune(self) -> None:
+        with self._lock:
+            self._runs += 1
+            if self._runs % _PRUNE_EVERY:
+                return
+        cutoff = time.time() - RESULT_TTL
+        try:
+            for entry in os.scandir(self.lock_dir):
+                # Removing a lock file someone still waits on only costs a duplicate computation
+                if entry.name.endswith(('.json', '.lock')) and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+        except OSError:
+            pass
@@ -0,0 +1,151 @@
+"""
+Context term index for Eclipse Shield.
+Turns the user's task answers into the unigram/bigram/trigram terms used by
+context relevance scoring and compiles them into one automaton, so a URL and
+its search query are matched in a single pass. Indexes are cached by context
+fingerprint and extended incrementally as contextualization adds answers.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from coalesce import context_fingerprint
+from matching import AhoCorasick
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_INDEX_CACHE_SIZE = int(os.getenv("ECLIPSE_SHIELD_CONTEXT_INDEX_CACHE_SIZE", "256"))
+
+# Separates the URL from the search query in the combined scan text. Terms
+# never contain it, so no match can straddle the two.
+_SEPARATOR = '\x00'
+
+
+def extract_terms(answer: str) -> List[str]:
+    """Words longer than 2 chars plus their 2- and 3-word phrases, lowercased."""
+    words = [word.strip('.,?!();:"\'').lower() for word in answer.split()]
+    words = [word for word in words if len(word) > 2]
+    terms = list(words)
+    terms.extend(f"{words[i]} {words[i+1]}" for i in range(len(words) - 1))
+    terms.extend(f"{words[i]} {words[i+1]} {words[i+2]}" for i in range(len(words) - 2))
+    return terms
+
+
+class ContextIndex:
+    """Compiled term set for one task context (question -> answer dict).
+
+    Only answers contribute terms. add_answer() extends the term set in place;
+    the automaton (and the batch scoring vector) is rebuilt lazily on next use.
+    """
+
+    def __init__(self, context: Optional[Mapping[str, str]] = None):
+        self.context: Dict[str, str] = {}
+        self._terms: Dict[str, None] = {}  # Ordered set
+        self._automaton: Optional[AhoCorasick] = None
+        self.vector = None  # relevance.ContextVector for batch scoring, built on first use
+        self._lock = threading.Lock()
+        for question, answer in (context or {}).items():
+            self.add_answer(question, answer)
+
+    @property
+    def terms(self) -> List[str]:
+        return list(self._terms)
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def add_answer(self, question: str, answer: str) -> None:
+        """Add one Q/A pair's terms."""
+        self.context[question] = answer
+        if not isinstance(answer, str) or not answer.strip():
+            return
+        added = False
+        for term in extract_terms(answer):
+            if term not in self._terms and _SEPARATOR not in term:
+                self._terms[term] = None
+                added = True
+        if added:
+            self._automaton = None
+            self.vector = None
+
+    def extends(self, context: Mapping[str, str]) -> bool:
+        """True if context is this index's context plus further Q/A pairs."""
+        return len(context) > len(self.context) and all(
+            question in context and context[question] == answer for question, answer in self.context.items()
+        )
+
+    def extended(self, context: Mapping[str, str]) -> 'ContextIndex':
+        """New index for a context that extends this one, reusing the terms already extracted."""
+        index = ContextIndex()
+        index.context = dict(self.context)
+        index._terms = dict(self._terms)
+        for question, answer in context.items():
+            if question not in self.context:
+                index.add_answer(question, answer)
+        return index
+
+    def _compiled(self) -> AhoCorasick:
+        automaton = self._automaton
+        if automaton is None:
+            with self._lock:
+                automaton = self._automaton
+                if automaton is None:
+                    automaton = AhoCorasick()
+                    for term in self._terms:
+                        automaton.add(term)
+                    self._automaton = automaton.build()
+        return automaton
+
+    def match(self, url_lower: str, query_lower: str = '') -> Tuple[List[str], List[str]]:
+        """Return (terms found in url_lower, terms found in query_lower), in term order."""
+        if not self._terms:
+            return [], []
+        text = f"{url_lower}{_SEPARATOR}{query_lower}" if query_lower else url_lower
+        boundary = len(url_lower)
+        in_url, in_query = set(), set()
+        for end, term in self._compiled().iter_matches(text):
+            (in_url if end <= boundary else in_query).add(term)
+        order = self._terms
+        return [t for t in order if t in in_url], [t for t in order if t in in_query]
+
+
+class ContextIndexCache:
+    """LRU of ContextIndex objects keyed by context fingerprint.
+
+    A miss for a context that extends the most recently built one (the usual
+    case while contextualization adds answers) extends that index instead of
+    re-extracting every answer.
+    """
+
+    def __init__(self, maxsize: int = CONTEXT_INDEX_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._indexes: 'OrderedDict[str, ContextIndex]' = OrderedDict()
+        self._last: Optional[ContextIndex] = None
+        self._lock = threading.Lock()
+
+    def get(self, context: Mapping[str, str], fingerprint: Optional[str] = None) -> ContextIndex:
+        if fingerprint is None:
+            fingerprint = context_fingerprint(context)
+        with self._lock:
+            index = self._indexes.get(fingerprint)
+            if index is not None:
+                self._indexes.move_to_end(fingerprint)
+                return index
+            last = self._last
+
+        if last is not None and last.extends(context):
+            index = last.extended(context)
+        else:
+            index = ContextIndex(context)
+        logger.debug("ContextIndexCache.get - built index with %s terms for context %s", len(index), fingerprint)
+
+        with self._lock:
+            self._indexes[fingerprint] = index
+            self._indexes.move_to_end(fingerprint)
+            while len(self._indexes) > self.maxsize:
+                self._indexes.popitem(last=False)
+            self._last = index
+        return index
@@ -0,0 +1,266 @@
+"""
+Learned fast path for Eclipse Shield.
+A logistic regression over hashed features of the URL (hostname and its
+parent domains, path words, query parameter names and the url_heuristics.json
+signals), each also crossed with the analysis domain. It is trained offline
+from the AI verdicts the analyzer logs at INFO ('AI ALLOWED: URL=...') and
+answers URLs it is confident about in-process, so only uncertain URLs reach
+the model. Rule stages run before it and are unaffected.
+
+    python fastpath.py train logs/eclipse_shield.log* --output fastpath_model.json
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import re
+import sys
+import time
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlparse, urlsplit
+
+from heuristics import GENERIC_BLOCKED, UrlHeuristics
+
+logger = logging.getLogger(__name__)
+
+# Trained model file; empty disables the fast path, a missing file leaves it off
+FASTPATH_MODEL = os.getenv(
+    "ECLIPSE_SHIELD_FASTPATH_MODEL",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fastpath_model.json")
+)
+# Probability the classifier needs (for ALLOW, or 1 - p for BLOCK) to answer without the model
+FASTPATH_CONFIDENCE = float(os.getenv("ECLIPSE_SHIELD_FASTPATH_CONFIDENCE", "0.97"))
+
+FEATURE_BITS = 18
+_MODEL_FORMAT = 1
+_MAX_PATH_WORDS = 12
+
+_LOGGED_VERDICT = re.compile(r"AI (ALLOWED|BLOCKED): URL=(.*?), DOMAIN=([\w-]+), EXPLANATION=")
+_PATH_SPLIT = re.compile(r"[/\-_.+~,;:=%]+")
+_WORD = re.compile(r"^[a-z]{2,30}$")
+# Query parameters _analyze_url_components reads as a search query
+_SEARCH_PARAMS = frozenset({'q', 'query', 'search', 's', 'k', 'keyword'})
+_SIGNAL_FLAGS = ('is_educational', 'is_reference', 'suspicious_paths', 'has_blocked_keywords_generic')
+
+
+def feature_names(url: str, domain: str, url_signals: Dict) -> List[str]:
+    """Readable features of a URL; url_signals is _analyze_url_components output."""
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or '').rstrip('.')
+    except ValueError:
+        return []
+    if host.startswith('www.'):
+        host = host[4:]
+
+    names = ['bias', f"host={host}", f"type={url_signals.get('domain_type', 'general')}"]
+    labels = host.split('.')
+    names.extend(f"site={'.'.join(labels[i:])}" for i in range(1, len(labels) - 1))
+    words = [word for word in _PATH_SPLIT.split(parts.path.lower()) if _WORD.match(word)]
+    names.extend(f"path={word}" for word in words[:_MAX_PATH_WORDS])
+    names.extend(f"param={name.lower()}" for name, _ in parse_qsl(parts.query, keep_blank_values=True))
+    names.extend(flag for flag in _SIGNAL_FLAGS if url_signals.get(flag))
+    # Verdicts differ between work, school and personal, so every feature also gets a per-domain copy
+    return names + [f"{domain}:{name}" for name in names]
+
+
+def hash_features(names: Iterable[str], bits: int = FEATURE_BITS) -> List[int]:
+    mask = (1 << bits) - 1
+    return [zlib.crc32(name.encode('utf-8')) & mask for name in names]
+
+
+def _sigmoid(value: float) -> float:
+    if value < -35:
+        return 0.0
+    if value > 35:
+        return 1.0
+    return 1.0 / (1.0 + math.exp(-value))
+
+
+class FastPathClassifier:
+    """Sparse logistic regression over hashed URL features; P(ALLOW) per URL."""
+
+    def __init__(self, weights: Dict[int, float], bits: int = FEATURE_BITS,
+                 confidence: float = FASTPATH_CONFIDENCE, samples: int = 0):
+        self.weights = weights
+        self.bits = bits
+        self.confidence = confidence
+        self.samples = samples
+
+    def probability(self, url: str, domain: str, url_signals: Dict) -> float:
+        weights = self.weights
+        indexes = hash_features(feature_names(url, domain, url_signals), self.bits)
+        return _sigmoid(sum(weights.get(index, 0.0) for index in indexes))
+
+    def predict(self, url: str, domain: str, url_signals: Dict) -> Optional[dict]:
+        """An analysis result when the classifier is confident, else None (ask the model)."""
+        allow = self.probability(url, domain, url_signals)
+        if allow >= self.confidence:
+            return {'isProductive': True,
+                    'explanation': f"Similar pages were allowed by the AI ({allow:.0%} confidence)."}
+        if 1.0 - allow >= self.confidence:
+            return {'isProductive': False,
+                    'explanation': f"Similar pages were blocked by the AI ({1.0 - allow:.0%} confidence)."}
+        return None
+
+    def save(self, path: str) -> None:
+        data = {
+            'format': _MODEL_FORMAT,
+            'bits': self.bits,
+            'samples': self.samples,
+            'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'weights': {str(index): round(weight, 6) for index, weight in self.weights.items() if abs(weight) >= 1e-4},
+        }
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, confidence: float = FASTPATH_CONFIDENCE) -> 'FastPathClassifier':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('format') != _MODEL_FORMAT:
+            raise ValueError(f"Unsupported fast path model format: {data.get('format')}")
+        weights = {int(index): float(weight) for index, weight in data['weights'].items()}
+        return cls(weights, int(data['bits']), confidence, int(data.get('samples', 0)))
+
+
+def load_fastpath(path: str = FASTPATH_MODEL) -> Optional[FastPathClassifier]:
+    """The trained classifier, or None when it is disabled, not trained yet or unreadable."""
+    if not path:
+        logger.info("load_fastpath - fast path classifier disabled")
+        return None
+    if not os.path.exists(path):
+        logger.info("load_fastpath - no fast path model at %s; every undecided URL goes to the model", path)
+        return None
+    try:
+        classifier = FastPathClassifier.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("load_fastpath - could not load %s: %s", path, e)
+        return None
+    logger.info("load_fastpath - loaded %s (%s weights, %s training verdicts, confidence %s)",
+                path, len(classifier.weights), classifier.samples, classifier.confidence)
+    return classifier
+
+
+# --- Training ---
+
+def read_logged_verdicts(paths: Sequence[str]) -> Iterator[Tuple[str, str, bool]]:
+    """(url, domain, allowed) for every 'AI ALLOWED/BLOCKED' line in the given log files."""
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                match = _LOGGED_VERDICT.search(line)
+                if match:
+                    yield match.group(2), match.group(3), match.group(1) == 'ALLOWED'
+
+
+def logged_url_signals(heuristics, url: str) -> Optional[Dict]:
+    """The _analyze_url_components signals the features use, or None for searches (never fast-pathed)."""
+    parts = urlparse(url)
+    if any(name.lower() in _SEARCH_PARAMS for name, _ in parse_qsl(parts.query, keep_blank_values=True)):
+        return None
+    hits = heuristics.scan(url, parts)
+    if 'is_search' in hits:
+        return None
+    path_parts = [part for part in parts.path.lower().split('/') if part]
+    return {
+        'domain_type': heuristics.categorize(hits),
+        'is_educational': 'is_educational' in hits,
+        'is_reference': 'is_reference' in hits,
+        'suspicious_paths': heuristics.has_suspicious_path(path_parts),
+        'has_blocked_keywords_generic': GENERIC_BLOCKED in hits,
+    }
+
+
+def build_examples(verdicts: Iterable[Tuple[str, str, bool]], bits: int = FEATURE_BITS) -> List[Tuple[List[int], bool]]:
+    """Hashed training examples; a URL logged several times counts once, with its latest verdict."""
+    heuristics = UrlHeuristics.load()
+    latest = {}
+    for url, domain, allowed in verdicts:
+        latest[(url, domain)] = allowed
+    examples = []
+    for (url, domain), allowed in latest.items():
+        signals = logged_url_signals(heuristics, url)
+        if signals is not None:
+            examples.append((hash_features(feature_names(url, domain, signals), bits), allowed))
+    return examples
+
+
+def train(examples: Sequence[Tuple[List[int], bool]], bits: int = FEATURE_BITS, epochs: int = 10,
+          learning_rate: float = 0.1, l2: float = 1e-4, seed: int = 0) -> FastPathClassifier:
+    """Fit by plain SGD with L2 regularization (applied to the weights each example touches)."""
+    weights: Dict[int, float] = {}
+    order = list(range(len(examples)))
+    rng = random.Random(seed)
+    for epoch in range(epochs):
+        rng.shuffle(order)
+        rate = learning_rate / (1 + epoch)
+        for position in order:
+            indexes, allowed = examples[position]
+            error = _sigmoid(sum(weights.get(index, 0.0) for index in indexes)) - (1.0 if allowed else 0.0)
+            for index in indexes:
+                weight = weights.get(index, 0.0)
+                weights[index] = weight - rate * (error + l2 * weight)
+    return FastPathClassifier(weights, bits, samples=len(examples))
+
+
+def evaluate(classifier: FastPathClassifier, examples: Sequence[Tuple[List[int], bool]]) -> Dict[str, float]:
+    """Share of examples answered locally (coverage) and how many of those match the logged verdict."""
+    answered = correct = 0
+    for indexes, allowed in examples:
+        allow = _sigmoid(sum(classifier.weights.get(index, 0.0) for index in indexes))
+        if allow >= classifier.confidence or 1.0 - allow >= classifier.confidence:
+            answered += 1
+            correct += (allow >= 0.5) == allowed
+    return {
+        'examples': len(examples),
+        'coverage': answered / len(examples) if examples else 0.0,
+        'accuracy': correct / answered if answered else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Train the Eclipse Shield fast path classifier from logged AI verdicts.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    train_parser = subparsers.add_parser('train', help="Train on log files and write the model")
+    train_parser.add_argument('logs', nargs='+', help="Analyzer log files (rotated ones included)")
+    train_parser.add_argument('--output', default=FASTPATH_MODEL or 'fastpath_model.json')
+    train_parser.add_argument('--epochs', type=int, default=10)
+    train_parser.add_argument('--holdout', type=float, default=0.2,
+                              help="Share of verdicts held out to report coverage and accuracy (0 skips)")
+    train_parser.add_argument('--confidence', type=float, default=FASTPATH_CONFIDENCE)
+    train_parser.add_argument('--min-examples', type=int, default=200,
+                              help="Refuse to write a model trained on fewer verdicts")
+    args = parser.parse_args(argv)
+
+    examples = build_examples(read_logged_verdicts(args.logs))
+    allowed = sum(1 for _, verdict in examples if verdict)
+    print(f"{len(examples)} distinct logged verdicts ({allowed} ALLOW, {len(examples) - allowed} BLOCK)")
+    if len(examples) < args.min_examples:
+        print(f"Not enough verdicts to train (need {args.min_examples})", file=sys.stderr)
+        return 1
+
+    if args.holdout > 0:
+        shuffled = list(examples)
+        random.Random(1).shuffle(shuffled)
+        cut = int(len(shuffled) * (1 - args.holdout))
+        classifier = train(shuffled[:cut], epochs=args.epochs)
+        classifier.confidence = args.confidence
+        report = evaluate(classifier, shuffled[cut:])
+        print(f"Holdout of {report['examples']}: answers {report['coverage']:.1%} locally "
+              f"at confidence {args.confidence}, {report['accuracy']:.2%} of them matching the AI")
+
+    classifier = train(examples, epochs=args.epochs)
+    classifier.save(args.output)
+    print(f"Wrote {args.output} ({len(classifier.weights)} weights)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,7 +12,10 @@ backlog = 2048
 
 # Worker processes
 workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"  # Use sync worker instead of gevent
+# The analyzer keeps no per-request state, so threaded ("gthread") or green-threaded
+# ("gevent") workers can serve many in-flight requests per process.
+worker_class = os.getenv("ECLIPSE_SHIELD_WORKER_CLASS", "sync")
+threads = int(os.getenv("ECLIPSE_SHIELD_WORKER_THREADS", "1"))  # Used by gthread workers
 worker_connections = 1000
 max_requests = 1000
 max_requests_jitter = 100
@@ -58,6 +61,12 @@ preload_app = True
 statsd_host = None
 statsd_prefix = "eclipse_shield"
 
+def on_starting(server):
+    """Called just before the master process is initialized."""
+    # Per-worker metrics files from a previous run would be added to this run's totals
+    from metrics import reset_metrics_dir
+    reset_metrics_dir()
+
 def when_ready(server):
     """Called when the server is ready to accept connections."""
     server.log.info("Eclipse Shield server ready to accept connections")
@@ -74,6 +83,12 @@ def post_fork(server, worker):
     """Called after a worker is forked."""
     server.log.info(f"Worker {worker.pid} ready")
 
+def child_exit(server, worker):
+    """Called in the master after a worker has exited."""
+    # Fold the worker's counters into the metrics archive so recycled workers don't pile up files
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
+
 def worker_abort(worker):
     """Called when a worker is aborted."""
     worker.log.info(f"Worker {worker.pid} aborted")
@@ -0,0 +1,134 @@
+"""
+URL heuristics for Eclipse Shield.
+Loads the category and signal term tables from url_heuristics.json and
+compiles them into one automaton, so the hostname, path and full URL are
+classified with a single scan instead of one substring search per term.
+"""
+
+import json
+import logging
+import os
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+from urllib.parse import urlparse
+
+from matching import AhoCorasick
+
+logger = logging.getLogger(__name__)
+
+HEURISTICS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'url_heuristics.json')
+
+# Regions of the URL a term may be required to fall within
+REGION_HOST = 'host'
+REGION_PATH = 'path'
+REGION_URL = 'url'
+
+GENERIC_BLOCKED = 'generic_blocked'
+
+
+def load_heuristics_tables(path: str = HEURISTICS_FILE) -> Dict:
+    """Load the heuristic term tables from JSON."""
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+class UrlHeuristics:
+    """Single-pass classifier for the URL category and signal tables.
+
+    scan() returns the set of hit keys for a URL: signal names such as
+    'is_search', 'category:<name>' for each matching category, the override
+    keys used by categorize(), and GENERIC_BLOCKED.
+    """
+
+    def __init__(self, tables: Dict):
+        self.default_category = tables.get('default_category', 'general')
+        self.generic_blocked_keywords = frozenset(k.lower() for k in tables.get('generic_blocked_keywords', []))
+
+        terms: Dict[str, List[Tuple[str, str]]] = {}
+
+        def register(term_list: Iterable[str], key: str, region: str):
+            for term in term_list:
+                terms.setdefault(term.lower(), []).append((key, region))
+
+        # Categories are tried in file order; overrides replace the category they belong to.
+        self._categories: List[Tuple[str, str, List[Tuple[str, str, str]]]] = []
+        for category in tables.get('categories', []):
+            name = category['name']
+            key = f"category:{name}"
+            register(category.get('hostname', []), key, REGION_HOST)
+            overrides = []
+            for index, override in enumerate(category.get('overrides', [])):
+                requires_key = f"{key}:override{index}:requires"
+                any_key = f"{key}:override{index}:any"
+                register([override['requires_hostname']], requires_key, REGION_HOST)
+                register(override.get('hostname', []), any_key, REGION_HOST)
+                overrides.append((requires_key, any_key, override['category']))
+            self._categories.append((name, key, overrides))
+
+        for signal, regions in tables.get('signals', {}).items():
+            register(regions.get('hostname', []), signal, REGION_HOST)
+            register(regions.get('path', []), signal, REGION_PATH)
+
+        register(self.generic_blocked_keywords, GENERIC_BLOCKED, REGION_URL)
+
+        self._automaton = AhoCorasick()
+        for term, tags in terms.items():
+            self._automaton.add(term, (len(term), tuple(tags)))
+        self._automaton.build()
+        logger.debug("UrlHeuristics - compiled %s terms", len(terms))
+
+    @classmethod
+    def load(cls, path: str = HEURISTICS_FILE) -> 'UrlHeuristics':
+        return cls(load_heuristics_tables(path))
+
+    def _collect(self, text: str, host_span: Tuple[int, int], path_span: Tuple[int, int], hits: set) -> None:
+        host_start, host_end = host_span
+        path_start, path_end = path_span
+        for end, (length, tags) in self._automaton.iter_matches(text):
+            start = end - length
+            in_host = host_start <= start and end <= host_end
+            in_path = path_start <= start and end <= path_end
+            for key, region in tags:
+                if region == REGION_URL or (region == REGION_HOST and in_host) or (region == REGION_PATH and in_path):
+                    hits.add(key)
+
+    def scan(self, url: str, parsed=None) -> FrozenSet[str]:
+        """Return every category/signal key hit by url in one pass over it."""
+        url_lower = url.lower()
+        if parsed is None:
+            parsed = urlparse(url)
+        hostname = parsed.netloc.lower()
+        path = parsed.path.lower()
+
+        hits: set = set()
+        host_start = url_lower.find('//') + 2 if '//' in url_lower else -1
+        host_end = host_start + len(hostname)
+        path_end = host_end + len(path)
+        if host_start >= 2 and url_lower[host_start:host_end] == hostname and url_lower[host_end:path_end] == path:
+            self._collect(url_lower, (host_start, host_end), (host_end, path_end), hits)
+        else:
+            # Unusual layout (e.g. case mapping changed lengths): scan each region on its own.
+            self._collect(hostname, (0, len(hostname)), (-1, -1), hits)
+            self._collect(path, (-1, -1), (0, len(path)), hits)
+            self._collect(url_lower, (-1, -1), (-1, -1), hits)
+        return frozenset(hits)
+
+    def scan_hostname(self, hostname: str) -> FrozenSet[str]:
+        """Return the hostname-region keys hit by a bare hostname."""
+        hostname = hostname.lower()
+        hits: set = set()
+        self._collect(hostname, (0, len(hostname)), (-1, -1), hits)
+        return frozenset(hits)
+
+    def categorize(self, hits: FrozenSet[str]) -> str:
+        """Pick the first matching category (honouring overrides) from scan hits."""
+        for name, key, overrides in self._categories:
+            if key in hits:
+                for requires_key, any_key, category in overrides:
+                    if requires_key in hits and any_key in hits:
+                        return category
+                return name
+        return self.default_category
+
+    def has_suspicious_path(self, path_parts: Iterable[str]) -> bool:
+        """True if any whole path segment is a generic blocked keyword."""
+        return not self.generic_blocked_keywords.isdisjoint(path_parts)
@@ -0,0 +1,163 @@
+"""
+Logging configuration for Eclipse Shield.
+Levels come from configuration instead of being forced to DEBUG, chatty
+analysis stages can be sampled, and records are written to files and
+streams by a background QueueListener thread so request threads never block
+on disk or console I/O.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import random
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, Dict, Iterable, Optional
+
+LOG_FORMAT = '%(asctime)s %(name)s %(levelname)s %(filename)s:%(lineno)d %(message)s'
+
+
+def level_from_name(name: Optional[str], default: int = logging.INFO) -> int:
+    """Numeric level for a name such as 'debug' or 'WARNING'; unknown names give default."""
+    if not name:
+        return default
+    level = logging.getLevelName(name.strip().upper())
+    return level if isinstance(level, int) else default
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse 'stage=rate,stage=rate' (rates clamped to 0..1); malformed entries are ignored."""
+    rates = {}
+    for item in spec.split(','):
+        stage, _, rate = item.partition('=')
+        try:
+            rates[stage.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            continue
+    rates.pop('', None)
+    return rates
+
+
+LOG_LEVEL = level_from_name(os.getenv("LOG_LEVEL"), logging.INFO)
+# Level of the analyzer (script.py) logger; DEBUG there logs full prompts per request
+ANALYZER_LOG_LEVEL = level_from_name(os.getenv("ECLIPSE_SHIELD_ANALYZER_LOG_LEVEL"), LOG_LEVEL)
+# Fraction of below-WARNING records kept per stage, e.g. "analyze_website=0.1,_check_context_relevance=0"
+LOG_SAMPLE_RATES = parse_sample_rates(os.getenv("ECLIPSE_SHIELD_LOG_SAMPLE", ""))
+
+
+class StageSampler(logging.Filter):
+    """Keeps a fraction of the below-WARNING records of each sampled stage.
+
+    The stage is the "stage - " prefix this codebase puts on log messages
+    (e.g. "analyze_website"); stages without a configured rate are kept.
+    Warnings and errors are never sampled out.
+    """
+
+    def __init__(self, rates: Dict[str, float], default: float = 1.0,
+                 rng: Callable[[], float] = random.random):
+        super().__init__()
+        self.rates = dict(rates)
+        self.default = default
+        self._random = rng
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not isinstance(record.msg, str):
+            return True
+        rate = self.rates.get(record.msg.partition(' - ')[0], self.default)
+        return rate >= 1.0 or (rate > 0.0 and self._random() < rate)
+
+
+_IMMUTABLE = (str, int, float, bool, bytes, type(None))
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread.
+
+    The stock QueueHandler formats every record in the calling thread so that
+    it can be pickled onto a multiprocessing queue. Our queue is in-process,
+    so records whose arguments are immutable scalars are enqueued as they are;
+    records with mutable arguments or exception info are still formatted
+    immediately, since what they refer to may change before the listener
+    gets to them.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        # A lone mapping argument becomes record.args itself, so a dict is always formatted now.
+        if (record.exc_info or record.stack_info or isinstance(args, dict) or
+                (args and not all(isinstance(arg, _IMMUTABLE) for arg in args))):
+            return super().prepare(record)
+        return record
+
+
+class _QueueLogging:
+    """The queue handler on the root logger and the listener thread feeding the real handlers."""
+
+    def __init__(self, handlers: Iterable[logging.Handler], sample_rates: Dict[str, float]):
+        self.handlers = tuple(handlers)
+        self.queue_handler = DeferredQueueHandler(queue.SimpleQueue())
+        if sample_rates:
+            self.queue_handler.addFilter(StageSampler(sample_rates))
+        self.listener = QueueListener(self.queue_handler.queue, *self.handlers, respect_handler_level=True)
+        self.running = False
+
+    def start(self) -> None:
+        self.listener.start()
+        self.running = True
+
+    def stop(self) -> None:
+        """Drain the queue and stop the listener thread."""
+        if self.running:
+            self.running = False
+            self.listener.stop()
+
+    def restart_after_fork(self) -> None:
+        # Only the forking thread survives fork(); give the child its own queue and listener.
+        self.queue_handler.queue = queue.SimpleQueue()
+        self.listener = QueueListener(self.queue_handler.queue, *self.handlers, respect_handler_level=True)
+        if self.running:
+            self.listener.start()
+
+
+_active: Optional[_QueueLogging] = None
+_active_lock = threading.Lock()
+
+
+def configure_logging(handlers: Iterable[logging.Handler], level: int = LOG_LEVEL,
+                      sample_rates: Optional[Dict[str, float]] = None) -> QueueListener:
+    """Send root logger output to handlers through a queue served by a background thread.
+
+    Calling it again replaces the previous configuration. The listener is
+    restarted in forked children (gunicorn preloads the app) and drained at
+    interpreter exit.
+    """
+    global _active
+    if sample_rates is None:
+        sample_rates = LOG_SAMPLE_RATES
+    root = logging.getLogger()
+    with _active_lock:
+        if _active is not None:
+            root.removeHandler(_active.queue_handler)
+            _active.stop()
+        _active = _QueueLogging(handlers, sample_rates)
+        root.addHandler(_active.queue_handler)
+        root.setLevel(level)
+        _active.start()
+        return _active.listener
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener (registered with atexit)."""
+    with _active_lock:
+        if _active is not None:
+            _active.stop()
+
+
+def _restart_after_fork() -> None:
+    if _active is not None:
+        _active.restart_after_fork()
+
+
+atexit.register(stop_logging)
+os.register_at_fork(after_in_child=_restart_after_fork)
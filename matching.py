@@ -0,0 +1,180 @@
+"""
+String matching primitives for Eclipse Shield.
+Provides a multi-pattern (Aho-Corasick) automaton that finds every rule hit
+in a single pass over a URL, and a reversed-label hostname trie for
+domain/subdomain blocklists. Both are shared by the analyzer, the CLI and
+batch paths through the compiled policy.
+"""
+
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher.
+
+    Patterns are added with an arbitrary payload, the automaton is built once,
+    and each scan reports every (end_offset, payload) hit in a single linear
+    pass over the text regardless of how many patterns are loaded.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        self._payloads: List[Any] = []
+        self._built = False
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    def add(self, pattern: str, payload: Any = None) -> None:
+        """Add a pattern; the payload is returned with each hit."""
+        if self._built:
+            raise RuntimeError("Cannot add patterns after the automaton is built")
+        if not pattern:
+            return
+
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = next_state
+
+        self._out[state] = self._out[state] + (len(self._payloads),)
+        self._payloads.append(payload if payload is not None else pattern)
+
+    def build(self) -> 'AhoCorasick':
+        """Compute failure links and merged outputs (breadth-first)."""
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                if self._out[self._fail[next_state]]:
+                    self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+        self._built = True
+        return self
+
+    def _iter_ids(self, text: str) -> Iterator[Tuple[int, int]]:
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                for pattern_id in out[state]:
+                    yield index + 1, pattern_id
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, Any]]:
+        """Yield (end_offset, payload) for every pattern occurrence in text.
+
+        end_offset is the index just past the last matched character, so
+        text[end_offset - len(pattern):end_offset] == pattern.
+        """
+        payloads = self._payloads
+        for end, pattern_id in self._iter_ids(text):
+            yield end, payloads[pattern_id]
+
+    def feed(self, text: str, state: int = 0) -> Tuple[int, List[Tuple[int, Any]]]:
+        """Scan text starting from a saved automaton state.
+
+        Returns (final_state, hits) where hits are (end_offset, payload) pairs
+        relative to text. Feeding a prefix and then the remainder from the
+        returned state reports the same hits as scanning the whole string, so
+        the state for a common prefix (e.g. a URL's scheme and host) can be
+        memoized.
+        """
+        if not self._built:
+            self.build()
+        goto, fail, out, payloads = self._goto, self._fail, self._out, self._payloads
+        hits = []
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                for pattern_id in out[state]:
+                    hits.append((index + 1, payloads[pattern_id]))
+        return state, hits
+
+    def findall(self, text: str) -> List[Any]:
+        """Return the payloads of all distinct patterns present in text, in pattern order."""
+        found = {pattern_id for _, pattern_id in self._iter_ids(text)}
+        return [self._payloads[pattern_id] for pattern_id in sorted(found)]
+
+
+class HostSuffixTrie:
+    """Label-wise trie over reversed hostnames (com -> youtube -> www).
+
+    An entry for "youtube.com" matches "youtube.com" and any subdomain such as
+    "m.youtube.com", but not "notyoutube.com". Lookups cost one dict access per
+    hostname label, independent of the number of entries.
+    """
+
+    _TERMINAL = ''  # Never a valid label, so it cannot collide with a child
+
+    def __init__(self):
+        self._root: Dict[str, Any] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _labels(host: str) -> List[str]:
+        host = host.strip().lower().strip('.')
+        if host.startswith('*.'):
+            host = host[2:]
+        return [label for label in reversed(host.split('.')) if label]
+
+    def add(self, host: str, payload: Any = None) -> None:
+        """Add a host; the first payload registered for a host is kept."""
+        labels = self._labels(host)
+        if not labels:
+            return
+        node = self._root
+        for label in labels:
+            node = node.setdefault(label, {})
+        if self._TERMINAL not in node:
+            node[self._TERMINAL] = payload if payload is not None else host
+            self._size += 1
+
+    def find_all(self, hostname: str) -> List[Any]:
+        """Return payloads of every entry covering hostname, shortest suffix first."""
+        found = []
+        node = self._root
+        for label in self._labels(hostname):
+            node = node.get(label)
+            if node is None:
+                break
+            if self._TERMINAL in node:
+                found.append(node[self._TERMINAL])
+        return found
+
+    def match(self, hostname: str) -> Any:
+        """Return the payload of the shortest entry covering hostname, or None."""
+        node = self._root
+        for label in self._labels(hostname):
+            node = node.get(label)
+            if node is None:
+                return None
+            if self._TERMINAL in node:
+                return node[self._TERMINAL]
+        return None
+
+    def __contains__(self, hostname: str) -> bool:
+        return self.match(hostname) is not None
@@ -0,0 +1,483 @@
+"""
+Metrics for Eclipse Shield.
+A small Prometheus-style registry (counters, gauges, histograms) whose values
+live in one mmap'd file per process under ECLIPSE_SHIELD_METRICS_DIR. Any
+gunicorn worker's /metrics endpoint adds up the files of every worker,
+including ones that have been recycled, and renders the text exposition
+format.
+"""
+
+import functools
+import glob
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.getenv("ECLIPSE_SHIELD_METRICS_DIR", os.path.join(tempfile.gettempdir(), "eclipse-shield-metrics"))
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+MODEL_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0)
+BATCH_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 32)
+TOKEN_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+REQUEST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+ARCHIVE_FILE = 'archive.db'
+
+# File layout: an 8-byte header holding the number of bytes in use, then
+# entries of (uint32 key length, utf-8 key padded to 8 bytes, float64 value).
+_HEADER = struct.Struct('<Q')
+_KEY_LENGTH = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+_INITIAL_SIZE = 64 * 1024
+
+
+def _padded(length: int) -> int:
+    return (length + 7) & ~7
+
+
+class _MmapValues:
+    """Float values by key in a memory-mapped file written only by its owning process.
+
+    A new entry is written before the header's used-length is advanced, and
+    values are aligned 8-byte stores, so readers in other processes see
+    either the old or the new value and never a partial entry.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._offsets: Dict[str, int] = {}
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < _INITIAL_SIZE:
+            self._file.truncate(_INITIAL_SIZE)
+            size = _INITIAL_SIZE
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        for key, _, offset in _iter_entries(self._map, self._used):
+            self._offsets[key] = offset
+
+    def add(self, key: str, amount: float) -> None:
+        with self._lock:
+            offset = self._offset(key)
+            _VALUE.pack_into(self._map, offset, _VALUE.unpack_from(self._map, offset)[0] + amount)
+
+    def set(self, key: str, value: float) -> None:
+        with self._lock:
+            _VALUE.pack_into(self._map, self._offset(key), value)
+
+    def items(self) -> List[Tuple[str, float]]:
+        with self._lock:
+            return [(key, value) for key, value, _ in _iter_entries(self._map, self._used)]
+
+    def close(self) -> None:
+        with self._lock:
+            self._map.close()
+            self._file.close()
+
+    def _offset(self, key: str) -> int:
+        offset = self._offsets.get(key)
+        if offset is None:
+            encoded = key.encode('utf-8')
+            entry_size = _KEY_LENGTH.size + _padded(len(encoded)) + _VALUE.size
+            if self._used + entry_size > len(self._map):
+                self._grow(self._used + entry_size)
+            start = self._used
+            _KEY_LENGTH.pack_into(self._map, start, len(encoded))
+            self._map[start + _KEY_LENGTH.size:start + _KEY_LENGTH.size + len(encoded)] = encoded
+            offset = start + entry_size - _VALUE.size
+            _VALUE.pack_into(self._map, offset, 0.0)
+            self._used = start + entry_size
+            _HEADER.pack_into(self._map, 0, self._used)
+            self._offsets[key] = offset
+        return offset
+
+    def _grow(self, needed: int) -> None:
+        size = len(self._map)
+        while size < needed:
+            size *= 2
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+
+def _iter_entries(buffer, used: int) -> Iterator[Tuple[str, float, int]]:
+    position = _HEADER.size
+    while position < used:
+        length = _KEY_LENGTH.unpack_from(buffer, position)[0]
+        key_start = position + _KEY_LENGTH.size
+        key = bytes(buffer[key_start:key_start + length]).decode('utf-8')
+        offset = key_start + _padded(length)
+        yield key, _VALUE.unpack_from(buffer, offset)[0], offset
+        position = offset + _VALUE.size
+
+
+def _read_file(path: str) -> List[Tuple[str, float]]:
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return []
+    if len(data) < _HEADER.size:
+        return []
+    used = min(_HEADER.unpack_from(data, 0)[0], len(data))
+    return [(key, value) for key, value, _ in _iter_entries(data, used)]
+
+
+class _MemoryValues:
+    """Process-local fallback when the metrics directory is not writable."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[str, float] = {}
+
+    def add(self, key: str, amount: float) -> None:
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, key: str, value: float) -> None:
+        with self._lock:
+            self._values[key] = value
+
+    def items(self) -> List[Tuple[str, float]]:
+        with self._lock:
+            return list(self._values.items())
+
+
+_values = None
+_values_lock = threading.Lock()
+
+
+def _process_values():
+    """This process's value file, opened on first use (and again after fork)."""
+    global _values
+    values = _values
+    if values is None:
+        with _values_lock:
+            values = _values
+            if values is None:
+                try:
+                    os.makedirs(METRICS_DIR, exist_ok=True)
+                    values = _MmapValues(os.path.join(METRICS_DIR, f"{os.getpid()}.db"))
+                except OSError as e:
+                    logger.warning("metrics - cannot use %s (%s); metrics will cover this process only", METRICS_DIR, e)
+                    values = _MemoryValues()
+                _values = values
+    return values
+
+
+def _forget_values_after_fork() -> None:
+    global _values, _values_lock
+    _values = None  # The parent's file stays the parent's
+    _values_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_values_after_fork)
+
+
+def _sample_key(name: str, suffix: str, labels: Sequence[Tuple[str, str]]) -> str:
+    return json.dumps([name, suffix, list(labels)], separators=(',', ':'))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._keys: Dict[tuple, str] = {}
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _labels(self, labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+        if len(labels) != len(self.labelnames) or not all(name in labels for name in self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    def _key(self, suffix: str, labels: Dict[str, str]) -> str:
+        cache_key = (suffix,) + tuple(labels.get(name) for name in self.labelnames)
+        key = self._keys.get(cache_key)
+        if key is None:
+            key = self._keys[cache_key] = _sample_key(self.name, suffix, self._labels(labels))
+        return key
+
+
+class Counter(_Metric):
+    """Monotonic total, summed over every process that ever recorded it."""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        _process_values().add(self._key('', labels), amount)
+
+
+class Gauge(_Metric):
+    """Current value, summed over live processes only."""
+
+    kind = 'gauge'
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        _process_values().add(self._key('', labels), amount)
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        _process_values().add(self._key('', labels), -amount)
+
+    def set(self, value: float, **labels) -> None:
+        _process_values().set(self._key('', labels), value)
+
+    def track_inprogress(self, **labels) -> '_InProgress':
+        """Context manager that counts the block as in progress while it runs."""
+        return _InProgress(self, labels)
+
+
+class _InProgress:
+    __slots__ = ('gauge', 'labels')
+
+    def __init__(self, gauge: Gauge, labels: Dict[str, str]):
+        self.gauge = gauge
+        self.labels = labels
+
+    def __enter__(self):
+        self.gauge.inc(**self.labels)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.gauge.dec(**self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    """Latency distribution with fixed upper bounds (seconds by convention)."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry=None):
+        if 'le' in labelnames:
+            raise ValueError("'le' is reserved for histogram buckets")
+        self.buckets = tuple(sorted(float(bound) for bound in buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float, **labels) -> None:
+        values = _process_values()
+        index = bisect_left(self.buckets, value)
+        bucket = 'Inf' if index == len(self.buckets) else repr(self.buckets[index])
+        values.add(self._key(f"_bucket:{bucket}", labels), 1.0)
+        values.add(self._key('_sum', labels), value)
+
+    def time(self, **labels) -> '_Timer':
+        """Context manager that observes the block's duration."""
+        return _Timer(self, labels)
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Registry:
+    """Metric definitions, and rendering of the values recorded by all processes."""
+
+    def __init__(self, metrics_dir: Optional[str] = None):
+        self.metrics_dir = metrics_dir
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def collect(self) -> Dict[str, float]:
+        """Sample key -> value summed over the value files (gauges from live processes only)."""
+        metrics_dir = self.metrics_dir or METRICS_DIR
+        sources: List[Tuple[bool, Iterable[Tuple[str, float]]]] = []
+        values = _process_values()
+        if isinstance(values, _MemoryValues):
+            sources.append((True, values.items()))
+        for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+            name = os.path.basename(path)[:-3]
+            alive = name.isdigit() and _pid_alive(int(name))
+            sources.append((alive, _read_file(path)))
+
+        totals: Dict[str, float] = {}
+        for alive, items in sources:
+            for key, value in items:
+                metric = self._metrics.get(json.loads(key)[0])
+                if metric is None or (metric.kind == 'gauge' and not alive):
+                    continue
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+    def render(self) -> str:
+        """All registered metrics in the Prometheus text exposition format."""
+        samples: Dict[str, List[Tuple[str, tuple, float]]] = {}
+        for key, value in self.collect().items():
+            name, suffix, labels = json.loads(key)
+            samples.setdefault(name, []).append((suffix, tuple(tuple(pair) for pair in labels), value))
+
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            recorded = samples.get(metric.name, [])
+            if isinstance(metric, Histogram):
+                lines.extend(_render_histogram(metric, recorded))
+            else:
+                for suffix, labels, value in sorted(recorded):
+                    lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _render_histogram(metric: Histogram, recorded: List[Tuple[str, tuple, float]]) -> List[str]:
+    series: Dict[tuple, Dict[str, float]] = {}
+    for suffix, labels, value in recorded:
+        series.setdefault(labels, {})[suffix] = value
+    lines = []
+    for labels in sorted(series):
+        values = series[labels]
+        cumulative = 0.0
+        for bound in metric.buckets:
+            cumulative += values.get(f"_bucket:{bound!r}", 0.0)
+            lines.append(f"{metric.name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {_format_value(cumulative)}")
+        cumulative += values.get('_bucket:Inf', 0.0)
+        lines.append(f"{metric.name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {_format_value(cumulative)}")
+        lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(values.get('_sum', 0.0))}")
+        lines.append(f"{metric.name}_count{_format_labels(labels)} {_format_value(cumulative)}")
+    return lines
+
+
+def _escape_help(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    pairs = [
+        f'{name}="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in labels
+    ]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value == int(value) and abs(value) < 1e15 else repr(value)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+REGISTRY = Registry()
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+def reset_metrics_dir(metrics_dir: Optional[str] = None) -> None:
+    """Delete value files left by earlier runs; call once in the gunicorn master before forking."""
+    metrics_dir = metrics_dir or METRICS_DIR
+    own = f"{os.getpid()}.db"
+    for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+        if os.path.basename(path) != own:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning("reset_metrics_dir - could not remove %s: %s", path, e)
+
+
+def mark_process_dead(pid: int, metrics_dir: Optional[str] = None) -> None:
+    """Fold an exited worker's counters and histograms into the archive file and remove its file.
+
+    Keeps the number of value files bounded as gunicorn recycles workers.
+    Must only be called from one process (the gunicorn master's child_exit hook).
+    """
+    metrics_dir = metrics_dir or METRICS_DIR
+    path = os.path.join(metrics_dir, f"{pid}.db")
+    items = _read_file(path)
+    if not items:
+        return
+    archive = _MmapValues(os.path.join(metrics_dir, ARCHIVE_FILE))
+    try:
+        for key, value in items:
+            metric = REGISTRY.get(json.loads(key)[0])
+            if metric is not None and metric.kind != 'gauge':
+                archive.add(key, value)
+    finally:
+        archive.close()
+    try:
+        os.remove(path)
+    except OSError as e:
+        logger.warning("mark_process_dead - could not remove %s: %s", path, e)
+
+
+# --- Eclipse Shield metrics ---
+
+STAGE_SECONDS = Histogram(
+    'eclipse_shield_stage_seconds', 'Time spent in each stage of URL analysis.', ['stage'])
+REQUEST_SECONDS = Histogram(
+    'eclipse_shield_request_seconds', 'Time to serve an analysis endpoint.', ['endpoint'],
+    buckets=REQUEST_BUCKETS)
+CACHE_LOOKUPS = Counter(
+    'eclipse_shield_cache_lookups_total', 'Verdict lookups per cache layer and result (hit/miss).', ['layer', 'result'])
+MODEL_CALLS = Counter(
+    'eclipse_shield_model_calls_total', 'Model calls by kind (analysis/analysis_batch/question) and outcome (ok/error).', ['kind', 'outcome'])
+MODEL_CALL_SECONDS = Histogram(
+    'eclipse_shield_model_call_seconds', 'Model call latency by kind.', ['kind'], buckets=MODEL_BUCKETS)
+PROMPT_TOKENS = Histogram(
+    'eclipse_shield_prompt_tokens', 'Estimated input tokens per model prompt by kind.', ['kind'],
+    buckets=TOKEN_BUCKETS)
+MODEL_TOKENS = Counter(
+    'eclipse_shield_model_tokens_total', 'Tokens reported by the model by kind and direction (prompt/response).',
+    ['kind', 'direction'])
+MODEL_BATCH_SIZE = Histogram(
+    'eclipse_shield_model_batch_size', 'URLs per micro-batched analysis model call.', buckets=BATCH_BUCKETS)
+MICROBATCH_FALLBACKS = Counter(
+    'eclipse_shield_microbatch_fallbacks_total', 'Batched URLs re-asked one by one because the reply did not have exactly one verdict per URL.')
+FASTPATH_PREDICTIONS = Counter(
+    'eclipse_shield_fastpath_predictions_total', 'Fast path classifier lookups by result (answered/deferred to the model).',
+    ['result'])
+RATE_LIMITED = Counter(
+    'eclipse_shield_rate_limited_total', 'Requests or analyses rejected by a rate limiter.', ['limiter'])
+IN_FLIGHT = Gauge(
+    'eclipse_shield_in_flight', 'Requests and model calls currently in progress.', ['what'])
+
+
+def timed_endpoint(endpoint: str):
+    """Decorator recording a view's latency and counting it as an in-flight request."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with IN_FLIGHT.track_inprogress(what='requests'), REQUEST_SECONDS.time(endpoint=endpoint):
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,137 @@
+"""
+Micro-batching of model calls for Eclipse Shield.
+AI analyses that arrive while another model call is already in flight are
+held for a few milliseconds and sent together as one prompt asking for a
+numbered verdict per URL. When nothing else is in flight the call goes out
+at once, so an idle server adds no latency. Batches are formed per prompt
+prefix (domain, policy version, task context) so every URL in a batch shares
+one prompt prefix.
+"""
+
+import logging
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Most URLs per batched model call (1 disables micro-batching)
+MICROBATCH_SIZE = int(os.getenv("ECLIPSE_SHIELD_MICROBATCH_SIZE", "8"))
+# Longest time a batch waits for more URLs once another model call is in flight
+MICROBATCH_WAIT_MS = float(os.getenv("ECLIPSE_SHIELD_MICROBATCH_WAIT_MS", "10"))
+
+# '3. ALLOW: reason', '3) BLOCK - reason', 'URL 3: ALLOW reason', '**3.** allow: reason'
+_VERDICT_LINE = re.compile(r"^(?:url\s*)?(\d+)\s*[.):\-]?\s*(ALLOW|BLOCK)\b\s*[:\-–]?\s*(.*)$", re.IGNORECASE)
+
+
+def parse_numbered_verdicts(text: str, count: int) -> Dict[int, Tuple[str, str]]:
+    """Map 1-based URL number -> (ALLOW|BLOCK, reason) from a batched reply.
+
+    Lines that are not verdicts are ignored. The reply is only trusted when
+    it holds exactly count verdict lines numbered 1..count; a missing, extra,
+    repeated or out-of-range verdict means the lines cannot be attributed to
+    URLs safely, so {} is returned and callers ask for every URL on its own.
+    """
+    verdicts: Dict[int, Tuple[str, str]] = {}
+    lines = 0
+    for line in text.splitlines():
+        match = _VERDICT_LINE.match(line.replace('*', '').strip().lstrip('#>- '))
+        if not match:
+            continue
+        lines += 1
+        number = int(match.group(1))
+        if not 1 <= number <= count or number in verdicts:
+            return {}
+        verdicts[number] = (match.group(2).upper(), match.group(3).strip())
+    if lines != count or len(verdicts) != count:
+        return {}
+    return verdicts
+
+
+class BatchReply:
+    """One URL's verdict line from a batched reply, shaped like a model response."""
+
+    __slots__ = ('text',)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _Batch:
+    __slots__ = ('items', 'full', 'done', 'results', 'error')
+
+    def __init__(self, item: Any):
+        self.items = [item]
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results: Optional[Sequence[Any]] = None
+        self.error: Optional[BaseException] = None
+
+
+class MicroBatcher:
+    """Collects concurrent submissions per key into batches for run_batch.
+
+    submit(key, item) returns run_batch(items)[i] for the item's position i.
+    The first submitter of a batch is its leader: if no other batch is
+    gathering or running it runs its item alone right away; otherwise it waits
+    up to max_wait seconds (or until max_items have joined) and runs the whole
+    batch, while the other submitters wait for its results.
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], Sequence[Any]],
+                 max_items: int = MICROBATCH_SIZE, max_wait: float = MICROBATCH_WAIT_MS / 1000.0):
+        self.run_batch = run_batch
+        self.max_items = max(1, max_items)
+        self.max_wait = max_wait
+        self._open: Dict[Hashable, _Batch] = {}
+        self._active = 0  # Batches gathering or running
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, item: Any) -> Any:
+        with self._lock:
+            batch = self._open.get(key)
+            if batch is not None:
+                index = len(batch.items)
+                batch.items.append(item)
+                if len(batch.items) >= self.max_items:
+                    del self._open[key]
+                    batch.full.set()
+            else:
+                index = 0
+                batch = _Batch(item)
+                gather = self._active > 0 and self.max_items > 1
+                if gather:
+                    self._open[key] = batch
+                self._active += 1
+
+        if index:
+            with span('batch_wait'):
+                batch.done.wait()
+        else:
+            if gather:
+                with span('batch_wait'):
+                    batch.full.wait(self.max_wait)
+            self._run(key, batch)
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[index]
+
+    def _run(self, key: Hashable, batch: _Batch) -> None:
+        with self._lock:
+            if self._open.get(key) is batch:
+                del self._open[key]
+            items = list(batch.items)  # No one can join once the batch is closed
+        if len(items) > 1:
+            logger.debug("MicroBatcher - running a batch of %s for %s", len(items), key)
+        try:
+            batch.results = self.run_batch(items)
+        except BaseException as e:
+            batch.error = e
+        finally:
+            with self._lock:
+                self._active -= 1
+            batch.done.set()
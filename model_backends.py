@@ -0,0 +1,315 @@
+"""
+Model backends for Eclipse Shield.
+ProductivityAnalyzer talks to any object with generate_content (and
+optionally generate_content_async). Besides Gemini this module provides a
+rule-based stand-in that runs in-process (StubModel) or behind
+stub_model_server.py (HttpModel), with configurable latency, 429/500 rates,
+timeouts and streaming, so load tests exercise real concurrency without the
+network or an API key.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import re
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, replace
+from typing import Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# gemini (default), stub (in-process stand-in) or http (stub_model_server.py)
+MODEL_BACKEND = os.getenv("ECLIPSE_SHIELD_MODEL_BACKEND", "gemini").strip().lower()
+# Failure/latency profile of the stub backend, e.g. "realistic" or "fast,rate_limit=0.05"
+STUB_PROFILE = os.getenv("ECLIPSE_SHIELD_STUB_PROFILE", "fast")
+MODEL_URL = os.getenv("ECLIPSE_SHIELD_MODEL_URL", "http://127.0.0.1:8765")
+MODEL_TIMEOUT = float(os.getenv("ECLIPSE_SHIELD_MODEL_TIMEOUT", "30"))
+
+
+class ModelBackendError(Exception):
+    """A failed model call; status is the HTTP status the real API would have answered with."""
+
+    status = 500
+
+
+class ModelRateLimited(ModelBackendError):
+    status = 429
+
+
+class ModelServerError(ModelBackendError):
+    status = 500
+
+
+class ModelTimeout(ModelBackendError):
+    status = 504
+
+
+_ERRORS_BY_STATUS = {429: ModelRateLimited, 500: ModelServerError, 504: ModelTimeout}
+
+
+@dataclass(frozen=True)
+class StubProfile:
+    """Latency and failure behaviour of the stand-in model.
+
+    latency is 'none', 'fixed:S', 'uniform:LOW:HIGH' or 'lognormal:MEDIAN:SIGMA'
+    (seconds). rate_limit, server_error and timeout are per-call probabilities;
+    a timed-out call hangs for timeout_after seconds before failing. Streamed
+    replies are split into chunks of chunk_chars characters, chunk_delay apart.
+    """
+
+    latency: str = 'none'
+    rate_limit: float = 0.0
+    server_error: float = 0.0
+    timeout: float = 0.0
+    timeout_after: float = 5.0
+    chunk_chars: int = 16
+    chunk_delay: float = 0.0
+    seed: Optional[int] = None
+
+    def sample_latency(self, rng: random.Random) -> float:
+        kind, _, params = self.latency.partition(':')
+        values = [float(value) for value in params.split(':') if value]
+        if kind == 'fixed':
+            return values[0]
+        if kind == 'uniform':
+            return rng.uniform(values[0], values[1])
+        if kind == 'lognormal':
+            return rng.lognormvariate(math.log(values[0]), values[1])
+        return 0.0
+
+
+PROFILES = {
+    'fast': StubProfile(),
+    # Roughly what gemini-2.0-flash looks like on a good day
+    'realistic': StubProfile(latency='lognormal:0.6:0.35', rate_limit=0.01, server_error=0.005),
+    'degraded': StubProfile(latency='lognormal:2.0:0.6', rate_limit=0.10, server_error=0.05,
+                            timeout=0.02, timeout_after=10.0),
+}
+
+
+def parse_profile(spec: str) -> StubProfile:
+    """Parse 'preset,field=value,...' (e.g. 'realistic,rate_limit=0.2'); unknown presets and fields raise ValueError."""
+    profile = PROFILES['fast']
+    for item in (part.strip() for part in spec.split(',')):
+        if not item:
+            continue
+        if '=' not in item:
+            if item not in PROFILES:
+                raise ValueError(f"Unknown stub profile: {item}")
+            profile = PROFILES[item]
+            continue
+        name, _, value = (part.strip() for part in item.partition('='))
+        if name == 'latency':
+            profile = replace(profile, latency=value)
+        elif name in ('chunk_chars', 'seed'):
+            profile = replace(profile, **{name: int(value)})
+        elif name in ('rate_limit', 'server_error', 'timeout', 'timeout_after', 'chunk_delay'):
+            profile = replace(profile, **{name: float(value)})
+        else:
+            raise ValueError(f"Unknown stub profile field: {name}")
+    profile.sample_latency(random.Random(0))  # Reject malformed latency specs now, not on the first call
+    return profile
+
+
+class StubResponse:
+    __slots__ = ('text',)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubStreamResponse:
+    """Streamed reply: iterate (or async-iterate) for chunks; .text waits for the rest."""
+
+    def __init__(self, chunks: Iterable[str], chunk_delay: float = 0.0):
+        self._chunks = iter(chunks)
+        self._chunk_delay = chunk_delay
+        self._received = []
+
+    def __iter__(self) -> Iterator[StubResponse]:
+        for chunk in self._chunks:
+            if self._chunk_delay:
+                time.sleep(self._chunk_delay)
+            self._received.append(chunk)
+            yield StubResponse(chunk)
+
+    async def __aiter__(self):
+        for chunk in self._chunks:
+            if self._chunk_delay:
+                await asyncio.sleep(self._chunk_delay)
+            self._received.append(chunk)
+            yield StubResponse(chunk)
+
+    @property
+    def text(self) -> str:
+        for _ in self:
+            pass
+        return ''.join(self._received)
+
+
+_URL_LINE = re.compile(r"^\s*- URL: (\S+)", re.MULTILINE)
+_CATEGORY_LINE = re.compile(r"^\s*- Detected Category: (.+)$", re.MULTILINE)
+_RELEVANCE_LINE = re.compile(r"^\s*- Context Relevance Score: ([0-9.]+)", re.MULTILINE)
+_ANSWER_LINE = re.compile(r"^\s*A: ", re.MULTILINE)
+_BATCH_ITEM = re.compile(r"^URL (\d+):\s*$", re.MULTILINE)
+
+# url_heuristics.json categories the stand-in blocks unless the task context matches
+_BLOCKED_CATEGORIES = frozenset({'social media', 'streaming/entertainment', 'gaming', 'e-commerce/shopping'})
+
+
+def _verdict(facts: str) -> str:
+    category = _CATEGORY_LINE.search(facts)
+    category = category.group(1).strip() if category else 'general'
+    relevance = _RELEVANCE_LINE.search(facts)
+    relevance = float(relevance.group(1)) if relevance else 0.0
+    if category in _BLOCKED_CATEGORIES and relevance < 0.5:
+        return f"BLOCK: {category} site is not related to the task."
+    return f"ALLOW: {category} site is acceptable for the task."
+
+
+def rule_reply(prompt: str) -> str:
+    """Answer an analyzer prompt the way the stand-in model does.
+
+    Analysis prompts are blocked for time-wasting categories unless the
+    context relevance score is at least 0.5, and allowed otherwise; batched
+    prompts get one numbered verdict per URL. Question prompts get 'DONE'
+    once two answers are in the history.
+    """
+    if _URL_LINE.search(prompt) is None:
+        if len(_ANSWER_LINE.findall(prompt)) >= 2:
+            return "DONE"
+        return "What specific outcome are you trying to achieve?"
+    blocks = _BATCH_ITEM.split(prompt)
+    if len(blocks) > 1:
+        # [text before URL 1, '1', facts of URL 1, '2', facts of URL 2, ...]
+        return '\n'.join(f"{number}. {_verdict(facts)}" for number, facts in zip(blocks[1::2], blocks[2::2]))
+    return _verdict(prompt)
+
+
+def _chunks(text: str, size: int) -> Iterator[str]:
+    for start in range(0, len(text), max(1, size)):
+        yield text[start:start + size]
+
+
+def _call_timeout(request_options) -> Optional[float]:
+    if isinstance(request_options, dict):
+        return request_options.get('timeout')
+    return None
+
+
+class StubModel:
+    """In-process stand-in for genai.GenerativeModel driven by a StubProfile."""
+
+    def __init__(self, profile: Optional[StubProfile] = None):
+        self.profile = profile or PROFILES['fast']
+        self._rng = random.Random(self.profile.seed)
+        self._lock = threading.Lock()
+
+    def draw(self) -> Tuple[float, Optional[ModelBackendError]]:
+        """(seconds to wait, error to raise afterwards or None) for the next call."""
+        profile = self.profile
+        with self._lock:
+            roll = self._rng.random()
+            if roll < profile.timeout:
+                return profile.timeout_after, ModelTimeout("Stub model timed out")
+            roll -= profile.timeout
+            if roll < profile.rate_limit:
+                return 0.0, ModelRateLimited("Stub model rate limit exceeded (429)")
+            roll -= profile.rate_limit
+            latency = profile.sample_latency(self._rng)
+        if roll < profile.server_error:
+            return latency, ModelServerError("Stub model internal error (500)")
+        return latency, None
+
+    def _respond(self, contents: str, stream: bool):
+        text = rule_reply(contents)
+        if stream:
+            return StubStreamResponse(_chunks(text, self.profile.chunk_chars), self.profile.chunk_delay)
+        return StubResponse(text)
+
+    def generate_content(self, contents: str, stream: bool = False, request_options=None, **kwargs):
+        delay, error = self.draw()
+        timeout = _call_timeout(request_options)
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise ModelTimeout(f"Stub model did not answer within {timeout}s")
+        if delay:
+            time.sleep(delay)
+        if error is not None:
+            raise error
+        return self._respond(contents, stream)
+
+    async def generate_content_async(self, contents: str, stream: bool = False, request_options=None, **kwargs):
+        delay, error = self.draw()
+        timeout = _call_timeout(request_options)
+        if timeout is not None and delay > timeout:
+            await asyncio.sleep(timeout)
+            raise ModelTimeout(f"Stub model did not answer within {timeout}s")
+        if delay:
+            await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return self._respond(contents, stream)
+
+
+class HttpModel:
+    """Client for stub_model_server.py (POST /v1/generate), mapping 429/500/504 to ModelBackendError."""
+
+    def __init__(self, url: str = MODEL_URL, timeout: float = MODEL_TIMEOUT):
+        self.endpoint = url.rstrip('/') + '/v1/generate'
+        self.timeout = timeout
+
+    def generate_content(self, contents: str, stream: bool = False, request_options=None, **kwargs):
+        timeout = _call_timeout(request_options) or self.timeout
+        body = json.dumps({'contents': contents, 'stream': bool(stream)}).encode('utf-8')
+        request = urllib.request.Request(self.endpoint, data=body, method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            response = urllib.request.urlopen(request, timeout=timeout)
+        except urllib.error.HTTPError as e:
+            error = _ERRORS_BY_STATUS.get(e.code, ModelBackendError)
+            raise error(f"Model server answered {e.code}: {e.read()[:200].decode('utf-8', 'replace')}") from e
+        except (socket.timeout, TimeoutError) as e:
+            raise ModelTimeout(f"Model server did not answer within {timeout}s") from e
+        except urllib.error.URLError as e:
+            if isinstance(e.reason, (socket.timeout, TimeoutError)):
+                raise ModelTimeout(f"Model server did not answer within {timeout}s") from e
+            raise ModelServerError(f"Model server unreachable: {e.reason}") from e
+
+        if stream:
+            return StubStreamResponse(self._read_chunks(response, timeout))
+        with response:
+            return StubResponse(json.loads(response.read())['text'])
+
+    @staticmethod
+    def _read_chunks(response, timeout: float) -> Iterator[str]:
+        with response:
+            try:
+                for line in response:
+                    if line.strip():
+                        yield json.loads(line)['text']
+            except (socket.timeout, TimeoutError) as e:
+                raise ModelTimeout(f"Model server stream stalled for {timeout}s") from e
+
+    async def generate_content_async(self, contents: str, stream: bool = False, request_options=None, **kwargs):
+        return await asyncio.to_thread(self.generate_content, contents, stream, request_options)
+
+
+def load_model_backend(name: str = MODEL_BACKEND):
+    """The configured stand-in model, or None when Gemini is selected (the analyzer configures it)."""
+    if name in ('', 'gemini'):
+        return None
+    if name == 'stub':
+        logger.info("load_model_backend - using in-process stub model (profile %r)", STUB_PROFILE)
+        return StubModel(parse_profile(STUB_PROFILE))
+    if name == 'http':
+        logger.info("load_model_backend - using model server at %s", MODEL_URL)
+        return HttpModel(MODEL_URL, MODEL_TIMEOUT)
+    raise ValueError(f"Unknown model backend: {name}")
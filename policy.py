@@ -0,0 +1,450 @@
+"""
+Compiled domain policy for Eclipse Shield.
+Turns the per-domain rule lists from settings.json into lookup structures
+that answer allow/block/undecided for a URL in a single pass, and watches
+settings.json so a new policy snapshot can be swapped in without a restart.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse, urlsplit
+
+from matching import AhoCorasick, HostSuffixTrie
+
+logger = logging.getLogger(__name__)
+
+ALLOW = 'allow'
+BLOCK = 'block'
+
+# Rule lists whose entries allow a URL when found anywhere in it, in check order.
+ALLOWED_PLATFORM_TYPES = ('lms_platforms', 'productivity_tools', 'ai_tools')
+
+# Every settings key that feeds the URL rule stages
+RULE_KEYS = ALLOWED_PLATFORM_TYPES + ('blocked_specific', 'blocked_keywords')
+
+# Rule kinds carried in match payloads
+_KIND_ALLOW = 0
+_KIND_BLOCKED_SPECIFIC = 1
+_KIND_BLOCKED_KEYWORD = 2
+
+# Hosts remembered per policy domain by the deterministic-rule memo
+HOST_MEMO_SIZE = int(os.getenv("ECLIPSE_SHIELD_HOST_MEMO_SIZE", "4096"))
+
+
+class PolicyDecision(NamedTuple):
+    """Outcome of the deterministic rule stages for one URL."""
+    verdict: str      # ALLOW or BLOCK
+    rule_type: str    # settings key that produced the decision
+    rule: str         # the matching entry as written in settings.json
+
+
+def _string_entries(settings: Dict, key: str, domain: str) -> list:
+    """Return the string entries of a settings list, warning once about bad data."""
+    entries = settings.get(key, [])
+    if not isinstance(entries, list):
+        logger.warning("Setting '%s' for domain '%s' is not a list.", key, domain)
+        return []
+    valid = []
+    for entry in entries:
+        if not isinstance(entry, str) or not entry:
+            logger.warning("Non-string entry found in '%s' for domain '%s': %s", key, domain, entry)
+            continue
+        valid.append(entry)
+    return valid
+
+
+def _fingerprint(value) -> str:
+    """Stable short hash of a JSON-serializable value."""
+    encoded = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:16]
+
+
+def validate_domain_settings(settings: Dict) -> None:
+    """Strictly validate the structure of a settings.json document.
+
+    Raises ValueError describing the first problem found. Used before a
+    reloaded file is allowed to replace the live policy.
+    """
+    if not isinstance(settings, dict):
+        raise ValueError("settings root must be an object")
+    domains = settings.get("domains")
+    if not isinstance(domains, dict) or not domains:
+        raise ValueError("settings must contain a non-empty 'domains' object")
+    for name, domain_settings in domains.items():
+        if not isinstance(domain_settings, dict):
+            raise ValueError(f"settings for domain '{name}' must be an object")
+        for key in RULE_KEYS:
+            entries = domain_settings.get(key, [])
+            if not isinstance(entries, list):
+                raise ValueError(f"'{key}' for domain '{name}' must be a list")
+            for entry in entries:
+                if not isinstance(entry, str) or not entry:
+                    raise ValueError(f"'{key}' for domain '{name}' contains a non-string or empty entry: {entry!r}")
+
+
+class _HostOutcome(NamedTuple):
+    """Memoized rule-scan result for a URL's "scheme://host" prefix."""
+    state: int                  # automaton state after the prefix
+    allow: Optional[tuple]      # best allow payload hit within the prefix
+    keyword: Optional[tuple]    # best blocked keyword payload hit within the prefix
+    specific: Optional[tuple]   # best blocked_specific host payload for the hostname
+
+
+def _better(current: Optional[tuple], candidate: Optional[tuple]) -> Optional[tuple]:
+    if candidate is None or (current is not None and current[1] <= candidate[1]):
+        return current
+    return candidate
+
+
+def _split_origin(url_lower: str) -> Tuple[str, str]:
+    """Split a URL into its "scheme://netloc" prefix and the remainder."""
+    start = url_lower.find('//')
+    if start < 0:
+        return '', url_lower
+    end = len(url_lower)
+    for delimiter in '/?#':
+        index = url_lower.find(delimiter, start + 2)
+        if 0 <= index < end:
+            end = index
+    return url_lower[:end], url_lower[end:]
+
+
+def _split_host_port(entry: str) -> Tuple[Optional[str], Optional[int]]:
+    """('example.com', 8080) for a 'example.com:8080' entry; (None, None) if it is not host:port."""
+    try:
+        parts = urlsplit('//' + entry)
+        port = parts.port
+    except ValueError:
+        return None, None
+    if port is None or not parts.hostname or parts.username is not None:
+        return None, None
+    return parts.hostname, port
+
+
+class DomainPolicy:
+    """Rules for a single policy domain (work, school, personal, ...).
+
+    Allowed platforms and blocked keywords match anywhere in the lowercased URL
+    and share one automaton so a URL is scanned once. blocked_specific entries
+    that are plain hostnames block that host and its subdomains via a
+    reversed-label trie, and 'host:port' entries do the same for URLs that
+    name that port explicitly; every blocked_specific entry also blocks an
+    exactly equal URL.
+
+    Most URLs on a host share the same rule outcome for the host part, so the
+    scan state for each "scheme://host" prefix is memoized (bounded LRU).
+    An allowed platform found in the host answers every path on that host
+    with one dict lookup; otherwise only the path and query are scanned.
+    The memo lives on the policy snapshot and is discarded with it on reload.
+    """
+
+    def __init__(self, name: str, settings: Dict, memo_size: int = HOST_MEMO_SIZE):
+        self.name = name
+        self.settings = settings
+        self.fingerprint = _fingerprint(settings)
+        self.options_fingerprint = _fingerprint({k: v for k, v in settings.items() if k not in RULE_KEYS})
+        self.contextualization_required = settings.get("contextualization_required", name == "personal")
+
+        self.blocked_urls: Dict[str, tuple] = {}
+        self.blocked_hosts = HostSuffixTrie()
+        self.blocked_host_ports: Dict[int, HostSuffixTrie] = {}  # 'host:port' entries, by port
+        self._automaton = AhoCorasick()
+        rank = 0
+
+        for platform_type in ALLOWED_PLATFORM_TYPES:
+            for platform in _string_entries(settings, platform_type, name):
+                self._automaton.add(platform.lower(), (_KIND_ALLOW, rank, platform_type, platform))
+                rank += 1
+
+        for blocked in _string_entries(settings, 'blocked_specific', name):
+            blocked_lower = blocked.lower()
+            payload = (_KIND_BLOCKED_SPECIFIC, rank, 'blocked_specific', blocked)
+            self.blocked_urls.setdefault(blocked_lower, payload)
+            if '/' not in blocked_lower and ':' not in blocked_lower:
+                self.blocked_hosts.add(blocked_lower, payload)
+            elif '/' not in blocked_lower:
+                host, port = _split_host_port(blocked_lower)
+                if host:
+                    self.blocked_host_ports.setdefault(port, HostSuffixTrie()).add(host, payload)
+            rank += 1
+
+        for keyword in _string_entries(settings, 'blocked_keywords', name):
+            self._automaton.add(keyword.lower(), (_KIND_BLOCKED_KEYWORD, rank, 'blocked_keywords', keyword))
+            rank += 1
+
+        self._automaton.build()
+        self.rule_count = rank
+
+        self.memo_size = memo_size
+        self._host_memo: "OrderedDict[str, Optional[_HostOutcome]]" = OrderedDict()
+        self._memo_lock = threading.Lock()
+
+    def is_blocked_host(self, hostname: str) -> bool:
+        """Return True if hostname or one of its parent domains is in blocked_specific."""
+        return hostname in self.blocked_hosts
+
+    def _host_outcome(self, origin: str) -> Optional[_HostOutcome]:
+        """Return the memoized scan result for a "scheme://host" prefix."""
+        if self.memo_size > 0:
+            with self._memo_lock:
+                if origin in self._host_memo:
+                    self._host_memo.move_to_end(origin)
+                    return self._host_memo[origin]
+
+        outcome = None
+        try:
+            parsed = urlparse(origin)
+            hostname, port = parsed.hostname, parsed.port
+        except ValueError:
+            hostname = port = None
+        if hostname:
+            state, hits = self._automaton.feed(origin)
+            allow = keyword = None
+            for _, payload in hits:
+                if payload[0] == _KIND_ALLOW:
+                    allow = _better(allow, payload)
+                else:
+                    keyword = _better(keyword, payload)
+            specific = None
+            for payload in self.blocked_hosts.find_all(hostname):
+                specific = _better(specific, payload)
+            if port is not None and port in self.blocked_host_ports:
+                for payload in self.blocked_host_ports[port].find_all(hostname):
+                    specific = _better(specific, payload)
+            outcome = _HostOutcome(state, allow, keyword, specific)
+
+        if self.memo_size > 0:
+            with self._memo_lock:
+                self._host_memo[origin] = outcome
+                if len(self._host_memo) > self.memo_size:
+                    self._host_memo.popitem(last=False)
+        return outcome
+
+    def evaluate(self, url: str) -> Optional[PolicyDecision]:
+        """Return the rule decision for url, or None when no rule applies.
+
+        Precedence matches the original list walk: allowed platforms first,
+        then blocked_specific, then blocked_keywords; within a type the entry
+        listed first in settings.json wins. The one exception is an allowed
+        platform matched by the host itself, which is reported without
+        scanning the path; the verdict is the same either way.
+        """
+        url_lower = url.lower()
+        origin, remainder = _split_origin(url_lower)
+        host = self._host_outcome(origin)
+        if host is None:
+            return None
+
+        if host.allow is not None:
+            _, _, rule_type, rule = host.allow
+            return PolicyDecision(ALLOW, rule_type, rule)
+
+        best = [host.allow, host.specific, host.keyword]
+        _, hits = self._automaton.feed(remainder, host.state)
+        for _, payload in hits:
+            kind = payload[0]
+            best[kind] = _better(best[kind], payload)
+
+        if best[_KIND_ALLOW] is not None:
+            _, _, rule_type, rule = best[_KIND_ALLOW]
+            return PolicyDecision(ALLOW, rule_type, rule)
+
+        specific = _better(best[_KIND_BLOCKED_SPECIFIC], self.blocked_urls.get(url_lower))
+        if specific is not None:
+            return PolicyDecision(BLOCK, 'blocked_specific', specific[3])
+
+        if best[_KIND_BLOCKED_KEYWORD] is not None:
+            return PolicyDecision(BLOCK, 'blocked_keywords', best[_KIND_BLOCKED_KEYWORD][3])
+
+        return None
+
+
+class CompiledPolicy:
+    """All domain policies from settings.json, compiled once at load time.
+
+    A CompiledPolicy is treated as an immutable snapshot: reloads build a new
+    instance and swap it in, so callers holding a reference keep a consistent
+    view for the rest of their request.
+    """
+
+    def __init__(self, settings: Dict):
+        self.settings = settings
+        self.version = _fingerprint(settings)
+        self.domains: Dict[str, DomainPolicy] = {}
+        domains = settings.get("domains", {})
+        if not isinstance(domains, dict):
+            logger.warning("Settings 'domains' entry is not an object; no policies compiled.")
+            domains = {}
+        for name, domain_settings in domains.items():
+            if not isinstance(domain_settings, dict):
+                logger.warning("Settings for domain '%s' are not an object; skipping.", name)
+                continue
+            self.domains[name] = DomainPolicy(name, domain_settings)
+        logger.debug("CompiledPolicy - compiled %s rules across %s domains",
+                     sum(p.rule_count for p in self.domains.values()), len(self.domains))
+
+    def __contains__(self, domain: str) -> bool:
+        return domain in self.domains
+
+    def get(self, domain: str) -> Optional[DomainPolicy]:
+        return self.domains.get(domain)
+
+    def evaluate(self, url: str, domain: str) -> Optional[PolicyDecision]:
+        """Evaluate url against the rules of domain; None if undecided or unknown domain."""
+        policy = self.domains.get(domain)
+        if policy is None:
+            return None
+        return policy.evaluate(url)
+
+
+class PolicyChange:
+    """Difference between two policy snapshots, used for targeted cache invalidation.
+
+    A cached verdict for (url, domain) can only change if the domain was
+    added/removed, its non-rule options changed, or a rule that matches the
+    URL was added or removed. Added and removed rules are compiled into a
+    delta policy so affects() costs one scan of the URL.
+    """
+
+    def __init__(self, old: CompiledPolicy, new: CompiledPolicy):
+        self.old_version = old.version
+        self.new_version = new.version
+        self.replaced_domains = set()
+        self._deltas: Dict[str, DomainPolicy] = {}
+
+        for name in set(old.domains) | set(new.domains):
+            old_domain, new_domain = old.get(name), new.get(name)
+            if old_domain is None or new_domain is None:
+                self.replaced_domains.add(name)
+                continue
+            if old_domain.fingerprint == new_domain.fingerprint:
+                continue
+            if old_domain.options_fingerprint != new_domain.options_fingerprint:
+                self.replaced_domains.add(name)
+                continue
+            delta_settings = {}
+            for key in RULE_KEYS:
+                old_entries = set(_string_entries(old_domain.settings, key, name))
+                new_entries = set(_string_entries(new_domain.settings, key, name))
+                changed = sorted(old_entries ^ new_entries)
+                if changed:
+                    delta_settings[key] = changed
+            if delta_settings:
+                self._deltas[name] = DomainPolicy(name, delta_settings, memo_size=0)
+
+    def __bool__(self) -> bool:
+        return bool(self.replaced_domains or self._deltas)
+
+    @property
+    def changed_domains(self) -> set:
+        return self.replaced_domains | set(self._deltas)
+
+    def affects(self, url: str, domain: str) -> bool:
+        """True if a verdict cached for (url, domain) may differ under the new policy."""
+        if domain in self.replaced_domains:
+            return True
+        delta = self._deltas.get(domain)
+        return delta is not None and delta.evaluate(url) is not None
+
+
+class PolicyWatcher:
+    """Polls settings.json and atomically swaps in a freshly compiled policy.
+
+    The file's mtime/size/inode is checked every `interval` seconds on a daemon
+    thread. A changed file is re-parsed, validated and compiled off the request
+    path; only then is the `current` reference replaced, so in-flight requests
+    finish on the snapshot they started with. Invalid files are logged and
+    ignored until they change again. Listeners receive (old, new, change).
+
+    The thread is (re)started lazily from `current`, so it also runs in
+    worker processes forked after the watcher was created.
+    """
+
+    def __init__(self, initial: CompiledPolicy, path: str, loader: Callable[[str], Dict], interval: float = 5.0):
+        self.path = path
+        self.loader = loader
+        self.interval = interval
+        self._current = initial
+        self._listeners: List[Callable[[CompiledPolicy, CompiledPolicy, PolicyChange], None]] = []
+        self._lock = threading.Lock()
+        self._signature = self._stat_signature()
+        self._thread_pid = None
+        self._stop = threading.Event()
+
+    @property
+    def current(self) -> CompiledPolicy:
+        if self.interval > 0 and self._thread_pid != os.getpid():
+            self.start()
+        return self._current
+
+    def add_listener(self, listener: Callable[[CompiledPolicy, CompiledPolicy, PolicyChange], None]) -> None:
+        self._listeners.append(listener)
+
+    def _stat_signature(self):
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except OSError:
+            return None
+
+    def start(self) -> None:
+        """Start the polling thread in this process if it is not already running."""
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            self._stop.clear()
+            thread = threading.Thread(target=self._run, name="policy-watcher", daemon=True)
+            thread.start()
+            logger.debug("PolicyWatcher - watching %s every %ss (pid %s)", self.path, self.interval, self._thread_pid)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error("PolicyWatcher - Unexpected error while checking %s: %s", self.path, e, exc_info=True)
+
+    def check(self) -> bool:
+        """Reload the policy if the settings file changed. Returns True if swapped."""
+        signature = self._stat_signature()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+        return self.reload()
+
+    def reload(self) -> bool:
+        """Parse, validate and compile the settings file, then swap it in."""
+        started = time.time()
+        try:
+            settings = self.loader(self.path)
+            validate_domain_settings(settings)
+            new_policy = CompiledPolicy(settings)
+        except Exception as e:
+            logger.error("PolicyWatcher - Rejected %s, keeping policy %s: %s", self.path, self._current.version, e)
+            return False
+
+        old_policy = self._current
+        if new_policy.version == old_policy.version:
+            return False
+
+        change = PolicyChange(old_policy, new_policy)
+        self._current = new_policy  # Single reference assignment: the atomic swap
+        logger.info("PolicyWatcher - Policy %s -> %s (changed domains: %s) in %.3fs",
+                    old_policy.version, new_policy.version, sorted(change.changed_domains), time.time() - started)
+
+        for listener in list(self._listeners):
+            try:
+                listener(old_policy, new_policy, change)
+            except Exception as e:
+                logger.error("PolicyWatcher - Policy change listener failed: %s", e, exc_info=True)
+        return True
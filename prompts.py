@@ -0,0 +1,204 @@
+"""
+AI prompt builder for Eclipse Shield.
+Analysis prompts are a stable prefix (instructions, the domain's policy hints
+and the user's task context) followed by the few lines describing the URL
+under review. The prefix depends only on (domain, policy version, context),
+so it is built once, compactly serialized and trimmed to a token budget, and
+reused as one prebuilt string for every URL analyzed under it. Keeping it
+first in the prompt also lets the model's implicit prefix caching apply; the
+prompts are far below the minimum size of Gemini's explicit context caches.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Estimated input tokens an analysis prompt may use; low-value fields are trimmed to fit
+PROMPT_TOKEN_BUDGET = int(os.getenv("ECLIPSE_SHIELD_PROMPT_TOKEN_BUDGET", "512"))
+PROMPT_PREFIX_CACHE_SIZE = int(os.getenv("ECLIPSE_SHIELD_PROMPT_PREFIX_CACHE_SIZE", "256"))
+
+# Part of the budget kept free for the per-URL suffix
+_SUFFIX_RESERVE = 128
+_MAX_MATCHED_TERMS = 8
+_MAX_URL_CHARS = 500
+_MAX_QUERY_CHARS = 200
+
+# Prefix trimming steps, applied in order until the prefix fits:
+# (max chars per answer, max answers, max list items, include policy lists)
+_TRIM_LEVELS = (
+    (500, 10, None, True),
+    (200, 10, None, True),
+    (200, 10, 10, True),
+    (120, 10, 0, False),
+    (80, 5, 0, False),
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English text and URLs)."""
+    return (len(text) + 3) // 4
+
+
+def compact_json(value) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+def _clip(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:max(0, limit - 3)] + '...'
+
+
+# Line breaks (including Unicode ones) and other control characters
+_CONTROL_CHARS = re.compile(r"[\x00-\x1f\x7f-\x9f\u2028\u2029]+")
+
+
+def _field(value, limit: int) -> str:
+    """A user-supplied value as one clipped line: control characters become spaces.
+
+    Keeps a URL, search query or term from starting lines of its own (such as
+    a fake 'URL 2:' or '- Detected Category:'), which in a batched prompt
+    would change the verdicts of other callers' URLs.
+    """
+    return _clip(_CONTROL_CHARS.sub(' ', str(value)).strip(), limit)
+
+
+def _listing(items: Sequence[str], limit: Optional[int]) -> str:
+    if limit is None or len(items) <= limit:
+        return ','.join(items)
+    return ','.join(items[:limit]) + f",(+{len(items) - limit} more)"
+
+
+def prefix_key(ai_request: dict) -> Tuple[str, str, str]:
+    """Requests with the same key share an analysis prefix (and can share a batch prompt)."""
+    return ai_request['domain'], ai_request['policy_version'], ai_request['context'].fingerprint
+
+
+class PromptBuilder:
+    """Builds compact analysis and question prompts, caching analysis prefixes."""
+
+    def __init__(self, token_budget: int = PROMPT_TOKEN_BUDGET, cache_size: int = PROMPT_PREFIX_CACHE_SIZE):
+        self.token_budget = token_budget
+        self.cache_size = cache_size
+        self._prefixes: 'OrderedDict[Tuple[str, str, str], str]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    # --- Analysis prompts ---
+
+    def analysis_prefix(self, domain: str, settings: Dict, policy_version: str,
+                        answers: Mapping[str, str], fingerprint: str) -> str:
+        """The static part of every analysis prompt for this domain, policy and task context."""
+        key = (domain, policy_version, fingerprint)
+        with self._lock:
+            prefix = self._prefixes.get(key)
+            if prefix is not None:
+                self._prefixes.move_to_end(key)
+        CACHE_LOOKUPS.inc(layer='prompt_prefix', result='miss' if prefix is None else 'hit')
+        if prefix is not None:
+            return prefix
+
+        prefix = self._build_analysis_prefix(domain, settings, answers)
+        with self._lock:
+            self._prefixes[key] = prefix
+            while len(self._prefixes) > self.cache_size:
+                self._prefixes.popitem(last=False)
+        return prefix
+
+    def _build_analysis_prefix(self, domain: str, settings: Dict, answers: Mapping[str, str]) -> str:
+        budget = max(0, self.token_budget - _SUFFIX_RESERVE)
+        keywords = [str(item) for item in settings.get("blocked_keywords", [])]
+        sites = [str(item) for item in settings.get("blocked_specific", [])]
+        for level, (answer_chars, max_answers, list_items, with_lists) in enumerate(_TRIM_LEVELS):
+            lines = [
+                f"Decide whether visiting the URL(s) below is productive for a user in the '{domain}' domain.",
+                "Allowed platforms, blocked sites and blocked keywords were already checked and did not match.",
+            ]
+            if with_lists and keywords:
+                lines.append(f"Blocked keywords: {_listing(keywords, list_items)}")
+            if with_lists and sites:
+                lines.append(f"Blocked sites: {_listing(sites, list_items)}")
+            if answers:
+                task = {_clip(question, 120): _clip(answer, answer_chars)
+                        for question, answer in list(answers.items())[:max_answers]}
+                lines.append(f"User task (question: answer): {compact_json(task)}")
+            else:
+                lines.append("User task: not provided.")
+            lines.extend([
+                f"ALLOW if the URL serves the user's task, or is standard productive material for '{domain}' "
+                "(documentation, core tools). BLOCK time-wasting sites (social media, games, entertainment) "
+                "unless the task clearly needs them.",
+                "",
+            ])
+            prefix = '\n'.join(lines)
+            if estimate_tokens(prefix) <= budget:
+                break
+        if level:
+            logger.debug("PromptBuilder - trimmed analysis prefix for '%s' to level %s (%s tokens)",
+                         domain, level, estimate_tokens(prefix))
+        return prefix
+
+    def url_facts(self, ai_request: dict) -> List[str]:
+        """The '- Field: value' lines describing one URL under review."""
+        url_signals = ai_request['url_signals']
+        relevance = ai_request['context_relevance']
+        lines = [
+            f"- URL: {_field(ai_request['url'], _MAX_URL_CHARS)}",
+            f"- Detected Hostname: {_field(url_signals.get('hostname', 'N/A'), _MAX_URL_CHARS)}",
+            f"- Detected Category: {_field(url_signals.get('domain_type', 'N/A'), _MAX_URL_CHARS)}",
+        ]
+        if url_signals.get('is_search'):
+            lines.append(f"- Search Query: {_field(url_signals.get('search_query') or '', _MAX_QUERY_CHARS)}")
+        if ai_request['context']:
+            lines.append(f"- Context Relevance Score: {relevance.get('score', 0.0):.2f}")
+            terms = relevance.get('matched_terms') or []
+            if terms:
+                lines.append(f"- Context Matched Terms: {', '.join(_field(term, 100) for term in terms[:_MAX_MATCHED_TERMS])}")
+        return lines
+
+    def _prefix_for(self, ai_request: dict) -> str:
+        context = ai_request['context']
+        return self.analysis_prefix(ai_request['domain'], ai_request['settings'],
+                                    ai_request['policy_version'], context.answers, context.fingerprint)
+
+    def analysis_prompt(self, ai_request: dict) -> str:
+        """Cached prefix + URL facts for one URL handed over by the rule stages."""
+        lines = ["Reply with one line: ALLOW: <reason> or BLOCK: <reason>", "URL under review:"]
+        lines.extend(self.url_facts(ai_request))
+        return self._prefix_for(ai_request) + '\n'.join(lines)
+
+    def batch_analysis_prompt(self, ai_requests: Sequence[dict]) -> str:
+        """One prompt asking for a numbered verdict per URL.
+
+        All requests must share the prefix (see prefix_key); the reply is
+        parsed by microbatch.parse_numbered_verdicts.
+        """
+        lines = [f"Reply with exactly {len(ai_requests)} lines, one per URL in order, each "
+                 "'<n>. ALLOW: <reason>' or '<n>. BLOCK: <reason>'."]
+        for number, ai_request in enumerate(ai_requests, 1):
+            lines.append(f"URL {number}:")
+            lines.extend(self.url_facts(ai_request))
+        return self._prefix_for(ai_requests[0]) + '\n'.join(lines)
+
+    # --- Question prompts ---
+
+    def question_prompt(self, domain: str, history: List[Dict[str, str]]) -> str:
+        """First or follow-up contextualization question prompt for a sanitized Q&A history."""
+        if not history:
+            return (f"Ask one short, direct question to learn what the user is working on in the '{domain}' domain "
+                    "(e.g. \"What specific task are you working on?\"). Reply with the question text only.")
+        budget = max(0, self.token_budget - 96)
+        for answer_chars in (1000, 300, 120):
+            qa = '\n'.join(f"Q: {_clip(item['question'], 200)}\nA: {_clip(item['answer'], answer_chars)}"
+                           for item in history)
+            if estimate_tokens(qa) <= budget:
+                break
+        return (f"Task interview for the '{domain}' domain so far:\n{qa}\n"
+                "If the answers make clear both (1) what the user is doing and (2) what outcome they want, "
+                "reply exactly DONE. Otherwise reply with one concise follow-up question about what is missing "
+                "(not about time or scheduling), and nothing else.")
@@ -0,0 +1,237 @@
+"""
+Batch context relevance scoring for Eclipse Shield.
+Scores many URLs and their search queries against one task context at once.
+Each context's terms are put in a hashed term space once (a ContextVector,
+kept on the cached ContextIndex): a term's key is a 32-bit polynomial hash
+of its UTF-8 bytes, held in small per-length key tables, and a weight
+vector holds each term's URL weight and search-query weight. A batch is
+lowercased and joined into one byte buffer; NumPy hashes every substring
+of every term length over the whole buffer from one prefix-sum array,
+keeps the positions whose hash is a term's key and whose bytes spell the
+term, and sums each URL's weights with a single bincount.
+
+A match is a substring match, as in ContextIndex.match. URL terms weigh 0.3
+and search-query terms 0.5, the flat weights the analyzer's 0.3/0.7
+thresholds are tuned to. Every result equals what _check_context_relevance
+returns for that URL alone. Without NumPy, or for batches too small to
+amortize the array setup, each URL goes through the context's automaton.
+"""
+
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from context_index import ContextIndex
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency; batches are matched URL by URL without it
+    np = None
+
+URL_WEIGHT = 0.3
+QUERY_WEIGHT = 0.5
+
+# Below this many URLs, matching each one through the automaton is faster than building the arrays
+NUMPY_MIN_URLS = 16
+# Largest key table per term length (2**12 slots of 4 bytes stay in L1 while a batch is scanned)
+MAX_SLOT_BITS = 12
+
+_MASK = (1 << 32) - 1
+_BASE = 0x01000193  # FNV 32-bit prime; odd, so invertible mod 2**32
+_BASE_INVERSE = pow(_BASE, -1, 1 << 32)
+
+
+def term_key(encoded: bytes) -> int:
+    """Key of a UTF-8 encoded term in the hashed term space."""
+    value = 0
+    for byte in encoded:
+        value = (value * _BASE + byte) & _MASK
+    return value
+
+
+def empty_relevance() -> dict:
+    return {'score': 0.0, 'matched_terms': [], 'matches': [], 'error': None}
+
+
+def _relevance(url_terms: Sequence[str], query_terms: Sequence[str], score: float) -> dict:
+    matches = [{'term': term, 'location': 'url', 'weight': URL_WEIGHT} for term in url_terms]
+    matches.extend({'term': term, 'location': 'search_query', 'weight': QUERY_WEIGHT} for term in query_terms)
+    return {
+        'score': min(1.0, round(score, 2)),
+        'matched_terms': sorted(set(url_terms) | set(query_terms)),
+        'matches': matches,
+        'error': None,
+    }
+
+
+def score_one(index: ContextIndex, url: str, search_query: str = '') -> dict:
+    """Relevance of one URL and search query, matched through the context's automaton."""
+    url_terms, query_terms = index.match(url.lower(), search_query.lower() if search_query else '')
+    score = 0.0
+    for _ in url_terms:
+        score += URL_WEIGHT
+    for _ in query_terms:
+        score += QUERY_WEIGHT
+    return _relevance(url_terms, query_terms, score)
+
+
+class ContextVector:
+    """One context's terms in the hashed term space. Read-only once built.
+
+    Terms are grouped by byte length (and by whether they contain a space).
+    Each group keeps its keys in small tables indexed by the keys' top bits,
+    at least four slots per term; a term whose slot is taken goes to the
+    group's next table. Hits are confirmed byte for byte, so terms whose
+    keys collide are still told apart.
+    """
+
+    def __init__(self, terms: Sequence[str]):
+        self.terms = list(terms)
+        self.encoded = [term.encode('utf-8') for term in self.terms]
+        # Column t holds term t's weight in a URL, column len(terms) + t its weight in a search query
+        self.weights = np.concatenate([np.full(len(self.terms), URL_WEIGHT), np.full(len(self.terms), QUERY_WEIGHT)])
+        # (length, has a space) -> (slot bits, [(slot keys, slot members)], member bytes, member term numbers),
+        # where a slot's member is its term's position in the group and -1 marks a free slot
+        self.groups: Dict[Tuple[int, bool], Tuple] = {}
+        grouped: Dict[Tuple[int, bool], List[int]] = {}
+        for number, encoded in enumerate(self.encoded):
+            grouped.setdefault((len(encoded), b' ' in encoded), []).append(number)
+        for (length, spaced), numbers in sorted(grouped.items()):
+            group_keys = [term_key(self.encoded[number]) for number in numbers]
+            # Widen the table until the group's terms get slots of their own, so one pass finds them
+            bits = max(4, (4 * len(numbers) - 1).bit_length())
+            while bits < MAX_SLOT_BITS and len({key >> (32 - bits) for key in group_keys}) < len(numbers):
+                bits += 1
+            tables = []
+            for member, key in enumerate(group_keys):
+                slot = key >> (32 - bits)
+                for keys, members in tables:
+                    if members[slot] < 0:
+                        break
+                else:
+                    keys, members = np.zeros(1 << bits, dtype=np.uint32), np.full(1 << bits, -1, dtype=np.int64)
+                    tables.append((keys, members))
+                keys[slot], members[slot] = key, member
+            spellings = np.frombuffer(b''.join(self.encoded[number] for number in numbers), dtype=np.uint8)
+            self.groups[(length, spaced)] = (bits, tables, spellings.reshape(len(numbers), length),
+                                             np.array(numbers, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def hits(self, texts: Sequence[bytes]):
+        """(text numbers, term numbers) of every distinct term occurring in each text, ordered by text then term."""
+        buffer = b'\x00'.join(texts)  # Terms never contain NUL, so no match spans two texts
+        codes = np.frombuffer(buffer, dtype=np.uint8)
+        size = len(codes)
+        powers, inverse_powers = _powers(size)
+        # prefix[k] = sum(codes[m] * BASE**-m, m < k), so the hash of buffer[i:i+n] is
+        # (prefix[i+n] - prefix[i]) * BASE**(i+n-1); all arithmetic wraps mod 2**32
+        prefix = np.zeros(size + 1, dtype=np.uint32)
+        np.cumsum(codes * inverse_powers[:size], out=prefix[1:])
+        starts = np.zeros(len(texts), dtype=np.int64)
+        np.cumsum([len(text) + 1 for text in texts[:-1]], out=starts[1:])
+        # Terms with a space can only occur from the first text that contains one; URLs come
+        # first and never do, so multi-word terms are only looked for in the search queries
+        first_space = buffer.find(b' ')
+        spaced_from = size if first_space < 0 else int(starts[np.searchsorted(starts, first_space, side='right') - 1])
+
+        # Scratch arrays reused by every group, so the scan allocates nothing per term length
+        hashes, slots = np.empty(size, dtype=np.uint32), np.empty(size, dtype=np.uint32)
+        slot_keys, equal = np.empty(size, dtype=np.uint32), np.empty(size, dtype=bool)
+        found_positions, found_terms = [], []
+        for (length, spaced), (bits, tables, spellings, numbers) in self.groups.items():
+            begin = spaced_from if spaced else 0
+            count = size + 1 - length - begin
+            if count <= 0:
+                continue
+            group_hashes, group_slots = hashes[:count], slots[:count]
+            np.subtract(prefix[begin + length:], prefix[begin:begin + count], out=group_hashes)
+            np.multiply(group_hashes, powers[begin + length - 1:size], out=group_hashes)
+            np.right_shift(group_hashes, np.uint32(32 - bits), out=group_slots)
+            indexes = group_slots.view(np.int32)  # Below 2**bits, so the view is exact
+            for keys, members in tables:
+                np.equal(np.take(keys, indexes, out=slot_keys[:count]), group_hashes, out=equal[:count])
+                positions = np.flatnonzero(equal[:count])
+                if not len(positions):
+                    continue
+                found = members[indexes[positions]]
+                positions, found = positions[found >= 0] + begin, found[found >= 0]
+                # Different bytes can hash alike: keep only positions that spell the term
+                spelled = np.all(codes[positions[:, None] + np.arange(length)] == spellings[found], axis=1)
+                found_positions.append(positions[spelled])
+                found_terms.append(numbers[found[spelled]])
+        if not found_positions:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        positions = np.concatenate(found_positions)
+        text_numbers = np.searchsorted(starts, positions, side='right') - 1
+        pairs = np.unique(text_numbers * len(self.terms) + np.concatenate(found_terms))
+        return pairs // len(self.terms), pairs % len(self.terms)
+
+
+_powers_lock = threading.Lock()
+_powers_table = None
+
+
+def _powers(size: int):
+    """(BASE**k, BASE**-k) mod 2**32 for k < size, as uint32 arrays shared by all contexts."""
+    global _powers_table
+    table = _powers_table
+    if table is None or len(table[0]) < size:
+        with _powers_lock:
+            table = _powers_table
+            if table is None or len(table[0]) < size:
+                capacity = max(size, 1 << 16, 2 * len(table[0]) if table is not None else 0)
+                powers = np.full(capacity, _BASE, dtype=np.uint32)
+                inverse_powers = np.full(capacity, _BASE_INVERSE, dtype=np.uint32)
+                powers[0] = inverse_powers[0] = 1
+                # uint32 products wrap, which is exactly multiplication mod 2**32
+                table = _powers_table = (np.cumprod(powers), np.cumprod(inverse_powers))
+    return table
+
+
+def context_vector(index: ContextIndex) -> ContextVector:
+    """The index's ContextVector, built on first use and kept on the index until it gains terms."""
+    vector = index.vector
+    if vector is None or len(vector) != len(index):
+        # Concurrent first uses may each build one; they are equal, and one of them is kept
+        vector = index.vector = ContextVector(index.terms)
+    return vector
+
+
+def score_many(index: ContextIndex, urls: Sequence[str], search_queries: Optional[Sequence[str]] = None) -> List[dict]:
+    """Relevance of each URL (with search_queries[i] as URL i's search query, '' for none).
+
+    Results have the _check_context_relevance schema ('score',
+    'matched_terms', 'matches', 'error') and equal score_one's.
+    """
+    if search_queries is None:
+        search_queries = [''] * len(urls)
+    if np is None or len(urls) < NUMPY_MIN_URLS or not len(index):
+        return [score_one(index, url, query) for url, query in zip(urls, search_queries)]
+    vector = context_vector(index)
+
+    # Texts 0..count-1 are the URLs and the non-empty search queries follow
+    count = len(urls)
+    query_rows = [row for row, query in enumerate(search_queries) if query]
+    texts = [url.lower().encode('utf-8') for url in urls]
+    texts.extend(search_queries[row].lower().encode('utf-8') for row in query_rows)
+    text_numbers, term_numbers = vector.hits(texts)
+
+    in_query = text_numbers >= count
+    rows = text_numbers.copy()
+    rows[in_query] = np.array(query_rows, dtype=np.int64)[text_numbers[in_query] - count]
+    # Stable sort by URL keeps each URL's URL hits before its query hits, in term order, so the
+    # bincount adds weights in the same order as the single-URL loop
+    order = np.argsort(rows, kind='stable')
+    rows, term_numbers, in_query = rows[order], term_numbers[order], in_query[order]
+    columns = term_numbers + in_query * len(vector)
+    scores = np.bincount(rows, weights=vector.weights[columns], minlength=count).tolist()
+
+    terms = vector.terms
+    found: Dict[int, Tuple[List[str], List[str]]] = {}
+    for row, term, query_hit in zip(rows.tolist(), term_numbers.tolist(), in_query.tolist()):
+        row_terms = found.get(row)
+        if row_terms is None:
+            row_terms = found[row] = ([], [])
+        row_terms[query_hit].append(terms[term])  # [0] URL terms, [1] search query terms
+    return [_relevance(*found[row], scores[row]) if row in found else empty_relevance() for row in range(count)]
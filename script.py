@@ -2,13 +2,36 @@ import os
 import json
 import requests
 import google.generativeai as genai
-from typing import Dict, List, Optional # Added Optional
+from typing import Dict, List, Optional, Tuple # Added Optional
 from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 import logging
 import re
+import asyncio
+import contextvars
+import threading
+import time
+import weakref
+from collections import deque
 import html
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from policy import CompiledPolicy, PolicyWatcher, ALLOW
+from heuristics import UrlHeuristics, GENERIC_BLOCKED
+from context_index import ContextIndexCache
+from analysis_context import AnalysisContext
+from verdict_store import open_verdict_store, verdict_key, SOURCE_AI, SOURCE_AI_FALLBACK
+from url_templates import open_template_verdicts, template_key
+from fastpath import load_fastpath
+from relevance import empty_relevance, score_many
+from log_config import ANALYZER_LOG_LEVEL, LOG_FORMAT
+from metrics import (CACHE_LOOKUPS, MODEL_CALLS, MODEL_CALL_SECONDS, MODEL_TOKENS, PROMPT_TOKENS, RATE_LIMITED,
+                     IN_FLIGHT, MODEL_BATCH_SIZE, MICROBATCH_FALLBACKS, FASTPATH_PREDICTIONS)
+from tracing import span, decided_by
+from model_backends import load_model_backend
+from prompts import PromptBuilder, estimate_tokens, prefix_key
+from microbatch import MICROBATCH_SIZE, BatchReply, MicroBatcher, parse_numbered_verdicts
 
 # Import security validators
 try:
@@ -38,15 +61,11 @@ except ImportError:
             text = html.escape(text.strip())
             return text[:max_length] if len(text) > max_length else text
 
-# Setup logging for script.py - ENHANCED LOGGING
+# Setup logging for script.py. The level comes from configuration
+# (ECLIPSE_SHIELD_ANALYZER_LOG_LEVEL, then LOG_LEVEL); handlers belong to the
+# application entry point (wsgi.py, app.py, secure_app.py or main()).
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)  # Set to DEBUG for maximum verbosity
-# Prevent duplicate handlers if script is reloaded in some environments
-if not logger.handlers:
-    handler = logging.StreamHandler()
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(filename)s - %(lineno)d - %(message)s') # More detailed format
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+logger.setLevel(ANALYZER_LOG_LEVEL)
 
 def load_api_key() -> str:
     """Load API key from file or environment variable."""
@@ -59,148 +78,225 @@ def load_api_key() -> str:
                 logger.debug("load_api_key - API key loaded from api_key.txt")
         except FileNotFoundError:
             error_msg = "API key not found in environment or api_key.txt"
-            logger.error(f"load_api_key - {error_msg}")
+            logger.error("load_api_key - %s", error_msg)
             raise Exception(error_msg)
     else:
         logger.debug("load_api_key - API key loaded from environment variable")
 
     if not api_key: # Add an extra check in case file was empty
         error_msg = "API key is empty or could not be loaded."
-        logger.error(f"load_api_key - {error_msg}")
+        logger.error("load_api_key - %s", error_msg)
         raise Exception(error_msg)
 
     logger.debug("load_api_key - END")
     return api_key
 
-def load_domain_settings() -> Dict:
+# Analyses admitted per minute by the analyzer's own rate limit
+MAX_ANALYSES_PER_MINUTE = 50
+
+# Maximum AI analyses run in parallel for one analyze_batch call
+BATCH_AI_CONCURRENCY = int(os.getenv("ECLIPSE_SHIELD_BATCH_AI_CONCURRENCY", "8"))
+
+# Maximum model calls in flight per event loop for the async analyzer
+MAX_MODEL_CALLS = int(os.getenv("ECLIPSE_SHIELD_MAX_MODEL_CALLS", "32"))
+
+SETTINGS_FILE = "settings.json"
+# Seconds between checks of settings.json for changes; 0 disables hot reload
+SETTINGS_POLL_INTERVAL = float(os.getenv("ECLIPSE_SHIELD_SETTINGS_POLL_INTERVAL", "5"))
+
+def load_domain_settings(path: str = SETTINGS_FILE) -> Dict:
     """Load domain settings from settings.json."""
     logger.debug("load_domain_settings - START")
     try:
-        with open("settings.json", "r") as f:
+        with open(path, "r") as f:
             settings = json.load(f)
             logger.debug("load_domain_settings - Settings loaded from settings.json")
-            logger.debug(f"load_domain_settings - Settings content: {settings}") # Log settings content
+            logger.debug("load_domain_settings - Settings content: %s", settings) # Log settings content
             logger.debug("load_domain_settings - END - SUCCESS")
             return settings
     except FileNotFoundError:
         error_msg = "settings.json file not found."
-        logger.error(f"load_domain_settings - {error_msg}")
+        logger.error("load_domain_settings - %s", error_msg)
         raise FileNotFoundError(error_msg)
     except json.JSONDecodeError as e: # Pass error details
         error_msg = f"settings.json is not valid JSON: {e}"
-        logger.error(f"load_domain_settings - {error_msg}")
+        logger.error("load_domain_settings - %s", error_msg)
         raise json.JSONDecodeError(error_msg, e.doc, e.pos) # Re-raise with original details
     except Exception as e:
-        logger.error(f"load_domain_settings - Error loading settings: {e}")
+        logger.error("load_domain_settings - Error loading settings: %s", e)
         raise
 
+def _record_token_usage(response, kind: str) -> None:
+    """Count the tokens the model reports using (Gemini responses carry usage_metadata)."""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return
+    for direction, field in (('prompt', 'prompt_token_count'), ('response', 'candidates_token_count')):
+        count = getattr(usage, field, None)
+        if isinstance(count, (int, float)) and count:
+            MODEL_TOKENS.inc(count, kind=kind, direction=direction)
+
 class ProductivityAnalyzer:
-    def __init__(self):
+    def __init__(self, model=None):
+        """Create the analyzer.
+
+        Args:
+            model: Object with generate_content (and optionally generate_content_async)
+                used instead of Gemini, e.g. the benchmarks' fake model. Omitted, the
+                ECLIPSE_SHIELD_MODEL_BACKEND stand-in is used if one is configured. No
+                API key is needed unless the model is Gemini.
+        """
         logger.debug("ProductivityAnalyzer.__init__ - START")
-        self.api_key = load_api_key()
-        self.settings = load_domain_settings()
+        if model is None:
+            model = load_model_backend()  # None selects Gemini
+        self.api_key = load_api_key() if model is None else None
+        # The watcher owns the live policy snapshot and swaps in a new one when
+        # settings.json changes on disk.
+        self.policy_watcher = PolicyWatcher(
+            CompiledPolicy(load_domain_settings()),
+            SETTINGS_FILE,
+            loader=load_domain_settings,
+            interval=SETTINGS_POLL_INTERVAL
+        )
+        self.heuristics = UrlHeuristics.load()
+        # Compiled context term indexes, keyed by context fingerprint
+        self.context_indexes = ContextIndexCache()
+        # Compact prompts with cached per-(domain, policy, context) prefixes
+        self.prompts = PromptBuilder()
+        # Shares one model call between AI analyses that arrive together (None when disabled)
+        self.micro_batcher = MicroBatcher(self._analyze_ai_batch) if MICROBATCH_SIZE > 1 else None
+        # AI verdicts persisted across restarts and worker recycling (None when disabled)
+        self.verdict_store = open_verdict_store()
+        # Verdicts learned per URL template, answering long-tail URLs like ones the model already judged
+        self.template_verdicts = open_template_verdicts()
+        # Classifier trained on logged AI verdicts that answers confident cases locally (None when not trained)
+        self.fastpath = load_fastpath()
 
         # --- FIX: Configure API Key and Create Model Instance ---
         try:
-            genai.configure(api_key=self.api_key)
-            # Ensure 'gemini-2.0-flash' is a valid model name accessible by your API key.
-            # If you encounter errors related to the model name later,
-            # try a known valid one like 'gemini-1.5-flash'.
-            self.model = genai.GenerativeModel('gemini-2.0-flash')
-            logger.debug("ProductivityAnalyzer.__init__ - Google Generative AI configured and model created.")
+            if model is not None:
+                self.model = model
+            else:
+                self._configure_gemini()
         except Exception as e:
-            logger.error(f"ProductivityAnalyzer.__init__ - Failed to configure Google Generative AI or create model: {e}")
+            logger.error("ProductivityAnalyzer.__init__ - Failed to configure Google Generative AI or create model: %s", e)
             raise # Re-raise the exception to halt initialization if AI setup fails
 
+        # Context for the interactive CLI only; servers pass an AnalysisContext per call
         self.context_data = {}
+        self.max_analyses_per_minute = MAX_ANALYSES_PER_MINUTE
+        self._analysis_times = deque() # Timestamps of recent analyses (rate limiting)
+        self._analysis_times_lock = threading.Lock()
+        self._model_semaphores = weakref.WeakKeyDictionary() # event loop -> asyncio.Semaphore
         # Removed self.client = genai.Client(...)
         # --- End FIX ---
 
         logger.debug("ProductivityAnalyzer.__init__ - Analyzer initialized, API key loaded, settings loaded, model configured.")
         logger.debug("ProductivityAnalyzer.__init__ - END")
 
+    def _configure_gemini(self) -> None:
+        genai.configure(api_key=self.api_key)
+        # Ensure 'gemini-2.0-flash' is a valid model name accessible by your API key.
+        # If you encounter errors related to the model name later,
+        # try a known valid one like 'gemini-1.5-flash'.
+        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        logger.debug("ProductivityAnalyzer.__init__ - Google Generative AI configured and model created.")
+
+    @property
+    def policy(self) -> CompiledPolicy:
+        """Current compiled policy snapshot."""
+        return self.policy_watcher.current
+
+    @property
+    def settings(self) -> Dict:
+        """Raw settings.json content backing the current policy snapshot."""
+        return self.policy_watcher.current.settings
+
     def get_next_question(self, domain: str, context: List[Dict]) -> Dict: # context is a list of dicts
         """Get the next contextual question based on previous answers using AI."""
-        logger.debug(f"ProductivityAnalyzer.get_next_question - START - Domain: {domain}, Context: {context}")
-        
+        logger.debug("ProductivityAnalyzer.get_next_question - START - Domain: %s, Context: %s", domain, context)
+
+        prompt = self._build_question_prompt(domain, context)
+        if prompt is None:
+            return {"question": "What are you trying to accomplish?"}
+
+        try:
+            response = self._generate_content(prompt, 'question')
+            return self._parse_question_response(response)
+
+        except Exception as e:
+            return self._question_error_result(e)
+
+    def _generate_content(self, prompt: str, kind: str):
+        """Call the model, recording call count, latency and errors under kind ('analysis' or 'question')."""
+        PROMPT_TOKENS.observe(estimate_tokens(prompt), kind=kind)
+        with IN_FLIGHT.track_inprogress(what='model_calls'), span('model', metric=False):
+            start = time.perf_counter()
+            try:
+                response = self.model.generate_content(contents=prompt)
+            except Exception:
+                MODEL_CALLS.inc(kind=kind, outcome='error')
+                raise
+            finally:
+                MODEL_CALL_SECONDS.observe(time.perf_counter() - start, kind=kind)
+        MODEL_CALLS.inc(kind=kind, outcome='ok')
+        _record_token_usage(response, kind)
+        return response
+
+    def _build_question_prompt(self, domain: str, context: List[Dict]) -> Optional[str]:
+        """Validate the request and build the question prompt; None if the domain is invalid."""
         # Security validation
         domain = InputValidator.sanitize_string(domain, 100)
         if not InputValidator.validate_domain(domain):
-            logger.warning(f"Invalid domain provided: {domain}")
-            return {"question": "What are you trying to accomplish?"}
+            logger.warning("Invalid domain provided: %s", domain)
+            return None
         
         # Validate and sanitize context
+        if isinstance(context, dict):  # secure_app sends a question -> answer dict
+            context = [{'question': question, 'answer': answer} for question, answer in context.items()]
+        sanitized_context = []
         if isinstance(context, list):
-            sanitized_context = []
             for item in context[:10]:  # Limit to 10 items
                 if isinstance(item, dict):
                     question = InputValidator.sanitize_string(item.get('question', ''), 500)
                     answer = InputValidator.sanitize_string(item.get('answer', ''), 1000)
                     if question and answer:
                         sanitized_context.append({'question': question, 'answer': answer})
-            context = sanitized_context
-        
-        try:
-            if not context:
-                prompt = f"""As a productivity assistant, ask one direct question to understand what the user is working on in the {domain} domain.
-                Keep it simple and focused on their immediate task.
-                Example good questions:
-                - What specific task are you working on?
-                - What are you trying to accomplish?
-                Respond with only the question text, no additional formatting."""
-                logger.debug("ProductivityAnalyzer.get_next_question - First question - Prompt:\n" + prompt) # Log prompt
-            else:
-                # Format conversation history for the prompt
-                history_str = "\n".join([f"Q: {item['question']}\nA: {item['answer']}" for item in context])
-                prompt = f"""Based on this context about a {domain} task, determine if you have enough information or need to ask one more question.
-                Previous Q&A:
-                {history_str}
-
-                First, analyze if you have enough information to understand:
-                1. What specific task/activity the user is doing
-                2. What they are trying to achieve (goal/outcome)
-
-                If you have clear answers to BOTH of these, respond with exactly 'DONE'.
-                If you're missing either of these key pieces of information, ask ONE focused follow-up question about what you're missing.
-                Do not ask about time, duration, or scheduling.
-                Keep the question concise and direct.
-                Respond with either exactly 'DONE' or your single follow-up question (no other text)."""
-                logger.debug("ProductivityAnalyzer.get_next_question - Subsequent question - Prompt:\n" + prompt) # Log prompt
-
-            # --- FIX: Use self.model to generate content ---
-            response = self.model.generate_content(
-                contents=prompt
-                # Removed model="gemini-2.0-flash" as it's inherent in self.model
-            )
-            # --- End FIX ---
-
-            # Add safety check for response structure if needed, assuming .text exists
-            if not hasattr(response, 'text'):
-                 logger.error(f"ProductivityAnalyzer.get_next_question - AI response object does not have 'text' attribute. Response: {response}")
-                 raise ValueError("Invalid response format from AI.")
-
-            question = response.text.strip()
-            logger.debug(f"ProductivityAnalyzer.get_next_question - AI Response Text: {question}") # Log response text
-
-            if question.upper() == 'DONE':
-                logger.debug("ProductivityAnalyzer.get_next_question - AI returned 'DONE'")
-                logger.debug("ProductivityAnalyzer.get_next_question - END - DONE")
-                return {"question": "DONE"}
-
-            logger.debug(f"ProductivityAnalyzer.get_next_question - Next question: {question}")
-            logger.debug("ProductivityAnalyzer.get_next_question - END - Question generated")
-            return {"question": question}
-
-        except Exception as e:
-            logger.error(f"ProductivityAnalyzer.get_next_question - Error generating question: {e}", exc_info=True) # Add traceback info
-            default_question = "What are you trying to accomplish?"
-            logger.debug(f"ProductivityAnalyzer.get_next_question - Returning default question: {default_question}")
-            logger.debug("ProductivityAnalyzer.get_next_question - END - ERROR, returning default")
-            return {"question": default_question}
+        context = sanitized_context
+
+        prompt = self.prompts.question_prompt(domain, context)
+        logger.debug("ProductivityAnalyzer.get_next_question - %s question - Prompt:\n%s",
+                     "Subsequent" if context else "First", prompt) # Log prompt
+        return prompt
+
+    def _parse_question_response(self, response) -> Dict:
+        # Add safety check for response structure if needed, assuming .text exists
+        if not hasattr(response, 'text'):
+             logger.error("ProductivityAnalyzer.get_next_question - AI response object does not have 'text' attribute. Response: %s", response)
+             raise ValueError("Invalid response format from AI.")
+
+        question = response.text.strip()
+        logger.debug("ProductivityAnalyzer.get_next_question - AI Response Text: %s", question) # Log response text
+
+        if question.upper() == 'DONE':
+            logger.debug("ProductivityAnalyzer.get_next_question - AI returned 'DONE'")
+            logger.debug("ProductivityAnalyzer.get_next_question - END - DONE")
+            return {"question": "DONE"}
+
+        logger.debug("ProductivityAnalyzer.get_next_question - Next question: %s", question)
+        logger.debug("ProductivityAnalyzer.get_next_question - END - Question generated")
+        return {"question": question}
+
+    def _question_error_result(self, e: Exception) -> Dict:
+        logger.error("ProductivityAnalyzer.get_next_question - Error generating question: %s", e, exc_info=True) # Add traceback info
+        default_question = "What are you trying to accomplish?"
+        logger.debug("ProductivityAnalyzer.get_next_question - Returning default question: %s", default_question)
+        logger.debug("ProductivityAnalyzer.get_next_question - END - ERROR, returning default")
+        return {"question": default_question}
 
     def contextualize(self, domain: str) -> None:
         """Ask focused questions one at a time to contextualize the task."""
-        logger.debug(f"ProductivityAnalyzer.contextualize - START - Domain: {domain}")
+        logger.debug("ProductivityAnalyzer.contextualize - START - Domain: %s", domain)
         conversation_history = []
         self.context_data = {} # Reset context data for each call
         logger.debug("ProductivityAnalyzer.contextualize - Conversation history and context data initialized.")
@@ -208,13 +304,14 @@ class ProductivityAnalyzer:
         while True:
             question_data = self.get_next_question(domain, conversation_history)
             question = question_data["question"]
-            logger.debug(f"ProductivityAnalyzer.contextualize - Received question from get_next_question: {question}")
+            logger.debug("ProductivityAnalyzer.contextualize - Received question from get_next_question: %s", question)
 
             if question.upper() == 'DONE':
                 logger.info("ProductivityAnalyzer.contextualize - Context gathering complete (AI returned DONE).") # Changed to INFO
                 # Consolidate context_data from conversation_history for consistency
                 self.context_data = {item['question']: item['answer'] for item in conversation_history}
-                logger.debug("ProductivityAnalyzer.contextualize - Final context data gathered:\n" + json.dumps(self.context_data, indent=2))
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("ProductivityAnalyzer.contextualize - Final context data gathered:\n%s", json.dumps(self.context_data, indent=2))
                 logger.debug("ProductivityAnalyzer.contextualize - END - DONE")
                 break
 
@@ -227,87 +324,66 @@ class ProductivityAnalyzer:
             conversation_history.append({"question": question, "answer": answer})
             # Update context_data dictionary immediately (though it's rebuilt at the end)
             # self.context_data[question] = answer # Optional: can remove if rebuilt from history
-            logger.debug(f"ProductivityAnalyzer.contextualize - User answer recorded. Added to history.")
+            logger.debug("ProductivityAnalyzer.contextualize - User answer recorded. Added to history.")
 
         logger.debug("ProductivityAnalyzer.contextualize - END - Contextualization loop finished")
 
     def _get_domain_from_url(self, url: str) -> Optional[str]: # Return type hint Optional
         """Extract the base domain (network location) from a URL."""
-        logger.debug(f"ProductivityAnalyzer._get_domain_from_url - START - URL: {url}")
+        logger.debug("ProductivityAnalyzer._get_domain_from_url - START - URL: %s", url)
         if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
-             logger.warning(f"ProductivityAnalyzer._get_domain_from_url - Invalid or non-HTTP(S) URL provided: '{url}'")
+             logger.warning("ProductivityAnalyzer._get_domain_from_url - Invalid or non-HTTP(S) URL provided: '%s'", url)
              return None
         try:
             parsed = urlparse(url)
             domain = parsed.netloc.lower()
             if not domain:
-                logger.warning(f"ProductivityAnalyzer._get_domain_from_url - Could not parse network location from URL: '{url}'")
+                logger.warning("ProductivityAnalyzer._get_domain_from_url - Could not parse network location from URL: '%s'", url)
                 return None
-            logger.debug(f"ProductivityAnalyzer._get_domain_from_url - Parsed domain: {domain}")
+            logger.debug("ProductivityAnalyzer._get_domain_from_url - Parsed domain: %s", domain)
             logger.debug("ProductivityAnalyzer._get_domain_from_url - END - SUCCESS")
             return domain
         except Exception as e:
-            logger.warning(f"ProductivityAnalyzer._get_domain_from_url - Error parsing URL '{url}': {e}") # Changed to logger.warning
+            logger.warning("ProductivityAnalyzer._get_domain_from_url - Error parsing URL '%s': %s", url, e) # Changed to logger.warning
             logger.debug("ProductivityAnalyzer._get_domain_from_url - END - ERROR, returning None")
             return None
 
     def _is_allowed_platform(self, url: str, domain: str) -> bool:
         """Check if URL belongs to allowed platforms for specific domain."""
         base_domain = self._get_domain_from_url(url)
-        logger.debug(f"_is_allowed_platform - Checking domain: {base_domain} for URL: {url} in {domain} context")
+        logger.debug("_is_allowed_platform - Checking domain: %s for URL: %s in %s context", base_domain, url, domain)
 
         if not base_domain:
             return False
 
         try:
             # Ensure the domain exists in settings
-            if domain not in self.settings.get("domains", {}):
-                 logger.warning(f"_is_allowed_platform - Domain '{domain}' not found in settings.")
+            policy = self.policy
+            if domain not in policy:
+                 logger.warning("_is_allowed_platform - Domain '%s' not found in settings.", domain)
                  return False
-            settings = self.settings["domains"][domain]
 
-            url_lower = url.lower()
-            hostname_lower = base_domain # Already lowercased by _get_domain_from_url
-
-            # Only check platform types that exist in this domain's settings
-            allowed_platform_types = ['lms_platforms', 'productivity_tools', 'ai_tools']
-
-            for platform_type in allowed_platform_types:
-                if platform_type not in settings:
-                    continue # Skip if this platform type isn't defined for the domain
-
-                # Ensure the setting is actually a list
-                if not isinstance(settings.get(platform_type), list):
-                    logger.warning(f"_is_allowed_platform - Setting '{platform_type}' for domain '{domain}' is not a list.")
-                    continue
+            # Allowed platforms take precedence in the compiled policy, so an ALLOW
+            # decision means one of lms_platforms/productivity_tools/ai_tools matched
+            # as a substring of the hostname or the full URL.
+            decision = policy.evaluate(url, domain)
+            if decision and decision.verdict == ALLOW:
+                logger.info("_is_allowed_platform - Platform match in %s domain - Type: %s, Platform: %s for URL %s", domain, decision.rule_type, decision.rule, url)
+                return True
 
-                for platform in settings[platform_type]:
-                    if not isinstance(platform, str): # Ensure platform entry is a string
-                        logger.warning(f"_is_allowed_platform - Non-string entry found in '{platform_type}' for domain '{domain}': {platform}")
-                        continue
-                    platform_lower = platform.lower()
-                    # Check if the platform is a substring of the hostname OR the full URL
-                    # This allows matching subdomains (e.g., classroom.google.com) or specific paths if needed
-                    if platform_lower in hostname_lower or platform_lower in url_lower:
-                        logger.info(f"_is_allowed_platform - Platform match in {domain} domain - Type: {platform_type}, Platform: {platform} for URL {url}")
-                        return True
-
-            logger.debug(f"_is_allowed_platform - No allowed platform match for {url} in {domain} domain")
+            logger.debug("_is_allowed_platform - No allowed platform match for %s in %s domain", url, domain)
             return False
-        except KeyError:
-             logger.error(f"_is_allowed_platform - Malformed settings for domain '{domain}'.")
-             return False
         except Exception as e:
-            logger.error(f"_is_allowed_platform - Error during check: {e}", exc_info=True)
+            logger.error("_is_allowed_platform - Error during check: %s", e, exc_info=True)
             return False
 
     # This function seems redundant if _is_allowed_platform checks 'ai_tools'
     # Kept for potential specific logic, but consider merging/removing.
     def _is_ai_site(self, url: str) -> bool:
         """Check if the URL belongs to a known AI tool site (can be domain specific via settings)."""
-        logger.debug(f"ProductivityAnalyzer._is_ai_site - START - URL: {url}")
+        logger.debug("ProductivityAnalyzer._is_ai_site - START - URL: %s", url)
         base_domain = self._get_domain_from_url(url)
-        logger.debug(f"ProductivityAnalyzer._is_ai_site - Base domain from URL: {base_domain}")
+        logger.debug("ProductivityAnalyzer._is_ai_site - Base domain from URL: %s", base_domain)
         if not base_domain:
             logger.debug("ProductivityAnalyzer._is_ai_site - Base domain is None, returning False")
             return False
@@ -321,11 +397,11 @@ class ProductivityAnalyzer:
             "copilot.microsoft.com", # Updated copilot domain
             "perplexity.ai"
         ]
-        logger.debug(f"ProductivityAnalyzer._is_ai_site - Generic AI patterns: {ai_patterns}")
+        logger.debug("ProductivityAnalyzer._is_ai_site - Generic AI patterns: %s", ai_patterns)
 
         # Check generic patterns
         if any(base_domain == ai_domain or base_domain.endswith('.' + ai_domain) for ai_domain in ai_patterns):
-             logger.debug(f"ProductivityAnalyzer._is_ai_site - Generic AI site match found.")
+             logger.debug("ProductivityAnalyzer._is_ai_site - Generic AI site match found.")
              logger.debug("ProductivityAnalyzer._is_ai_site - END - Returning True")
              return True
 
@@ -343,66 +419,37 @@ class ProductivityAnalyzer:
     # Kept for potential direct use, but analyze_website is the main entry point.
     def _is_productive_domain(self, url: str, domain: str) -> Optional[bool]:
         """Check if the domain is explicitly allowed or blocked based on settings."""
-        logger.debug(f"ProductivityAnalyzer._is_productive_domain - START - URL: {url}, Domain: {domain}")
+        logger.debug("ProductivityAnalyzer._is_productive_domain - START - URL: %s, Domain: %s", url, domain)
         base_domain = self._get_domain_from_url(url)
-        logger.debug(f"ProductivityAnalyzer._is_productive_domain - Base domain from URL: {base_domain}")
+        logger.debug("ProductivityAnalyzer._is_productive_domain - Base domain from URL: %s", base_domain)
 
         if not base_domain:
             logger.debug("ProductivityAnalyzer._is_productive_domain - Base domain is None, returning None")
             return None # Cannot determine without a base domain
 
         try:
-             if domain not in self.settings.get("domains", {}):
-                 logger.warning(f"_is_productive_domain - Domain '{domain}' not found in settings.")
+             policy = self.policy
+             if domain not in policy:
+                 logger.warning("_is_productive_domain - Domain '%s' not found in settings.", domain)
                  return None # Cannot determine if domain settings are missing
-             settings = self.settings["domains"][domain]
-             logger.debug(f"ProductivityAnalyzer._is_productive_domain - Domain settings: {settings}")
-
-             # Check if explicitly allowed platform
-             if self._is_allowed_platform(url, domain):
-                 logger.debug("ProductivityAnalyzer._is_productive_domain - Is allowed platform, returning True")
-                 return True
-
-             # Check if explicitly blocked specific domain/URL
-             # Ensure 'blocked_specific' exists and is a list
-             blocked_specific = settings.get("blocked_specific", [])
-             if isinstance(blocked_specific, list):
-                 for blocked in blocked_specific:
-                      if not isinstance(blocked, str): continue # Skip non-string entries
-                      # Simple endswith check for domains, or exact match for full URLs
-                      if base_domain.endswith(blocked.lower()) or url.lower() == blocked.lower():
-                          logger.debug(f"ProductivityAnalyzer._is_productive_domain - Blocked specific rule '{blocked}' match. Returning False")
-                          return False
-             else:
-                  logger.warning(f"_is_productive_domain - 'blocked_specific' for domain '{domain}' is not a list.")
-
-
-             # Check for blocked keywords in the URL
-             blocked_keywords = settings.get("blocked_keywords", [])
-             url_lower = url.lower()
-             if isinstance(blocked_keywords, list):
-                 for keyword in blocked_keywords:
-                     if not isinstance(keyword, str): continue
-                     if keyword.lower() in url_lower:
-                         logger.debug(f"ProductivityAnalyzer._is_productive_domain - Blocked keyword '{keyword}' found in URL. Returning False")
-                         return False
-             else:
-                 logger.warning(f"_is_productive_domain - 'blocked_keywords' for domain '{domain}' is not a list.")
-
-             logger.debug("ProductivityAnalyzer._is_productive_domain - No explicit productive/blocked rule matched based on settings. Returning None for further analysis.")
-             return None # Needs further analysis (like context or AI)
-
-        except KeyError:
-             logger.error(f"_is_productive_domain - Malformed settings for domain '{domain}'.")
-             return None
+
+             # Allowed platforms, blocked_specific and blocked_keywords in one pass
+             decision = policy.evaluate(url, domain)
+             if decision is None:
+                 logger.debug("ProductivityAnalyzer._is_productive_domain - No explicit productive/blocked rule matched based on settings. Returning None for further analysis.")
+                 return None # Needs further analysis (like context or AI)
+
+             logger.debug("ProductivityAnalyzer._is_productive_domain - %s rule '%s' match. Returning %s", decision.rule_type, decision.rule, decision.verdict == ALLOW)
+             return decision.verdict == ALLOW
+
         except Exception as e:
-            logger.error(f"_is_productive_domain - Error during check: {e}", exc_info=True)
+            logger.error("_is_productive_domain - Error during check: %s", e, exc_info=True)
             return None
 
 
     def _analyze_url_components(self, url: str) -> dict:
         """Basic URL component analysis without context relevance."""
-        logger.debug(f"_analyze_url_components - START - URL: {url}")
+        logger.debug("_analyze_url_components - START - URL: %s", url)
         signals = {
             'is_search': False,
             'is_educational': False,
@@ -432,49 +479,43 @@ class ProductivityAnalyzer:
                          try:
                               signals['search_query'] = requests.utils.unquote(value) # Decode URL encoding
                          except Exception as decode_err:
-                              logger.warning(f"_analyze_url_components - Error decoding search query param '{value}': {decode_err}")
+                              logger.warning("_analyze_url_components - Error decoding search query param '%s': %s", value, decode_err)
                               signals['search_query'] = value # Use raw value if decoding fails
                          break # Found one, stop looking
 
-            # Basic URL analysis based on keywords
-            netloc_lower = signals['hostname']
-            path_lower = parsed.path.lower()
-
-            signals['is_search'] = any(term in netloc_lower for term in ['search.', 'google.', 'bing.', 'duckduckgo.', 'startpage.']) or \
-                                   any(term in path_lower for term in ['/search', '/s/', '/find', '/sp/search']) or \
-                                   signals['search_query'] is not None
+            # Basic URL analysis based on keywords: one scan of the URL yields every
+            # category and signal hit from url_heuristics.json.
+            hits = self.heuristics.scan(url, parsed)
 
-            signals['is_educational'] = any(term in netloc_lower for term in ['.edu', '.ac.', 'school', 'learn', 'course', 'study', 'academic', 'khanacademy', 'coursera', 'udemy']) or \
-                                      any(term in path_lower for term in ['/edu', '/learn', '/course'])
+            signals['is_search'] = 'is_search' in hits or signals['search_query'] is not None
+            signals['is_educational'] = 'is_educational' in hits
+            signals['is_reference'] = 'is_reference' in hits
 
-            signals['is_reference'] = any(term in netloc_lower for term in ['wiki', 'docs', 'developer.', 'reference', 'stackexchange', 'stackoverflow', 'github.io']) or \
-                                     any(term in path_lower for term in ['/wiki', '/docs', '/documentation', '/ref'])
-
-            signals['domain_type'] = self._categorize_domain(netloc_lower) # Use helper
+            signals['domain_type'] = self.heuristics.categorize(hits)
             signals['path_indicators'] = path_parts
 
             # Generic keyword/path checks (domain-specific checks happen in analyze_website)
-            generic_blocked_keywords = ['game', 'unblocked', 'entertainment', 'proxy', 'bypass', 'hack', 'cheat']
-            url_lower = url.lower()
-            signals['has_blocked_keywords_generic'] = any(keyword in url_lower for keyword in generic_blocked_keywords)
-            signals['suspicious_paths'] = any(keyword in path_parts for keyword in generic_blocked_keywords)
+            signals['has_blocked_keywords_generic'] = GENERIC_BLOCKED in hits
+            signals['suspicious_paths'] = self.heuristics.has_suspicious_path(path_parts)
 
-            logger.debug(f"_analyze_url_components - Analysis result: {signals}")
+            logger.debug("_analyze_url_components - Analysis result: %s", signals)
             return signals
 
         except Exception as e:
-            logger.error(f"_analyze_url_components - Error analyzing URL components for '{url}': {e}", exc_info=True)
+            logger.error("_analyze_url_components - Error analyzing URL components for '%s': %s", url, e, exc_info=True)
             signals['error'] = str(e)
             return signals
 
-    def _check_context_relevance(self, url: str, url_signals=None) -> dict:
-        """Check relevance of URL and its signals against stored context data.
+    def _check_context_relevance(self, url: str, url_signals=None, context: Optional[AnalysisContext] = None) -> dict:
+        """Check relevance of URL and its signals against the task context.
         
         Args:
             url: The URL to check
             url_signals: Either a dictionary of URL signals or a string containing
                         the search query directly
+            context: The request's task context (defaults to the CLI's context_data)
         """
+        context = self._resolve_context(context)
         # Initialize result structure
         relevance = {
             'score': 0.0,
@@ -482,37 +523,21 @@ class ProductivityAnalyzer:
             'matches': [],
             'error': None
         }
-        logger.debug(f"_check_context_relevance - START - URL: {url}")
+        logger.debug("_check_context_relevance - START - URL: %s", url)
 
-        if not self.context_data:
+        if not context:
             logger.warning("_check_context_relevance - No context data available for analysis.")
             return relevance # Return default zero score if no context
 
         try:
             # --- Prepare context terms ---
-            context_terms_set = set()
-            logger.debug(f"_check_context_relevance - Processing context data: {self.context_data}")
-            for question, answer in self.context_data.items():
-                if isinstance(answer, str) and answer.strip():
-                    # Clean and split into words, remove punctuation, lowercase
-                    words = [word.strip('.,?!();:"\'').lower() for word in answer.split()]
-                    words = [word for word in words if len(word) > 2] # Keep words longer than 2 chars
-
-                    # Add single words
-                    context_terms_set.update(words)
-
-                    # Add 2-word phrases (bi-grams)
-                    context_terms_set.update([f"{words[i]} {words[i+1]}" for i in range(len(words)-1)])
-
-                    # Add 3-word phrases (tri-grams) - Optional, can increase noise
-                    context_terms_set.update([f"{words[i]} {words[i+1]} {words[i+2]}" for i in range(len(words)-2)])
-
-            context_terms = list(context_terms_set)
-            if not context_terms:
+            # Terms are extracted and compiled once per context (cached by fingerprint).
+            index = self.context_indexes.get(context.answers, context.fingerprint)
+            if not len(index):
                  logger.warning("_check_context_relevance - No usable terms extracted from context data.")
                  return relevance
             
-            logger.debug(f"_check_context_relevance - Context terms generated ({len(context_terms)}): {context_terms[:20]}...") # Log first few terms
+            logger.debug("_check_context_relevance - Context index has %s terms", len(index))
 
             # --- Check against URL components ---
             url_lower = url.lower()
@@ -526,23 +551,23 @@ class ProductivityAnalyzer:
                 # If url_signals is a string, treat it as the search query directly
                 search_query = url_signals
             
+            # One automaton pass covers both the URL and the search query
+            query_lower = search_query.lower() if search_query else ''
+            url_terms, query_terms = index.match(url_lower, query_lower)
+
             # Check full URL (weight: 0.3)
-            for term in context_terms:
-                if term in url_lower:
-                    relevance['score'] += 0.3
-                    relevance['matched_terms'].append(term)
-                    relevance['matches'].append({'term': term, 'location': 'url', 'weight': 0.3})
+            for term in url_terms:
+                relevance['score'] += 0.3
+                relevance['matched_terms'].append(term)
+                relevance['matches'].append({'term': term, 'location': 'url', 'weight': 0.3})
 
             # Check search query (higher weight: 0.5)
-            if search_query:
-                query_lower = search_query.lower()
-                logger.debug(f"_check_context_relevance - Checking search query: '{query_lower}'")
-                
-                for term in context_terms:
-                    if term in query_lower:
-                        relevance['score'] += 0.5
-                        relevance['matched_terms'].append(term)
-                        relevance['matches'].append({'term': term, 'location': 'search_query', 'weight': 0.5})
+            if query_lower:
+                logger.debug("_check_context_relevance - Checking search query: '%s'", query_lower)
+                for term in query_terms:
+                    relevance['score'] += 0.5
+                    relevance['matched_terms'].append(term)
+                    relevance['matches'].append({'term': term, 'location': 'search_query', 'weight': 0.5})
 
             # --- TODO: Future Enhancement: Check Website Content ---
             # Placeholder for fetching and analyzing title/meta description/body text
@@ -562,144 +587,205 @@ class ProductivityAnalyzer:
             relevance['score'] = min(1.0, round(relevance['score'], 2))
             relevance['matched_terms'] = sorted(list(set(relevance['matched_terms']))) # Sort for consistency
 
-            logger.debug(f"_check_context_relevance - END - Relevance result: {relevance}")
+            logger.debug("_check_context_relevance - END - Relevance result: %s", relevance)
             return relevance
 
         except Exception as e:
-            logger.error(f"_check_context_relevance - Error: {e}", exc_info=True)
+            logger.error("_check_context_relevance - Error: %s", e, exc_info=True)
             relevance['error'] = str(e)
             return relevance
 
+    def _check_context_relevance_many(self, urls: List[str], url_signals: List[dict],
+                                      context: Optional[AnalysisContext] = None) -> List[dict]:
+        """_check_context_relevance for many URLs (url_signals[i] belongs to urls[i]), scored in one pass.
+
+        Results equal what _check_context_relevance returns for each URL; see relevance.py.
+        """
+        context = self._resolve_context(context)
+        relevances = [empty_relevance() for _ in urls]
+        if not urls:
+            return relevances
+        if not context:
+            logger.warning("_check_context_relevance_many - No context data available for analysis.")
+            return relevances
+
+        try:
+            index = self.context_indexes.get(context.answers, context.fingerprint)
+            if not len(index):
+                logger.warning("_check_context_relevance_many - No usable terms extracted from context data.")
+                return relevances
+            # url_signals entries are signal dicts or search queries, as for _check_context_relevance
+            search_queries = []
+            for signals in url_signals:
+                if isinstance(signals, dict):
+                    signals = signals.get('search_query', '')
+                search_queries.append(signals if isinstance(signals, str) else '')
+            relevances = score_many(index, urls, search_queries)
+            logger.debug("_check_context_relevance_many - Scored %s URLs against %s context terms", len(urls), len(index))
+            return relevances
+
+        except Exception as e:
+            logger.error("_check_context_relevance_many - Error: %s", e, exc_info=True)
+            for relevance in relevances:
+                relevance['error'] = str(e)
+            return relevances
+
 
     def _categorize_domain(self, hostname: str) -> str:
         """Categorize domain type based on hostname patterns."""
-        hostname = hostname.lower() # Ensure lowercase
-
-        # Prioritize more specific categories first
-        if any(term in hostname for term in ['.edu', '.ac.', 'school', 'learn', 'course', 'study', 'academic', 'khanacademy', 'coursera', 'udemy', 'blackboard', 'canvas', 'moodle']):
-            return 'educational'
-        if any(term in hostname for term in ['wiki', 'docs.', 'developer.', 'reference', 'stackexchange', 'stackoverflow', 'github.io', 'mdn.']):
-            return 'documentation/reference'
-        if any(term in hostname for term in ['github.com', 'gitlab.com', 'bitbucket.org', 'dev.azure', 'dev.to']):
-             return 'development/code'
-        if any(term in hostname for term in ['google.com', 'bing.com', 'duckduckgo.com', 'startpage.com', 'search.']): # Add specific search engines
-             if 'google.com' in hostname and any(sub in hostname for sub in ['docs.', 'sheets.', 'slides.', 'drive.', 'mail.', 'calendar.']):
-                  return 'productivity/tools' # Google Workspace tools are productivity
-             return 'search engine'
-        if any(term in hostname for term in ['mail.', 'calendar.', 'drive.', 'office.com', 'microsoft365.com', 'onedrive.', 'dropbox', 'notion.', 'evernote', 'trello', 'asana', 'jira', 'slack', 'zoom.us', 'teams.microsoft']):
-             return 'productivity/tools'
-        if any(term in hostname for term in ['news', 'cnn', 'bbc', 'nytimes', 'reuters', 'wsj', 'guardian']):
-             return 'news/media'
-        if any(term in hostname for term in ['facebook', 'twitter', 'instagram', 'linkedin', 'reddit', 'pinterest', 'tiktok']):
-            return 'social media'
-        if any(term in hostname for term in ['youtube', 'netflix', 'hulu', 'twitch', 'spotify', 'vimeo']):
-             return 'streaming/entertainment'
-        if any(term in hostname for term in ['amazon', 'ebay', 'walmart', 'target', 'etsy', 'shopping']):
-             return 'e-commerce/shopping'
-        if any(term in hostname for term in ['game', 'steam', 'origin', 'playstation', 'xbox', 'nintendo', 'ign']):
-             return 'gaming'
-
-        # Default if no specific category matches
-        return 'general'
-
-    def analyze_website(self, url: str, domain: str) -> dict: # Return dict now
+        # Categories are tried in url_heuristics.json order, most specific first
+        return self.heuristics.categorize(self.heuristics.scan_hostname(hostname))
+
+    def analyze_website(self, url: str, domain: str, context: Optional[AnalysisContext] = None) -> dict: # Return dict now
         """Analyze if a website is productive based on domain settings, context, and AI.
 
+        Args:
+            context: The request's task context. Omitted, the CLI's context_data is used.
+
         Returns:
             dict: {'isProductive': bool, 'explanation': str, 'confidence': float (optional)}
         """
-        logger.debug(f"analyze_website - START - URL: {url}, Domain: {domain}")
-        
+        logger.debug("analyze_website - START - URL: %s, Domain: %s", url, domain)
+        result, ai_request = self._prepare_analysis(url, domain, context)
+        if result is not None:
+            return result
+        return self._analyze_with_ai(ai_request)
+
+    def _resolve_context(self, context: Optional[AnalysisContext]) -> AnalysisContext:
+        """The explicit request context, or a snapshot of the CLI's context_data."""
+        return context if context is not None else AnalysisContext(self.context_data)
+
+    def _prepare_analysis(self, url: str, domain: str,
+                          context: Optional[AnalysisContext] = None) -> Tuple[Optional[dict], Optional[dict]]:
+        """Validation, rate limiting and the rule stages shared by the sync and async analyzers."""
         # Security validation
         if not InputValidator.validate_url(url):
-            logger.warning(f"Invalid URL provided for analysis: {url}")
-            return {'isProductive': False, 'explanation': 'Invalid URL format.'}
+            logger.warning("Invalid URL provided for analysis: %s", url)
+            decided_by('validation')
+            return {'isProductive': False, 'explanation': 'Invalid URL format.'}, None
         
         domain = InputValidator.sanitize_string(domain, 100)
         if not InputValidator.validate_domain(domain):
-            logger.warning(f"Invalid domain provided for analysis: {domain}")
-            return {'isProductive': False, 'explanation': 'Invalid domain format.'}
+            logger.warning("Invalid domain provided for analysis: %s", domain)
+            decided_by('validation')
+            return {'isProductive': False, 'explanation': 'Invalid domain format.'}, None
         
+        if self._reserve_analysis_slots(1) < 1:
+            logger.warning("Rate limit exceeded for analyze_website")
+            decided_by('rate_limit')
+            return {'isProductive': False, 'explanation': 'Rate limit exceeded. Please try again later.'}, None
+
+        return self._analyze_before_ai(url, domain, self._resolve_context(context))
+
+    def _reserve_analysis_slots(self, count: int) -> int:
+        """Reserve up to `count` analyses against the per-minute limit; returns how many were granted."""
         # Rate limiting check - prevent too many requests in short time
         current_time = datetime.now()
-        if not hasattr(self, '_last_analysis_times'):
-            self._last_analysis_times = []
-        
-        # Remove old timestamps (older than 1 minute)
-        self._last_analysis_times = [
-            t for t in self._last_analysis_times 
-            if current_time - t < timedelta(minutes=1)
-        ]
-        
-        # Check if too many requests in the last minute
-        if len(self._last_analysis_times) > 50:  # Max 50 requests per minute
-            logger.warning(f"Rate limit exceeded for analyze_website")
-            return {'isProductive': False, 'explanation': 'Rate limit exceeded. Please try again later.'}
-        
-        self._last_analysis_times.append(current_time)
-
+        with self._analysis_times_lock:
+            # Remove old timestamps (older than 1 minute)
+            while self._analysis_times and current_time - self._analysis_times[0] >= timedelta(minutes=1):
+                self._analysis_times.popleft()
+
+            # Max 50 requests per minute by default (the 51st is the last one admitted, as before)
+            granted = max(0, min(count, self.max_analyses_per_minute + 1 - len(self._analysis_times)))
+            self._analysis_times.extend([current_time] * granted)
+        if granted < count:
+            RATE_LIMITED.inc(count - granted, limiter='analyzer')
+        return granted
+
+    def _analyze_before_ai(self, url: str, domain: str, context: AnalysisContext) -> Tuple[Optional[dict], Optional[dict]]:
+        """Run every analysis stage that does not need the model.
+
+        Returns (result, None) when the rules, context relevance or default
+        decision settle the URL, or (None, ai_request) when it must go to the
+        AI stage; ai_request carries what _analyze_with_ai needs.
+        """
+        result, pending = self._apply_rules(url, domain, context)
+        if result is not None:
+            return result, None
+        context_relevance = None
+        if pending['run_context_check']:
+            with span('context'):
+                context_relevance = self._check_context_relevance(url, pending['url_signals'], context)
+        return self._analyze_after_rules(pending, context_relevance)
+
+    def _apply_rules(self, url: str, domain: str, context: AnalysisContext) -> Tuple[Optional[dict], Optional[dict]]:
+        """Validation and rule stages; (result, None) if they settle the URL, else (None, pending analysis state)."""
         # --- Initial Checks ---
         base_domain = self._get_domain_from_url(url)
         if not base_domain:
-            logger.warning(f"analyze_website - Cannot analyze URL without a valid domain: {url}")
+            logger.warning("analyze_website - Cannot analyze URL without a valid domain: %s", url)
+            decided_by('validation')
             # Cannot be productive if URL is invalid
-            return {'isProductive': False, 'explanation': 'Invalid URL format.'}
-
-        if domain not in self.settings.get("domains", {}):
-            logger.error(f"analyze_website - Domain '{domain}' configuration not found in settings.")
+            return {'isProductive': False, 'explanation': 'Invalid URL format.'}, None
+
+        # Take one policy snapshot for the whole analysis so a concurrent reload
+        # of settings.json cannot mix rules from two versions.
+        policy = self.policy
+        if domain not in policy:
+            logger.error("analyze_website - Domain '%s' configuration not found in settings.", domain)
+            decided_by('settings')
             # Cannot analyze without domain settings
-            return {'isProductive': False, 'explanation': f"Configuration for domain '{domain}' not found."}
-
-        settings = self.settings["domains"][domain]
-
-        # --- 1. Check Explicitly Allowed Platforms ---
-        if self._is_allowed_platform(url, domain):
-            logger.info(f"analyze_website - ALLOWED: URL '{url}' matches an allowed platform for domain '{domain}'.")
-            return {'isProductive': True, 'explanation': f"Allowed platform for '{domain}' domain."}
-
-        # --- 2. Check Explicitly Blocked Specific URLs/Domains ---
-        blocked_specific = settings.get("blocked_specific", [])
-        if isinstance(blocked_specific, list):
-            for blocked in blocked_specific:
-                if not isinstance(blocked, str): continue
-                # Check if the blocked rule matches the base domain or the full URL
-                if base_domain.endswith(blocked.lower()) or url.lower() == blocked.lower():
-                    logger.info(f"analyze_website - BLOCKED: URL '{url}' matches blocked specific rule '{blocked}' for domain '{domain}'.")
-                    return {'isProductive': False, 'explanation': f"Blocked specific rule: '{blocked}'."}
-        else:
-            logger.warning(f"analyze_website - 'blocked_specific' is not a list for domain '{domain}'.")
-
-        # --- 3. Check Blocked Keywords in URL ---
-        blocked_keywords = settings.get("blocked_keywords", [])
-        url_lower = url.lower()
-        if isinstance(blocked_keywords, list):
-            for keyword in blocked_keywords:
-                if not isinstance(keyword, str): continue
-                if keyword.lower() in url_lower:
-                    logger.info(f"analyze_website - BLOCKED: URL '{url}' contains blocked keyword '{keyword}' for domain '{domain}'.")
-                    return {'isProductive': False, 'explanation': f"Blocked keyword found: '{keyword}'."}
-        else:
-            logger.warning(f"analyze_website - 'blocked_keywords' is not a list for domain '{domain}'.")
+            return {'isProductive': False, 'explanation': f"Configuration for domain '{domain}' not found."}, None
+
+        settings = policy.settings["domains"][domain]
+
+        # --- 1-3. Allowed Platforms, Blocked Specific URLs/Domains, Blocked Keywords ---
+        # All three rule lists are answered by the compiled policy in one scan of the URL.
+        with span('rules'):
+            decision = policy.evaluate(url, domain)
+        if decision is not None:
+            decided_by(f"rules:{decision.rule_type}")
+            if decision.verdict == ALLOW:
+                logger.info("analyze_website - ALLOWED: URL '%s' matches an allowed platform for domain '%s'.", url, domain)
+                return {'isProductive': True, 'explanation': f"Allowed platform for '{domain}' domain."}, None
+            if decision.rule_type == 'blocked_specific':
+                logger.info("analyze_website - BLOCKED: URL '%s' matches blocked specific rule '%s' for domain '%s'.", url, decision.rule, domain)
+                return {'isProductive': False, 'explanation': f"Blocked specific rule: '{decision.rule}'."}, None
+            logger.info("analyze_website - BLOCKED: URL '%s' contains blocked keyword '%s' for domain '%s'.", url, decision.rule, domain)
+            return {'isProductive': False, 'explanation': f"Blocked keyword found: '{decision.rule}'."}, None
 
 
         # --- 4. Contextual Analysis (if applicable) ---
         contextualization_required = settings.get("contextualization_required", domain == "personal") # Default to True for personal
-        # Context check runs if required AND context data exists
-        run_context_check = contextualization_required and self.context_data
+        with span('url_signals'):
+            url_signals = self._analyze_url_components(url) # Analyze components once
+
+        return None, {
+            'url': url,
+            'domain': domain,
+            'context': context,
+            'policy': policy,
+            'settings': settings,
+            'url_signals': url_signals,
+            'contextualization_required': contextualization_required,
+            # Context check runs if required AND context data exists
+            'run_context_check': contextualization_required and bool(context),
+        }
 
-        context_relevance = {'score': 0.0} # Default score if no context check
-        url_signals = self._analyze_url_components(url) # Analyze components once
+    def _analyze_after_rules(self, pending: dict, context_relevance: Optional[dict]) -> Tuple[Optional[dict], Optional[dict]]:
+        """Context, stored-verdict and default stages for a URL the rules left open.
+
+        context_relevance is the _check_context_relevance result when
+        pending['run_context_check'] is set (batch callers score many URLs at once).
+        """
+        url, domain, context = pending['url'], pending['domain'], pending['context']
+        policy, settings, url_signals = pending['policy'], pending['settings'], pending['url_signals']
+        contextualization_required = pending['contextualization_required']
+        run_context_check = pending['run_context_check']
 
-        if run_context_check:
-            context_relevance = self._check_context_relevance(url, url_signals)
-            logger.debug(f"analyze_website - Context relevance result: {context_relevance}")
+        if not run_context_check:
+            context_relevance = {'score': 0.0} # Default score if no context check
+        else:
+            logger.debug("analyze_website - Context relevance result: %s", context_relevance)
 
             # Decision based on high context relevance
             if context_relevance.get('score', 0.0) > 0.7: # Ensure default is 0.0 for comparison
                 matched_terms_str = ', '.join(context_relevance.get('matched_terms',[]))
                 explanation = f"High context relevance ({context_relevance['score']}). Matched: {matched_terms_str}"
-                logger.info(f"analyze_website - ALLOWED: {explanation} for URL '{url}'.")
-                return {'isProductive': True, 'explanation': explanation}
+                logger.info("analyze_website - ALLOWED: %s for URL '%s'.", explanation, url)
+                decided_by('context')
+                return {'isProductive': True, 'explanation': explanation}, None
 
         # --- 5. AI Analysis (Borderline Cases or when context is insufficient) ---
         # Condition to use AI:
@@ -707,97 +793,54 @@ class ProductivityAnalyzer:
         # - OR Contextualization is required but context is empty (needs AI to decide based on URL alone vs. generic productivity)
         # - OR Contextualization is *not* required (e.g., work/school) and URL didn't hit explicit allow/block rules.
         use_ai = (run_context_check and 0.3 <= context_relevance.get('score', 0.0) <= 0.7) or \
-                 (contextualization_required and not self.context_data) or \
+                 (contextualization_required and not context) or \
                  (not contextualization_required) # Use AI if not explicitly allowed/blocked and context isn't needed/used
 
         if use_ai:
-            logger.debug(f"analyze_website - Proceeding to AI analysis for URL: {url}")
-            try:
-                context_summary = "No specific task context provided."
-                if self.context_data:
-                     # Ensure context_data is serializable (it should be dict)
-                     try:
-                         context_summary = json.dumps(self.context_data, indent=2)
-                     except TypeError as json_err:
-                         logger.error(f"analyze_website - Context data not JSON serializable: {json_err}")
-                         context_summary = "Error: Context data could not be formatted."
-
-
-                # Prepare detailed prompt for AI
-                analysis_prompt = f"""Analyze if visiting this URL is productive for the user in the '{domain}' domain, considering their current task context (if provided).
-
-                Domain Policy Context:
-                - Current Domain: {domain}
-                - Explicitly Allowed Platforms (already checked): LMS, Productivity Tools, AI Tools defined for '{domain}'
-                - Explicitly Blocked Keywords (already checked): {settings.get("blocked_keywords", [])}
-                - Explicitly Blocked Specific Sites (already checked): {settings.get("blocked_specific", [])}
-
-                User Task Context:
-                {context_summary}
-
-                URL Under Review:
-                - URL: {url}
-                - Detected Hostname: {url_signals.get('hostname', 'N/A')}
-                - Detected Category: {url_signals.get('domain_type', 'N/A')}
-                - Is Search?: {url_signals.get('is_search', 'N/A')}
-                - Search Query: {url_signals.get('search_query', 'N/A')}
-                - Context Relevance Score: {context_relevance.get('score', 'N/A')} (if applicable)
-                - Context Matched Terms: {context_relevance.get('matched_terms', 'N/A')} (if applicable)
-
-                Analysis Goal: Determine if accessing this URL is directly related to completing the user's stated task (if provided) OR is generally considered productive/necessary within the '{domain}' domain (e.g., documentation, core tools) and isn't explicitly blocked. Block common time-wasting sites (social media, games, excessive entertainment) unless context strongly justifies it.
-
-                Respond with exactly 'ALLOW' or 'BLOCK' followed by a concise reason.
-                Format: <ALLOW|BLOCK>: <Reasoning based on URL, context, and domain policy.>
-                Example ALLOW: ALLOW: Accessing Python documentation is relevant to the programming task.
-                Example BLOCK: BLOCK: Social media site is not related to the work task and is generally blocked in the 'work' domain.
-                """
-
-                logger.debug("analyze_website - AI Analysis Prompt:\n" + analysis_prompt)
-
-                # --- FIX: Use self.model for generation ---
-                response = self.model.generate_content(
-                    contents=analysis_prompt
-                    # Removed model="gemini-2.0-flash"
-                )
-                # --- End FIX ---
-
-                if not hasattr(response, 'text'):
-                    logger.error(f"analyze_website - AI response object does not have 'text' attribute. Response: {response}")
-                    raise ValueError("Invalid response format from AI.")
-
-                decision = response.text.strip()
-                logger.info(f"analyze_website - AI Analysis Result for {url}: {decision}")
-
-                # Parse AI decision
-                if ':' in decision:
-                    verdict, explanation = decision.split(':', 1)
-                    verdict = verdict.strip().upper()
-                    explanation = explanation.strip()
-
-                    if verdict == 'ALLOW':
-                        logger.info(f"analyze_website - AI Verdict: ALLOW. Reason: {explanation}")
-                        # Log additional details for successful analysis that might be useful for debugging direct visits
-                        logger.info(f"analyze_website - AI ALLOWED: URL={url}, DOMAIN={domain}, EXPLANATION={explanation}")
-                        return {'isProductive': True, 'explanation': explanation} # Return dict
-                    elif verdict == 'BLOCK':
-                        logger.info(f"analyze_website - AI Verdict: BLOCK. Reason: {explanation}")
-                        # Log additional details for unsuccessful analysis
-                        logger.info(f"analyze_website - AI BLOCKED: URL={url}, DOMAIN={domain}, EXPLANATION={explanation}")
-                        return {'isProductive': False, 'explanation': explanation} # Return dict
-                    else:
-                        explanation = f"AI returned unexpected verdict '{verdict}'."
-                        logger.warning(f"analyze_website - {explanation} Defaulting to BLOCK.")
-                        return {'isProductive': False, 'explanation': explanation} # Return dict
-                else:
-                    explanation = f"AI response format incorrect ('ALLOW:' or 'BLOCK:' expected). Response: '{decision}'."
-                    logger.warning(f"analyze_website - {explanation} Defaulting to BLOCK.")
-                    return {'isProductive': False, 'explanation': explanation} # Return dict
-
-            except Exception as e:
-                explanation = f"AI analysis failed: {e}"
-                logger.error(f"analyze_website - Error during AI analysis for {url}: {e}", exc_info=True)
-                logger.info("analyze_website - Defaulting to BLOCKED due to AI analysis error.")
-                return {'isProductive': False, 'explanation': explanation} # Return dict
+            key = verdict_key(url, domain, policy.version, context.answers)
+            if self.verdict_store is not None:
+                with span('verdict_store'):
+                    stored = self.verdict_store.get(key)
+                CACHE_LOOKUPS.inc(layer='verdict_store', result='miss' if stored is None else 'hit')
+                if stored is not None:
+                    logger.info("analyze_website - Stored verdict for URL '%s': %s", url, stored)
+                    decided_by('verdict_store')
+                    return stored, None
+
+            # Search verdicts depend on the query, so searches are never generalized
+            templated_key = None
+            if self.template_verdicts is not None and not url_signals.get('is_search'):
+                templated_key = template_key(url, domain, policy.version, context.fingerprint)
+            if templated_key is not None:
+                templated = self.template_verdicts.lookup(templated_key)
+                CACHE_LOOKUPS.inc(layer='url_template', result='miss' if templated is None else 'hit')
+                if templated is not None:
+                    logger.info("analyze_website - Template verdict for URL '%s': %s", url, templated)
+                    decided_by('url_template')
+                    return templated, None
+
+            # The classifier never saw the user's task, so URLs the task context matched go to the model
+            if self.fastpath is not None and not url_signals.get('is_search') and not context_relevance.get('matched_terms'):
+                with span('fastpath'):
+                    predicted = self.fastpath.predict(url, domain, url_signals)
+                FASTPATH_PREDICTIONS.inc(result='deferred' if predicted is None else 'answered')
+                if predicted is not None:
+                    logger.info("analyze_website - Fast path verdict for URL '%s': %s", url, predicted)
+                    decided_by('fastpath')
+                    return predicted, None
+
+            logger.debug("analyze_website - Proceeding to AI analysis for URL: %s", url)
+            return None, {
+                'url': url,
+                'domain': domain,
+                'settings': settings,
+                'url_signals': url_signals,
+                'context_relevance': context_relevance,
+                'context': context,
+                'policy_version': policy.version,
+                'verdict_key': key,
+                'template_key': templated_key
+            }
 
         # --- 6. Default Decision ---
         # If we reach here, it means:
@@ -806,12 +849,328 @@ class ProductivityAnalyzer:
         # - AI analysis wasn't triggered or wasn't applicable.
         # In this scenario, default to blocking unless context strongly suggested otherwise (which it didn't).
         explanation = "Blocked by default rules (no specific allow match or low context relevance)."
-        logger.info(f"analyze_website - BLOCKED (Default): URL '{url}'. Reason: {explanation}")
+        logger.info("analyze_website - BLOCKED (Default): URL '%s'. Reason: %s", url, explanation)
+        decided_by('default')
+        return {'isProductive': False, 'explanation': explanation}, None # Return dict
+
+    def _analyze_with_ai(self, ai_request: dict) -> dict:
+        """AI stage of analyze_website for a URL the rules could not decide.
+
+        With micro-batching on, URLs that reach this stage together (same
+        domain, policy and context) are decided by one model call.
+        """
+        if self.micro_batcher is None:
+            return self._analyze_single_with_ai(ai_request)
+        try:
+            reply = self.micro_batcher.submit(prefix_key(ai_request), ai_request)
+        except Exception as e:
+            return self._analysis_error_result(ai_request['url'], e)
+        if reply is None:
+            # The batched reply had no verdict for this URL: ask about it alone
+            return self._analyze_single_with_ai(ai_request)
+        if isinstance(reply, Exception):
+            return self._analysis_error_result(ai_request['url'], reply)
+        try:
+            with span('parse'):
+                return self._parse_analysis_response(ai_request, reply)
+        except Exception as e:
+            return self._analysis_error_result(ai_request['url'], e)
+
+    def _analyze_ai_batch(self, ai_requests: List[dict]) -> List[object]:
+        """Model replies for micro-batched AI requests (run by the batch's leader thread).
+
+        Returns, per request, a response with .text, the exception the model
+        call raised, or None where the batched reply had no verdict for it.
+        Verdicts are parsed by each caller so its own trace records them.
+        """
+        if len(ai_requests) == 1:
+            try:
+                with span('prompt'):
+                    prompt = self._build_analysis_prompt(ai_requests[0])
+                return [self._generate_content(prompt, 'analysis')]
+            except Exception as e:
+                return [e]
+
+        MODEL_BATCH_SIZE.observe(len(ai_requests))
+        try:
+            with span('prompt'):
+                prompt = self.prompts.batch_analysis_prompt(ai_requests)
+            logger.debug("analyze_website - AI Batch Analysis Prompt:\n%s", prompt)
+            response = self._generate_content(prompt, 'analysis_batch')
+            if not hasattr(response, 'text'):
+                raise ValueError("Invalid response format from AI.")
+            text = response.text
+        except Exception as e:
+            return [e] * len(ai_requests)
+
+        # Results only fan out when the reply has exactly one verdict per URL
+        verdicts = parse_numbered_verdicts(text, len(ai_requests))
+        if not verdicts:
+            MICROBATCH_FALLBACKS.inc(len(ai_requests))
+            logger.warning("analyze_website - Batched AI reply did not have exactly one verdict for each of %d URLs; asking for them one by one. Reply: %s",
+                           len(ai_requests), text)
+            return [None] * len(ai_requests)
+        return [BatchReply(f"{verdicts[n][0]}: {verdicts[n][1]}") for n in range(1, len(ai_requests) + 1)]
+
+    def _analyze_single_with_ai(self, ai_request: dict) -> dict:
+        """One model call for one URL."""
+        url = ai_request['url']
+        try:
+            with span('prompt'):
+                analysis_prompt = self._build_analysis_prompt(ai_request)
+
+            response = self._generate_content(analysis_prompt, 'analysis')
+
+            with span('parse'):
+                return self._parse_analysis_response(ai_request, response)
+
+        except Exception as e:
+            return self._analysis_error_result(url, e)
+
+    def _build_analysis_prompt(self, ai_request: dict) -> str:
+        """Build the AI analysis prompt for a URL handed over by _analyze_before_ai."""
+        analysis_prompt = self.prompts.analysis_prompt(ai_request)
+        logger.debug("analyze_website - AI Analysis Prompt:\n%s", analysis_prompt)
+        return analysis_prompt
+
+    def _parse_analysis_response(self, ai_request: dict, response) -> dict:
+        """Turn the model's 'ALLOW|BLOCK: reason' reply into an analysis result."""
+        url = ai_request['url']
+        domain = ai_request['domain']
+
+        if not hasattr(response, 'text'):
+            logger.error("analyze_website - AI response object does not have 'text' attribute. Response: %s", response)
+            raise ValueError("Invalid response format from AI.")
+
+        decision = response.text.strip()
+        logger.info("analyze_website - AI Analysis Result for %s: %s", url, decision)
+
+        # Parse AI decision
+        if ':' in decision:
+            verdict, explanation = decision.split(':', 1)
+            verdict = verdict.strip().upper()
+            explanation = explanation.strip()
+
+            if verdict == 'ALLOW':
+                logger.info("analyze_website - AI Verdict: ALLOW. Reason: %s", explanation)
+                # Log additional details for successful analysis that might be useful for debugging direct visits
+                logger.info("analyze_website - AI ALLOWED: URL=%s, DOMAIN=%s, EXPLANATION=%s", url, domain, explanation)
+                return self._remember_verdict(ai_request, {'isProductive': True, 'explanation': explanation}, SOURCE_AI)
+            elif verdict == 'BLOCK':
+                logger.info("analyze_website - AI Verdict: BLOCK. Reason: %s", explanation)
+                # Log additional details for unsuccessful analysis
+                logger.info("analyze_website - AI BLOCKED: URL=%s, DOMAIN=%s, EXPLANATION=%s", url, domain, explanation)
+                return self._remember_verdict(ai_request, {'isProductive': False, 'explanation': explanation}, SOURCE_AI)
+            else:
+                explanation = f"AI returned unexpected verdict '{verdict}'."
+                logger.warning("analyze_website - %s Defaulting to BLOCK.", explanation)
+                return self._remember_verdict(ai_request, {'isProductive': False, 'explanation': explanation}, SOURCE_AI_FALLBACK)
+        else:
+            explanation = f"AI response format incorrect ('ALLOW:' or 'BLOCK:' expected). Response: '{decision}'."
+            logger.warning("analyze_website - %s Defaulting to BLOCK.", explanation)
+            return self._remember_verdict(ai_request, {'isProductive': False, 'explanation': explanation}, SOURCE_AI_FALLBACK)
+
+    def _remember_verdict(self, ai_request: dict, result: dict, source: str) -> dict:
+        """Persist an AI verdict so restarts and other workers can reuse it, and count it for its URL template."""
+        decided_by('model' if source == SOURCE_AI else 'model_fallback')
+        if self.verdict_store is not None:
+            self.verdict_store.put(ai_request['verdict_key'], result, source)
+        if source == SOURCE_AI and ai_request['template_key'] is not None:
+            self.template_verdicts.record(ai_request['template_key'], result)
+        return result
+
+    def _analysis_error_result(self, url: str, error: Exception) -> dict:
+        explanation = f"AI analysis failed: {error}"
+        logger.error("analyze_website - Error during AI analysis for %s: %s", url, error, exc_info=True)
+        logger.info("analyze_website - Defaulting to BLOCKED due to AI analysis error.")
+        decided_by('model_error')
         return {'isProductive': False, 'explanation': explanation} # Return dict
 
+    def analyze_batch(self, urls: List[str], domain: str, context: Optional[AnalysisContext] = None) -> List[dict]:
+        """Analyze many URLs that share one domain and context.
+
+        Runs the rule and context stages for every distinct URL, sends only the
+        undecided ones to the AI stage concurrently, and returns one result per
+        input URL in the original order (duplicate URLs share a result).
+        """
+        return self._run_batch(urls, domain, context)
+
+    def analyze_batch_with_signals(self, urls: List[str], domain: str,
+                                   context: Optional[AnalysisContext] = None) -> List[Tuple[dict, dict, dict]]:
+        """analyze_batch plus each URL's url_signals and context relevance, for API responses.
+
+        Signals and relevance computed during the analysis are reused; they
+        are only computed here for URLs the rules settled (or that skipped
+        the context check).
+        """
+        context = self._resolve_context(context)
+        signals: Dict[str, Tuple[dict, Optional[dict]]] = {}
+        results = self._run_batch(urls, domain, context, signals)
+        # URLs the analysis never scored are scored together; duplicate URLs share their entry
+        unscored = [url for url in dict.fromkeys(urls) if signals.get(url, (None, None))[1] is None]
+        unscored_signals = [signals[url][0] if url in signals else self._analyze_url_components(url) for url in unscored]
+        relevances = self._check_context_relevance_many(unscored, unscored_signals, context)
+        for url, url_signals, context_relevance in zip(unscored, unscored_signals, relevances):
+            signals[url] = (url_signals, context_relevance)
+        return [(result, *signals[url]) for url, result in zip(urls, results)]
+
+    def _run_batch(self, urls: List[str], domain: str, context: Optional[AnalysisContext],
+                   signals: Optional[Dict[str, Tuple[dict, Optional[dict]]]] = None) -> List[dict]:
+        logger.debug("analyze_batch - START - %s URLs, Domain: %s", len(urls), domain)
+        results, ai_requests = self._prepare_batch(urls, domain, context, signals)
+
+        if ai_requests:
+            with ThreadPoolExecutor(max_workers=min(BATCH_AI_CONCURRENCY, len(ai_requests))) as pool:
+                # Each call runs in a copy of this context so its spans reach the request's trace
+                futures = [pool.submit(contextvars.copy_context().run, self._analyze_with_ai, r) for r in ai_requests]
+                for ai_request, future in zip(ai_requests, futures):
+                    results[ai_request['url']] = future.result()
+
+        logger.debug("analyze_batch - END")
+        return [results[url] for url in urls]
+
+    def _prepare_batch(self, urls: List[str], domain: str, context: Optional[AnalysisContext] = None,
+                       signals: Optional[Dict[str, Tuple[dict, Optional[dict]]]] = None) -> Tuple[Dict[str, dict], List[dict]]:
+        """Decide what the rules can for a batch; returns (results so far, AI requests still pending).
+
+        When signals is given, it receives (url_signals, context_relevance or
+        None) for every URL that got past the rules.
+        """
+        domain = InputValidator.sanitize_string(domain, 100)
+        if not InputValidator.validate_domain(domain):
+            logger.warning("Invalid domain provided for batch analysis: %s", domain)
+            return {url: {'isProductive': False, 'explanation': 'Invalid domain format.'} for url in urls}, []
+
+        context = self._resolve_context(context)
+        results: Dict[str, dict] = {}
+        pending_urls: List[dict] = []
+        for url in dict.fromkeys(urls): # Deduplicate, keeping first-seen order
+            if not InputValidator.validate_url(url):
+                logger.warning("Invalid URL provided for batch analysis: %s", url)
+                decided_by('validation')
+                results[url] = {'isProductive': False, 'explanation': 'Invalid URL format.'}
+                continue
+            result, pending = self._apply_rules(url, domain, context)
+            if result is not None:
+                results[url] = result
+            else:
+                pending_urls.append(pending)
+
+        # Every URL that needs the context check is scored against the context in one pass
+        checked = [pending for pending in pending_urls if pending['run_context_check']]
+        relevances: Dict[str, dict] = {}
+        if checked:
+            with span('context'):
+                scored = self._check_context_relevance_many([pending['url'] for pending in checked],
+                                                            [pending['url_signals'] for pending in checked], context)
+            relevances = {pending['url']: relevance for pending, relevance in zip(checked, scored)}
+
+        ai_requests: List[dict] = []
+        for pending in pending_urls:
+            context_relevance = relevances.get(pending['url'])
+            if signals is not None:
+                signals[pending['url']] = (pending['url_signals'], context_relevance)
+            result, ai_request = self._analyze_after_rules(pending, context_relevance)
+            if result is not None:
+                results[pending['url']] = result
+            else:
+                ai_requests.append(ai_request)
+
+        # Only URLs that reach the model count against the analysis rate limit
+        granted = self._reserve_analysis_slots(len(ai_requests))
+        for ai_request in ai_requests[granted:]:
+            logger.warning("Rate limit exceeded for analyze_batch: %s", ai_request['url'])
+            decided_by('rate_limit')
+            results[ai_request['url']] = {'isProductive': False, 'explanation': 'Rate limit exceeded. Please try again later.'}
+        if granted:
+            logger.debug("analyze_batch - Sending %s of %s distinct URLs to AI analysis", granted, len(results) + granted)
+        return results, ai_requests[:granted]
+
+    # --- Async API ---
+    # The coroutines below mirror the synchronous methods but await the model,
+    # so one event loop can keep many analyses waiting on Gemini at once. The
+    # number of model calls in flight per event loop is capped by MAX_MODEL_CALLS.
+
+    def _model_call_slots(self) -> asyncio.Semaphore:
+        """Semaphore bounding in-flight model calls on the running event loop."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._model_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._model_semaphores[loop] = asyncio.Semaphore(MAX_MODEL_CALLS)
+        return semaphore
+
+    async def _generate_content_async(self, prompt: str, kind: str):
+        """Generate with the async Gemini API, or offload the sync call to a thread."""
+        PROMPT_TOKENS.observe(estimate_tokens(prompt), kind=kind)
+        async with self._model_call_slots():
+            with IN_FLIGHT.track_inprogress(what='model_calls'), span('model', metric=False):
+                start = time.perf_counter()
+                try:
+                    generate_async = getattr(self.model, 'generate_content_async', None)
+                    if generate_async is not None:
+                        response = await generate_async(contents=prompt)
+                    else:
+                        response = await asyncio.to_thread(self.model.generate_content, contents=prompt)
+                except Exception:
+                    MODEL_CALLS.inc(kind=kind, outcome='error')
+                    raise
+                finally:
+                    MODEL_CALL_SECONDS.observe(time.perf_counter() - start, kind=kind)
+        MODEL_CALLS.inc(kind=kind, outcome='ok')
+        _record_token_usage(response, kind)
+        return response
+
+    async def _analyze_with_ai_async(self, ai_request: dict) -> dict:
+        try:
+            with span('prompt'):
+                analysis_prompt = self._build_analysis_prompt(ai_request)
+            response = await self._generate_content_async(analysis_prompt, 'analysis')
+            with span('parse'):
+                return self._parse_analysis_response(ai_request, response)
+        except Exception as e:
+            return self._analysis_error_result(ai_request['url'], e)
+
+    async def analyze_website_async(self, url: str, domain: str, context: Optional[AnalysisContext] = None) -> dict:
+        """Async variant of analyze_website.
+
+        The rule, cache and heuristic checks (with their verdict store reads) run in a
+        worker thread so they do not stall the event loop; the model call is awaited.
+        """
+        logger.debug("analyze_website_async - START - URL: %s, Domain: %s", url, domain)
+        result, ai_request = await asyncio.to_thread(self._prepare_analysis, url, domain, context)
+        if result is not None:
+            return result
+        return await self._analyze_with_ai_async(ai_request)
+
+    async def analyze_batch_async(self, urls: List[str], domain: str,
+                                  context: Optional[AnalysisContext] = None) -> List[dict]:
+        """Async variant of analyze_batch; undecided URLs are analyzed concurrently.
+
+        Preparation runs in a worker thread, as in analyze_website_async.
+        """
+        logger.debug("analyze_batch_async - START - %s URLs, Domain: %s", len(urls), domain)
+        results, ai_requests = await asyncio.to_thread(self._prepare_batch, urls, domain, context)
+        ai_results = await asyncio.gather(*(self._analyze_with_ai_async(r) for r in ai_requests))
+        for ai_request, result in zip(ai_requests, ai_results):
+            results[ai_request['url']] = result
+        return [results[url] for url in urls]
+
+    async def get_next_question_async(self, domain: str, context: List[Dict]) -> Dict:
+        """Async variant of get_next_question."""
+        logger.debug("ProductivityAnalyzer.get_next_question_async - START - Domain: %s", domain)
+        prompt = self._build_question_prompt(domain, context)
+        if prompt is None:
+            return {"question": "What are you trying to accomplish?"}
+        try:
+            response = await self._generate_content_async(prompt, 'question')
+            return self._parse_question_response(response)
+        except Exception as e:
+            return self._question_error_result(e)
+
 
 # --- Main Execution Logic ---
 def main():
+    logging.basicConfig(level=ANALYZER_LOG_LEVEL, format=LOG_FORMAT)
     logger.info("main - START - Script execution started.")
     try:
         analyzer = ProductivityAnalyzer()
@@ -823,7 +1182,7 @@ def main():
                 break
             if domain_input in analyzer.settings.get("domains", {}):
                 domain = domain_input
-                logger.debug(f"main - User selected valid domain: {domain}")
+                logger.debug("main - User selected valid domain: %s", domain)
 
                 # Check if contextualization is needed for this domain
                 settings = analyzer.settings["domains"][domain]
@@ -832,11 +1191,11 @@ def main():
                 if contextualization_required:
                      print(f"\nContextualization needed for '{domain}' domain.")
                      analyzer.contextualize(domain) # Run context gathering
-                     logger.info("main - Contextualization completed for domain: {domain}")
+                     logger.info("main - Contextualization completed for domain: %s", domain)
                 else:
                      analyzer.context_data = {} # Ensure context is clear if not required
                      print(f"\nContextualization not required for '{domain}' domain based on settings.")
-                     logger.info(f"main - Contextualization skipped for domain: {domain}")
+                     logger.info("main - Contextualization skipped for domain: %s", domain)
 
                 # Loop for URL analysis within the selected domain
                 while True:
@@ -855,22 +1214,22 @@ def main():
                         continue
 
 
-                    logger.info(f"main - Analyzing URL: {url} in domain: {domain}")
+                    logger.info("main - Analyzing URL: %s in domain: %s", url, domain)
                     analysis_result = analyzer.analyze_website(url, domain)
                     result_text = 'PRODUCTIVE' if analysis_result['isProductive'] else 'NOT PRODUCTIVE'
                     print(f"\n>>> Analysis Result for '{url}': {result_text} for your current context/domain.")
                     print(f"Explanation: {analysis_result['explanation']}")
-                    logger.info(f"main - Analysis for URL: {url} - Result: {result_text}, Explanation: {analysis_result['explanation']}")
+                    logger.info("main - Analysis for URL: %s - Result: %s, Explanation: %s", url, result_text, analysis_result['explanation'])
 
             else:
                 print("Invalid domain. Please choose from work, school, or personal (or 'quit').")
-                logger.warning(f"main - User entered invalid domain: {domain_input}")
+                logger.warning("main - User entered invalid domain: %s", domain_input)
 
     except FileNotFoundError as e:
-         logger.critical(f"main - CRITICAL ERROR: Required file not found: {e}. Exiting.")
+         logger.critical("main - CRITICAL ERROR: Required file not found: %s. Exiting.", e)
          print(f"\nERROR: Could not find required file: {e}")
     except Exception as e:
-        logger.critical(f"main - An unexpected error occurred: {e}", exc_info=True)
+        logger.critical("main - An unexpected error occurred: %s", e, exc_info=True)
         print(f"\nAn unexpected error occurred: {e}")
 
     logger.info("main - END - Script execution finished.")
@@ -20,6 +20,17 @@ import threading
 import json
 
 from script import ProductivityAnalyzer
+from coalesce import SingleFlight, coalesce_key
+from verdict_cache import create_verdict_cache, shared_verdict_key
+from ttl_cache import TTLCache
+from canonical import canonical_url
+from analysis_context import AnalysisContext
+from log_config import LOG_LEVEL
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, CACHE_LOOKUPS, RATE_LIMITED,
+    render_metrics, timed_endpoint
+)
+from tracing import DEBUG_TRACE, SERVER_TIMING, add_server_timing_headers, current_trace, decided_by, end_trace, span, start_trace
 from security import (
     SecurityConfig, InputValidator, SecurityMiddleware,
     generate_csrf_token, validate_csrf_token, require_api_key,
@@ -28,7 +39,7 @@ from security import (
 
 # Configure logging
 logging.basicConfig(
-    level=logging.INFO,
+    level=LOG_LEVEL,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
@@ -80,6 +91,17 @@ def create_app(config_name='production'):
         }
     })
     
+    # Registered before handle_cors so it runs after it (Flask runs after_request hooks in reverse)
+    # and merges Server-Timing into the expose list handle_cors sets
+    @app.after_request
+    def add_server_timing(response):
+        """Report the request's stage timings and deciding stage in a Server-Timing header."""
+        trace = g.get('trace')
+        if trace is not None and SERVER_TIMING:
+            add_server_timing_headers(response.headers, trace, request.headers.get('Origin'),
+                                      SecurityConfig.CORS_ORIGINS)
+        return response
+    
     # Additional CORS handling for Chrome extensions
     @app.after_request
     def handle_cors(response):
@@ -150,33 +172,46 @@ def create_app(config_name='production'):
     
     # Initialize analyzer
     analyzer = ProductivityAnalyzer()
+    # Collapses identical concurrent analyses (same URL, domain and context) into one model call
+    analysis_flight = SingleFlight()
+    # Cache shared by all workers (Redis via REDIS_URL); None keeps caching per worker
+    shared_cache = create_verdict_cache()
     
-    # Cache structure with thread safety
-    cache_lock = threading.Lock()
-    url_cache = {
-        'data': {},
-        'timestamps': {},
-        'session_ids': {}
-    }
+    # Per-worker verdict cache keyed by (canonical URL, domain); entries are tagged with the session ID.
+    # It is striped internally, so request threads do not contend on a single lock.
     CACHE_DURATION = 300  # 5 minutes for security
+    url_cache = TTLCache(
+        CACHE_DURATION,
+        max_entries=SecurityConfig.CACHE_MAX_ENTRIES,
+        max_bytes=SecurityConfig.CACHE_MAX_BYTES
+    )
     
     def clear_expired_cache():
-        """Clear expired cache entries with thread safety."""
-        current_time = time.time()
-        expired = []
-        
-        with cache_lock:
-            for url in list(url_cache['timestamps']):
-                if current_time - url_cache['timestamps'][url] > CACHE_DURATION:
-                    expired.append(url)
-            
-            for url in expired:
-                url_cache['data'].pop(url, None)
-                url_cache['timestamps'].pop(url, None)
-                url_cache['session_ids'].pop(url, None)
-            
-            if expired:
-                logger.debug(f"Cleared {len(expired)} expired cache entries")
+        """Drop expired cache entries."""
+        expired = url_cache.expire()
+        if expired:
+            logger.debug("clear_expired_cache - Cleared %s expired cache entries", expired)
+    
+    def invalidate_policy_verdicts(old_policy, new_policy, change):
+        """Drop cached verdicts that the reloaded settings.json may have changed."""
+        stale = url_cache.delete_where(lambda key: change.affects(*key))
+        logger.info("invalidate_policy_verdicts - Policy reloaded (%s -> %s); invalidated %s cached verdicts", old_policy.version, new_policy.version, stale)
+    
+    analyzer.policy_watcher.add_listener(invalidate_policy_verdicts)
+    
+    TRACED_ENDPOINTS = {'analyze', 'analyze_batch', 'get_question'}
+    
+    @app.before_request
+    def start_request_trace():
+        """Trace the analysis endpoints; spans from the analyzer land in this trace."""
+        if request.endpoint in TRACED_ENDPOINTS:
+            g.trace, g.trace_token = start_trace(request.endpoint)
+    
+    @app.teardown_request
+    def end_request_trace(error=None):
+        token = g.pop('trace_token', None)
+        if token is not None:
+            end_trace(token)
     
     @app.before_request
     def security_checks():
@@ -185,7 +220,8 @@ def create_app(config_name='production'):
         
         # Rate limiting check
         if security_middleware.is_rate_limited(client_ip):
-            logger.warning(f"Rate limit exceeded for IP: {client_ip}")
+            logger.warning("security_checks - Rate limit exceeded for IP: %s", client_ip)
+            RATE_LIMITED.inc(limiter='ip')
             return jsonify({'error': 'Rate limit exceeded'}), 429
         
         # Content length check
@@ -252,18 +288,19 @@ def create_app(config_name='production'):
     @app.errorhandler(413)
     def request_too_large(error):
         """Handle request entity too large errors."""
-        logger.warning(f"Request too large from {get_remote_address()}")
+        logger.warning("request_too_large - Request too large from %s", get_remote_address())
         return jsonify({'error': 'Request too large'}), 413
     
     @app.errorhandler(400)
     def bad_request(error):
         """Handle bad request errors."""
-        logger.warning(f"Bad request from {get_remote_address()}: {error}")
+        logger.warning("bad_request - Bad request from %s: %s", get_remote_address(), error)
         return jsonify({'error': 'Bad request'}), 400
     
     @app.errorhandler(429)
     def rate_limit_exceeded(error):
         """Handle rate limit exceeded errors."""
+        RATE_LIMITED.inc(limiter='endpoint')
         return jsonify({'error': 'Rate limit exceeded. Please try again later.'}), 429
     
     def validate_request_data(required_fields=None):
@@ -285,6 +322,26 @@ def create_app(config_name='production'):
             return decorated_function
         return decorator
     
+    def sanitize_context(context):
+        """Convert the [{question, answer}, ...] context array to a size-limited, sanitized dictionary."""
+        context_dict = {}
+        if isinstance(context, list):
+            for qa in context[:10]:  # Limit context size
+                if isinstance(qa, dict):
+                    question = InputValidator.sanitize_string(qa.get('question', ''), 500)
+                    answer = InputValidator.sanitize_string(qa.get('answer', ''), 1000)
+                    if question and answer:
+                        context_dict[question] = answer
+        return context_dict
+    
+    def timed_jsonify(payload):
+        """jsonify under the 'serialize' stage, adding the trace when the client asked for it."""
+        trace = current_trace()
+        if DEBUG_TRACE and trace is not None and (request.get_json(silent=True) or {}).get('debug_trace') is True:
+            payload = dict(payload, trace=trace.to_dict())
+        with span('serialize'):
+            return jsonify(payload)
+    
     # Routes with security
     @app.route('/')
     def root():
@@ -304,6 +361,15 @@ def create_app(config_name='production'):
             'version': '2.0.0'
         })
     
+    @app.route('/metrics')
+    @limiter.limit("60/minute")
+    @require_api_key
+    def metrics():
+        """Prometheus metrics summed over all workers."""
+        response = make_response(render_metrics())
+        response.headers['Content-Type'] = METRICS_CONTENT_TYPE
+        return response
+    
     @app.route('/test-simple')
     def test_simple():
         """Simple test route."""
@@ -389,6 +455,7 @@ def create_app(config_name='production'):
     @app.route('/analyze', methods=['POST'])
     @limiter.limit(SecurityConfig.RATE_LIMIT_STRICT)
     @validate_request_data(['url', 'domain'])
+    @timed_endpoint('analyze')
     def analyze(data):
         """Analyze URL with comprehensive security validation."""
         try:
@@ -398,47 +465,55 @@ def create_app(config_name='production'):
             session_id = data.get('session_id', '')
             
             # Validate inputs
-            if not InputValidator.validate_url(url):
+            with span('validation'):
+                url_valid = InputValidator.validate_url(url)
+                domain_valid = url_valid and InputValidator.validate_domain(domain)
+            if not url_valid:
                 security_middleware.record_failed_attempt(get_remote_address())
                 return jsonify({'error': 'Invalid URL format'}), 400
             
-            if not InputValidator.validate_domain(domain):
+            if not domain_valid:
                 security_middleware.record_failed_attempt(get_remote_address())
                 return jsonify({'error': 'Invalid domain format'}), 400
             
             # Sanitize session ID
             session_id = InputValidator.sanitize_string(session_id, 64)
             
-            # Clear expired cache
-            clear_expired_cache()
-            
             # Check cache
-            cache_key = f"{url}-{domain}"
+            with span('canonicalize'):
+                cache_key = (canonical_url(url), domain)
             current_time = time.time()
             
-            with cache_lock:
-                if (cache_key in url_cache['data'] and
-                    url_cache['session_ids'].get(cache_key) == session_id and
-                    current_time - url_cache['timestamps'].get(cache_key, 0) <= CACHE_DURATION):
-                    logger.debug(f"Cache hit for {url}")
-                    return jsonify(url_cache['data'][cache_key])
-            
-            # Process context safely
-            context_dict = {}
-            if isinstance(context, list):
-                for qa in context[:10]:  # Limit context size
-                    if isinstance(qa, dict):
-                        question = InputValidator.sanitize_string(qa.get('question', ''), 500)
-                        answer = InputValidator.sanitize_string(qa.get('answer', ''), 1000)
-                        if question and answer:
-                            context_dict[question] = answer
-            
-            # Set analyzer context
-            analyzer.context_data = context_dict
+            with span('cache'):
+                cached = url_cache.get(cache_key, session_id)
+            CACHE_LOOKUPS.inc(layer='url_cache', result='miss' if cached is None else 'hit')
+            if cached is not None:
+                logger.debug("analyze - Cache hit for %s", url)
+                decided_by('cache')
+                return timed_jsonify(cached)
+            
+            # Per-request context; the shared analyzer is never mutated
+            context_dict = sanitize_context(context)
+            analysis_context = AnalysisContext(context_dict)
+            
+            # Shared entries are keyed by context rather than session, like the verdict store
+            shared_key = shared_verdict_key(analyzer.policy.version, domain, context_dict, url)
+            if shared_cache is not None:
+                with span('cache'):
+                    shared = shared_cache.get(shared_key)
+                CACHE_LOOKUPS.inc(layer='shared', result='miss' if shared is None else 'hit')
+                if shared is not None:
+                    logger.debug("analyze - Shared cache hit for %s", url)
+                    decided_by('shared_cache')
+                    url_cache.set(cache_key, shared, session_id)
+                    return timed_jsonify(shared)
             
             # Perform analysis
             try:
-                analysis_result = analyzer.analyze_website(url, domain)
+                analysis_result = analysis_flight.do(
+                    coalesce_key(url, domain, context_dict),
+                    lambda: analyzer.analyze_website(url, domain, analysis_context)
+                )
                 
                 result = {
                     'isProductive': bool(analysis_result.get('isProductive', False)),
@@ -450,15 +525,14 @@ def create_app(config_name='production'):
                 }
                 
                 # Cache result
-                with cache_lock:
-                    url_cache['data'][cache_key] = result
-                    url_cache['timestamps'][cache_key] = current_time
-                    url_cache['session_ids'][cache_key] = session_id
+                url_cache.set(cache_key, result, session_id)
+                if shared_cache is not None:
+                    shared_cache.set(shared_key, result, CACHE_DURATION)
                 
-                return jsonify(result)
+                return timed_jsonify(result)
                 
             except Exception as e:
-                logger.error(f"Analysis error for {url}: {e}")
+                logger.error("analyze - Analysis error for %s: %s", url, e)
                 return jsonify({
                     'error': 'Analysis failed',
                     'isProductive': False,
@@ -466,12 +540,114 @@ def create_app(config_name='production'):
                 }), 500
                 
         except Exception as e:
-            logger.error(f"Request processing error: {e}")
+            logger.error("analyze - Request processing error: %s", e)
+            return jsonify({'error': 'Request processing failed'}), 500
+    
+    @app.route('/analyze/batch', methods=['POST'])
+    @limiter.limit(SecurityConfig.RATE_LIMIT_STRICT)
+    @validate_request_data(['urls', 'domain'])
+    @timed_endpoint('analyze_batch')
+    def analyze_batch(data):
+        """Analyze a list of URLs sharing one domain and context with per-URL validation."""
+        try:
+            urls = data.get('urls')
+            domain = data.get('domain', '').strip()
+            context = data.get('context', [])
+            session_id = InputValidator.sanitize_string(data.get('session_id', ''), 64)
+            
+            if not isinstance(urls, list) or not urls:
+                return jsonify({'error': 'urls must be a non-empty list'}), 400
+            
+            if len(urls) > SecurityConfig.MAX_BATCH_URLS:
+                return jsonify({'error': f'Too many URLs (maximum {SecurityConfig.MAX_BATCH_URLS})'}), 400
+            
+            if not InputValidator.validate_domain(domain):
+                security_middleware.record_failed_attempt(get_remote_address())
+                return jsonify({'error': 'Invalid domain format'}), 400
+            
+            current_time = time.time()
+            
+            # Invalid entries are reported in place rather than failing the whole batch
+            entries = [url.strip() if isinstance(url, str) else '' for url in urls]
+            with span('validation'):
+                valid = [url for url in entries if InputValidator.validate_url(url)]
+            # Valid URLs that canonicalize alike are looked up and analyzed once
+            with span('canonicalize'):
+                keys = {url: canonical_url(url) for url in valid}
+            results = {}
+            distinct = dict.fromkeys(keys.values())
+            with span('cache'):
+                for key in distinct:
+                    cached = url_cache.get((key, domain), session_id)
+                    if cached is not None:
+                        results[key] = cached
+            CACHE_LOOKUPS.inc(len(results), layer='url_cache', result='hit')
+            CACHE_LOOKUPS.inc(len(distinct) - len(results), layer='url_cache', result='miss')
+            decided_by('cache', len(results))
+            pending = {}
+            for url, key in keys.items():
+                if key not in results and key not in pending:
+                    pending[key] = url
+            policy_version = analyzer.policy.version
+            context_dict = sanitize_context(context)
+            if pending and shared_cache is not None:
+                shared_keys = {shared_verdict_key(policy_version, domain, context_dict, key): key for key in pending}
+                with span('cache'):
+                    shared_hits = shared_cache.get_many(shared_keys)
+                CACHE_LOOKUPS.inc(len(shared_hits), layer='shared', result='hit')
+                CACHE_LOOKUPS.inc(len(shared_keys) - len(shared_hits), layer='shared', result='miss')
+                decided_by('shared_cache', len(shared_hits))
+                for shared_key, shared in shared_hits.items():
+                    key = shared_keys[shared_key]
+                    url_cache.set((key, domain), shared, session_id)
+                    results[key] = shared
+                    del pending[key]
+            
+            if pending:
+                analysis_context = AnalysisContext(context_dict)
+                pending_urls = list(pending.values())
+                try:
+                    analysis_results = analyzer.analyze_batch(pending_urls, domain, analysis_context)
+                except Exception as e:
+                    logger.error("analyze_batch - Batch analysis error for %s URLs: %s", len(pending_urls), e)
+                    return jsonify({
+                        'error': 'Analysis failed',
+                        'explanation': 'Unable to analyze URLs due to technical error'
+                    }), 500
+                
+                fresh = {}
+                for url, analysis_result in zip(pending_urls, analysis_results):
+                    result = {
+                        'isProductive': bool(analysis_result.get('isProductive', False)),
+                        'explanation': InputValidator.sanitize_string(
+                            analysis_result.get('explanation', ''), 500
+                        ),
+                        'confidence': max(0.0, min(1.0, float(analysis_result.get('confidence', 0.5)))),
+                        'timestamp': current_time
+                    }
+                    key = keys[url]
+                    url_cache.set((key, domain), result, session_id)
+                    results[key] = result
+                    fresh[shared_verdict_key(policy_version, domain, context_dict, key)] = result
+                if shared_cache is not None:
+                    shared_cache.set_many(fresh, CACHE_DURATION)
+            
+            response = []
+            for url in entries:
+                if url in keys:
+                    response.append(dict(results[keys[url]], url=url))
+                else:
+                    response.append({'url': url, 'error': 'Invalid URL format'})
+            return timed_jsonify({'results': response})
+            
+        except Exception as e:
+            logger.error("analyze_batch - Batch request processing error: %s", e)
             return jsonify({'error': 'Request processing failed'}), 500
     
     @app.route('/get_question', methods=['POST'])
     @limiter.limit(SecurityConfig.RATE_LIMIT_STRICT)
     @validate_request_data(['domain'])
+    @timed_endpoint('get_question')
     def get_question(data):
         """Get contextual question with validation."""
         try:
@@ -504,7 +680,7 @@ def create_app(config_name='production'):
             return jsonify(response)
             
         except Exception as e:
-            logger.error(f"Question generation error: {e}")
+            logger.error("get_question - Question generation error: %s", e)
             return jsonify({'error': 'Question generation failed'}), 500
     
     @app.route('/block.html')
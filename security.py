@@ -72,6 +72,13 @@ class SecurityConfig:
     # Allowed file extensions for uploads
     ALLOWED_EXTENSIONS = {'txt', 'json'}
     MAX_CONTENT_LENGTH = 1024 * 1024  # 1MB
+    
+    # Maximum URLs accepted by /analyze/batch in one request
+    MAX_BATCH_URLS = 100
+    
+    # Per-worker verdict cache budget
+    CACHE_MAX_ENTRIES = int(os.environ.get('ECLIPSE_SHIELD_CACHE_MAX_ENTRIES', '10000'))
+    CACHE_MAX_BYTES = int(os.environ.get('ECLIPSE_SHIELD_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
 
 class InputValidator:
     """Input validation utilities."""
@@ -0,0 +1,130 @@
+"""
+Local model stand-in server for Eclipse Shield.
+Serves the rule-based stub model over HTTP for load tests against a real
+gunicorn deployment (ECLIPSE_SHIELD_MODEL_BACKEND=http):
+
+    python stub_model_server.py --port 8765 --profile realistic,rate_limit=0.05
+
+POST /v1/generate {"contents": "...", "stream": false} answers
+{"text": "ALLOW: ..."}; with "stream": true the reply is newline-delimited
+JSON chunks. Per the profile, calls are delayed, answered with 429 or 500,
+or held for timeout_after seconds and answered with 504.
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from model_backends import StubModel, _chunks, parse_profile, rule_reply
+
+logger = logging.getLogger(__name__)
+
+
+class StubModelHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # Headers and body are written separately
+    server_version = 'EclipseShieldStubModel/1.0'
+
+    @property
+    def model(self) -> StubModel:
+        return self.server.model
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionError:
+            pass  # The client timed out and hung up before the reply
+
+    def log_message(self, format, *args):
+        logger.debug("StubModelHandler - %s " + format, self.address_string(), *args)
+
+    def _send_json(self, status: int, payload: dict, headers=None) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        if self.path != '/v1/generate':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            contents = request['contents']
+        except (ValueError, KeyError, TypeError):
+            self._send_json(400, {'error': 'Expected JSON body with "contents"'})
+            return
+
+        delay, error = self.model.draw()
+        if delay:
+            time.sleep(delay)
+        if error is not None:
+            headers = {'Retry-After': '1'} if error.status == 429 else None
+            self._send_json(error.status, {'error': str(error)}, headers)
+            return
+
+        text = rule_reply(contents)
+        if not request.get('stream'):
+            self._send_json(200, {'text': text})
+            return
+
+        profile = self.model.profile
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for chunk in _chunks(text, profile.chunk_chars):
+            if profile.chunk_delay:
+                time.sleep(profile.chunk_delay)
+            line = json.dumps({'text': chunk}).encode('utf-8') + b'\n'
+            self.wfile.write(f"{len(line):x}\r\n".encode('ascii') + line + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class StubModelServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # The default backlog of 5 drops connections under load tests
+
+    def __init__(self, address, model: StubModel):
+        self.model = model
+        super().__init__(address, StubModelHandler)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the rule-based stub model over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--profile', default='fast',
+                        help="Preset (fast, realistic, degraded) and/or field=value overrides, comma-separated")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    profile = parse_profile(args.profile)
+    server = StubModelServer((args.host, args.port), StubModel(profile))
+    logger.info("main - stub model listening on http://%s:%s with %s", args.host, server.server_port, profile)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,10 @@
+"""
+Pytest configuration for Eclipse Shield.
+The application modules live at the repository root; make them importable
+when pytest is run from anywhere.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
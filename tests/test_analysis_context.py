@@ -0,0 +1,56 @@
+"""
+Tests for the per-request AnalysisContext (analysis_context.py).
+"""
+
+import dataclasses
+
+import pytest
+
+from analysis_context import EMPTY_CONTEXT, AnalysisContext
+from coalesce import context_fingerprint
+
+
+def test_from_request_accepts_question_answer_list():
+    context = AnalysisContext.from_request([
+        {"question": "What are you working on?", "answer": "Taxes"},
+        {"question": "Why?", "answer": ""},
+        {"answer": "no question"},
+        "not a dict",
+    ])
+    assert dict(context.answers) == {"What are you working on?": "Taxes"}
+
+
+def test_from_request_accepts_dict_and_ignores_other_types():
+    assert dict(AnalysisContext.from_request({"q": "a"}).answers) == {"q": "a"}
+    assert AnalysisContext.from_request(None) == EMPTY_CONTEXT
+    assert AnalysisContext.from_request("q=a") == EMPTY_CONTEXT
+
+
+def test_answers_are_copied_and_read_only():
+    answers = {"q": "a"}
+    context = AnalysisContext(answers)
+    answers["q"] = "changed"
+    assert context.answers["q"] == "a"
+    with pytest.raises(TypeError):
+        context.answers["q"] = "changed"
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        context.answers = {}
+
+
+def test_truthiness_follows_answers():
+    assert not EMPTY_CONTEXT
+    assert AnalysisContext({"q": "a"})
+
+
+def test_equal_contexts_hash_alike():
+    first = AnalysisContext({"q1": "a", "q2": "b"})
+    second = AnalysisContext({"q2": "b", "q1": "a"})
+    assert first == second
+    assert hash(first) == hash(second)
+    assert len({first, second}) == 1
+    assert first != AnalysisContext({"q1": "a"})
+
+
+def test_fingerprint_matches_coalesce_fingerprint():
+    answers = {"q": "a"}
+    assert AnalysisContext(answers).fingerprint == context_fingerprint(answers)
@@ -0,0 +1,108 @@
+"""
+Tests for the /analyze/batch endpoint in app.py.
+The analyzer answers from the benchmark fake model; the persistent verdict
+store and the fast path are switched off so every URL reaches the model path.
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_cors")
+pytest.importorskip("google.generativeai")
+
+os.environ.setdefault("ECLIPSE_SHIELD_MODEL_BACKEND", "stub")
+os.environ["ECLIPSE_SHIELD_VERDICT_DB"] = ""
+os.environ["ECLIPSE_SHIELD_FASTPATH_MODEL"] = ""
+
+import app as app_module  # noqa: E402
+from benchmarks.fake_model import FakeGenerativeModel  # noqa: E402
+
+CONTEXT = [{"question": "What are you working on?", "answer": "Studying python programming"}]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    analyzer = app_module.analyzer
+    model = FakeGenerativeModel()
+    monkeypatch.setattr(analyzer, "model", model)
+    monkeypatch.setattr(analyzer, "verdict_store", None)
+    monkeypatch.setattr(analyzer, "template_verdicts", None)
+    monkeypatch.setattr(analyzer, "fastpath", None)
+    monkeypatch.setattr(app_module, "shared_cache", None)
+    app_module.url_cache.clear()
+    client = app_module.app.test_client()
+    client.model = model
+    yield client
+    app_module.url_cache.clear()
+
+
+def post_batch(client, **payload):
+    payload.setdefault("domain", "work")
+    payload.setdefault("context", CONTEXT)
+    payload.setdefault("session_id", "test-session")
+    return client.post("/analyze/batch", json=payload)
+
+
+def test_missing_urls_is_rejected(client):
+    response = client.post("/analyze/batch", json={"domain": "work"})
+    assert response.status_code == 400
+
+
+def test_missing_domain_is_rejected(client):
+    response = client.post("/analyze/batch", json={"urls": ["https://example.com/a"]})
+    assert response.status_code == 400
+
+
+def test_urls_must_be_a_list(client):
+    assert post_batch(client, urls="https://example.com/a").status_code == 400
+
+
+def test_non_string_urls_are_rejected(client):
+    assert post_batch(client, urls=["https://example.com/a", 42]).status_code == 400
+    assert post_batch(client, urls=["https://example.com/a", ""]).status_code == 400
+
+
+def test_too_many_urls_are_rejected(client):
+    urls = [f"https://example.com/page/{i}" for i in range(app_module.BATCH_MAX_URLS + 1)]
+    response = post_batch(client, urls=urls)
+    assert response.status_code == 400
+    assert str(app_module.BATCH_MAX_URLS) in response.get_json()["error"]
+
+
+def test_results_follow_input_order(client):
+    urls = [f"https://docs.example.com/guide/{i}" for i in range(5)]
+    response = post_batch(client, urls=urls)
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [result["url"] for result in results] == urls
+    for result in results:
+        assert isinstance(result["isProductive"], bool)
+        assert result["explanation"]
+        assert "signals" in result
+        assert "score" in result["context_relevance"]
+        assert 0.0 <= result["confidence"] <= 1.0
+        assert result["direct_visit"] is False
+
+
+def test_canonical_spellings_share_one_analysis(client):
+    urls = [
+        "https://docs.example.com/guide/intro",
+        "https://docs.example.com/guide/intro?utm_source=newsletter",
+        "https://docs.example.com/guide/intro#setup",
+    ]
+    results = post_batch(client, urls=urls).get_json()["results"]
+    assert [result["url"] for result in results] == urls
+    verdicts = {(result["isProductive"], result["explanation"]) for result in results}
+    assert len(verdicts) == 1
+    assert client.model.calls == 1
+
+
+def test_repeated_batch_is_served_from_cache(client):
+    urls = ["https://docs.example.com/guide/a", "https://docs.example.com/guide/b"]
+    first = post_batch(client, urls=urls).get_json()["results"]
+    calls = client.model.calls
+    second = post_batch(client, urls=urls).get_json()["results"]
+    assert second == first
+    assert client.model.calls == calls
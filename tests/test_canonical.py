@@ -0,0 +1,59 @@
+"""
+Tests for URL canonicalization (canonical.py).
+"""
+
+import pytest
+
+from canonical import UrlCanonicalizer, canonical_url
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('HTTPS://Example.COM', 'https://example.com/'),
+    ('https://example.com:443/a', 'https://example.com/a'),
+    ('http://example.com:80/a', 'http://example.com/a'),
+    ('https://example.com:8443/a', 'https://example.com:8443/a'),
+    ('https://example.com./a/', 'https://example.com/a'),
+    ('https://example.com/a#section', 'https://example.com/a'),
+    ('https://example.com/a?b=2&a=1', 'https://example.com/a?a=1&b=2'),
+    ('https://example.com/a?utm_source=x&id=7&fbclid=y', 'https://example.com/a?id=7'),
+    ('https://example.com/a?utm_source=x', 'https://example.com/a'),
+    ('  https://example.com/a  ', 'https://example.com/a'),
+])
+def test_canonical_url(url, expected):
+    assert canonical_url(url) == expected
+
+
+def test_spellings_of_one_page_share_a_key():
+    spellings = [
+        'https://www.example.com/watch?v=1',
+        'HTTPS://WWW.EXAMPLE.COM:443/watch/?v=1#t=30',
+        'https://www.example.com/watch?utm_medium=email&v=1',
+    ]
+    assert len({canonical_url(url) for url in spellings}) == 1
+
+
+def test_path_case_and_blank_values_are_kept():
+    assert canonical_url('https://example.com/Docs?q=') == 'https://example.com/Docs?q='
+
+
+def test_idna_host():
+    assert canonical_url('https://bücher.example/') == 'https://xn--bcher-kva.example/'
+
+
+def test_ipv6_host_and_userinfo():
+    assert canonical_url('http://[::1]:8080/a') == 'http://[::1]:8080/a'
+    assert canonical_url('https://user@example.com/a') == 'https://user@example.com/a'
+
+
+@pytest.mark.parametrize('url', ['not a url', '/relative/path', 'https://example.com:99999/'])
+def test_unparsable_urls_are_returned_stripped(url):
+    assert canonical_url(f" {url} ") == url
+
+
+def test_custom_tracking_params():
+    canonicalizer = UrlCanonicalizer(['ref', 'src_*'])
+    assert canonicalizer.is_tracking_param('REF')
+    assert canonicalizer.is_tracking_param('src_campaign')
+    assert not canonicalizer.is_tracking_param('utm_source')
+    assert canonicalizer.canonicalize('https://example.com/?ref=a&src_x=b&utm_source=c') == \
+        'https://example.com/?utm_source=c'
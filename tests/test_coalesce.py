@@ -0,0 +1,114 @@
+"""
+Tests for request coalescing (coalesce.py).
+"""
+
+import threading
+import time
+
+import pytest
+
+from coalesce import SingleFlight, coalesce_key
+
+
+def start_call(flight: SingleFlight, key: str, fn):
+    """flight.do(key, fn) on a thread; returns (thread, outcome dict)."""
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = flight.do(key, fn)
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+def wait_for_leader(flight: SingleFlight, key: str):
+    while key not in flight._calls:
+        time.sleep(0.001)
+
+
+def test_waiters_share_the_leader_result():
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {'isProductive': True}
+
+    flight = SingleFlight(lock_dir=None)
+    leader, outcome = start_call(flight, 'k', compute)
+    wait_for_leader(flight, 'k')
+    waiter, waited = start_call(flight, 'k', compute)
+    time.sleep(0.05)  # Let the waiter block on the leader's call
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+    assert outcome['result'] == waited['result'] == {'isProductive': True}
+    assert len(calls) == 1
+    assert flight.coalesced == 1
+
+
+def test_leader_error_reaches_waiters():
+    release = threading.Event()
+
+    def compute():
+        release.wait(5)
+        raise ValueError("model down")
+
+    flight = SingleFlight(lock_dir=None)
+    leader, outcome = start_call(flight, 'k', compute)
+    wait_for_leader(flight, 'k')
+    waiter, waited = start_call(flight, 'k', compute)
+    time.sleep(0.05)  # Let the waiter block on the leader's call
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+    assert isinstance(outcome['error'], ValueError)
+    assert waited['error'] is outcome['error']
+
+
+def test_key_is_free_again_after_a_call():
+    flight = SingleFlight(lock_dir=None)
+    with pytest.raises(ValueError):
+        flight.do('k', lambda: (_ for _ in ()).throw(ValueError("boom")))
+    assert flight.do('k', lambda: 2) == 2
+
+
+def test_worker_waiting_on_the_lock_reuses_the_published_result(tmp_path):
+    release = threading.Event()
+
+    def compute():
+        release.wait(5)
+        return {'isProductive': False}
+
+    first = SingleFlight(lock_dir=str(tmp_path))
+    second = SingleFlight(lock_dir=str(tmp_path))  # Stands in for another worker process
+    leader, outcome = start_call(first, 'k', compute)
+    wait_for_leader(first, 'k')
+    time.sleep(0.05)  # Let the leader take the file lock
+    waiter, waited = start_call(second, 'k', lambda: {'isProductive': True})
+    time.sleep(0.05)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+    assert outcome['result'] == waited['result'] == {'isProductive': False}
+    assert second.coalesced == 1
+
+
+def test_results_from_earlier_calls_are_not_reused(tmp_path):
+    first = SingleFlight(lock_dir=str(tmp_path))
+    second = SingleFlight(lock_dir=str(tmp_path))
+    assert first.do('k', lambda: {'isProductive': False}) == {'isProductive': False}
+    assert second.do('k', lambda: {'isProductive': True}) == {'isProductive': True}
+
+
+def test_coalesce_key_uses_canonical_url_and_context():
+    context = {'What are you working on?': 'thesis'}
+    assert coalesce_key('https://Example.com/a?utm_source=x', 'work', context) == \
+        coalesce_key('https://example.com/a', 'work', context)
+    assert coalesce_key('https://example.com/a', 'work', context) != \
+        coalesce_key('https://example.com/a', 'work', {})
@@ -0,0 +1,81 @@
+"""
+Tests for context term extraction and matching (context_index.py).
+"""
+
+from context_index import ContextIndex, ContextIndexCache, extract_terms
+
+
+def test_extract_terms_builds_unigrams_and_phrases():
+    terms = extract_terms("Learning Python, async IO!")
+    assert terms == ["learning", "python", "async", "learning python", "python async", "learning python async"]
+
+
+def test_extract_terms_drops_short_words():
+    assert extract_terms("an ox is on it") == []
+
+
+def test_only_answers_contribute_terms():
+    index = ContextIndex({"What is your python task?": "Writing taxes"})
+    assert "python" not in index.terms
+    assert index.terms == ["writing", "taxes", "writing taxes"]
+
+
+def test_blank_answers_are_ignored():
+    index = ContextIndex({"q1": "   ", "q2": None})
+    assert len(index) == 0
+    assert index.match("https://python.org") == ([], [])
+
+
+def test_match_separates_url_and_query_terms():
+    index = ContextIndex({"q": "python tutorial"})
+    in_url, in_query = index.match("https://python.org/docs", "best tutorial")
+    assert in_url == ["python"]
+    assert in_query == ["tutorial"]
+
+
+def test_match_returns_terms_in_term_order():
+    index = ContextIndex({"q": "django python"})
+    in_url, _ = index.match("https://python.org/django python")
+    assert in_url == ["django", "python", "django python"]
+
+
+def test_add_answer_extends_matching():
+    index = ContextIndex({"q1": "python"})
+    assert index.match("https://numpy.org") == ([], [])
+    index.add_answer("q2", "numpy arrays")
+    assert index.match("https://numpy.org")[0] == ["numpy"]
+
+
+def test_extended_index_matches_fresh_index():
+    base = {"q1": "python programming"}
+    full = dict(base, q2="numpy arrays tutorial")
+    index = ContextIndex(base)
+    assert index.extends(full)
+    assert not index.extends(base)
+    assert not index.extends({"q1": "other answer", "q2": "x"})
+    extended = index.extended(full)
+    assert extended.terms == ContextIndex(full).terms
+    assert index.terms == ContextIndex(base).terms  # The original is left unchanged
+
+
+def test_cache_reuses_index_per_context():
+    cache = ContextIndexCache(maxsize=4)
+    context = {"q": "python"}
+    assert cache.get(context) is cache.get(dict(context))
+
+
+def test_cache_extends_last_index():
+    cache = ContextIndexCache(maxsize=4)
+    cache.get({"q1": "python"})
+    index = cache.get({"q1": "python", "q2": "numpy"})
+    assert index.terms == ["python", "numpy"]
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ContextIndexCache(maxsize=2)
+    first = cache.get({"q": "alpha"})
+    cache.get({"q": "beta"})
+    cache.get({"q": "alpha"})
+    cache.get({"q": "gamma"})
+    assert cache.get({"q": "alpha"}) is first
+    assert len(cache._indexes) == 2
@@ -0,0 +1,108 @@
+"""
+Tests for the fast path classifier (fastpath.py).
+"""
+
+import pytest
+
+from fastpath import (FastPathClassifier, build_examples, evaluate, feature_names, hash_features,
+                      load_fastpath, read_logged_verdicts, train)
+
+DOCS = {'domain_type': 'documentation', 'is_reference': True}
+
+
+def test_feature_names_cover_host_path_params_and_flags():
+    names = feature_names("https://www.docs.python.org/3/library/asyncio-task.html?highlight=gather",
+                          'work', DOCS)
+    base = names[:len(names) // 2]
+    assert base[:3] == ['bias', 'host=docs.python.org', 'type=documentation']
+    assert 'site=python.org' in base
+    assert {'path=library', 'path=asyncio', 'path=task', 'path=html'} <= set(base)
+    assert 'param=highlight' in base
+    assert 'is_reference' in base
+    assert 'is_educational' not in base
+    assert names[len(names) // 2:] == [f"work:{name}" for name in base]
+
+
+def test_feature_names_limit_path_words():
+    path = '/'.join(f"word{letter}" for letter in 'abcdefghijklmnopqrst')
+    names = feature_names(f"https://example.com/{path}", 'work', {})
+    assert sum(name.startswith('path=') for name in names) == 12
+
+
+def test_feature_names_of_unparsable_url():
+    assert feature_names("http://[::1", 'work', {}) == []
+
+
+def test_hash_features_are_stable_and_bounded():
+    indexes = hash_features(['bias', 'host=example.com'], bits=8)
+    assert indexes == hash_features(['bias', 'host=example.com'], bits=8)
+    assert all(0 <= index < 256 for index in indexes)
+
+
+def examples(count=40):
+    allowed = [(hash_features(feature_names(f"https://docs.python.org/3/page{i}", 'work', DOCS)), True)
+               for i in range(count)]
+    blocked = [(hash_features(feature_names(f"https://games.example.com/play{i}", 'work', {'domain_type': 'gaming'})), False)
+               for i in range(count)]
+    return allowed + blocked
+
+
+def test_train_separates_allowed_and_blocked_sites():
+    classifier = train(examples(), epochs=20, learning_rate=0.5)
+    classifier.confidence = 0.9
+    assert classifier.samples == 80
+    assert classifier.probability("https://docs.python.org/3/new", 'work', DOCS) > 0.9
+    assert classifier.probability("https://games.example.com/new", 'work', {'domain_type': 'gaming'}) < 0.1
+    report = evaluate(classifier, examples())
+    assert report['coverage'] == 1.0
+    assert report['accuracy'] == 1.0
+
+
+def test_predict_answers_only_when_confident():
+    classifier = train(examples(), epochs=20, learning_rate=0.5)
+    classifier.confidence = 0.9
+    allowed = classifier.predict("https://docs.python.org/3/new", 'work', DOCS)
+    assert allowed['isProductive'] is True
+    blocked = classifier.predict("https://games.example.com/new", 'work', {'domain_type': 'gaming'})
+    assert blocked['isProductive'] is False
+    assert classifier.predict("https://unseen.example.org/", 'school', {}) is None
+
+
+def test_save_and_load_round_trip(tmp_path):
+    classifier = train(examples(), epochs=5)
+    path = str(tmp_path / 'model.json')
+    classifier.save(path)
+    loaded = FastPathClassifier.load(path, confidence=0.8)
+    assert loaded.samples == classifier.samples
+    assert loaded.confidence == 0.8
+    url = "https://docs.python.org/3/new"
+    assert loaded.probability(url, 'work', DOCS) == pytest.approx(classifier.probability(url, 'work', DOCS), abs=1e-3)
+
+
+def test_load_fastpath_without_a_model(tmp_path):
+    assert load_fastpath('') is None
+    assert load_fastpath(str(tmp_path / 'missing.json')) is None
+    broken = tmp_path / 'broken.json'
+    broken.write_text('{"format": 99}')
+    assert load_fastpath(str(broken)) is None
+
+
+def test_logged_verdicts_become_examples(tmp_path):
+    log = tmp_path / 'eclipse_shield.log'
+    log.write_text(
+        "2026-01-01 script INFO script.py:921 analyze_website - AI ALLOWED: URL=https://docs.python.org/3/, "
+        "DOMAIN=work, EXPLANATION=Docs\n"
+        "2026-01-01 script INFO script.py:926 analyze_website - AI BLOCKED: URL=https://games.example.com/a, "
+        "DOMAIN=work, EXPLANATION=Games\n"
+        "2026-01-01 script INFO script.py:921 analyze_website - AI ALLOWED: URL=https://games.example.com/a, "
+        "DOMAIN=work, EXPLANATION=Changed\n"
+        "2026-01-01 script INFO script.py:921 analyze_website - AI ALLOWED: URL=https://www.google.com/search?q=x, "
+        "DOMAIN=work, EXPLANATION=Search\n"
+        "unrelated line\n"
+    )
+    verdicts = list(read_logged_verdicts([str(log)]))
+    assert verdicts[:2] == [("https://docs.python.org/3/", 'work', True),
+                            ("https://games.example.com/a", 'work', False)]
+    assert len(verdicts) == 4
+    built = build_examples(verdicts)
+    assert [allowed for _, allowed in built] == [True, True]  # Latest verdict wins; searches are skipped
@@ -0,0 +1,90 @@
+"""
+Tests for the URL heuristics classifier (heuristics.py).
+"""
+
+from urllib.parse import urlparse
+
+import pytest
+
+from heuristics import GENERIC_BLOCKED, UrlHeuristics
+
+TABLES = {
+    'default_category': 'general',
+    'generic_blocked_keywords': ['game', 'casino'],
+    'categories': [
+        {'name': 'documentation', 'hostname': ['docs.', 'wiki']},
+        {
+            'name': 'search engine',
+            'hostname': ['google.com', 'bing.com'],
+            'overrides': [
+                {'category': 'productivity', 'requires_hostname': 'google.com', 'hostname': ['docs.', 'drive.']},
+            ],
+        },
+        {'name': 'productivity', 'hostname': ['drive.', 'notion.']},
+    ],
+    'signals': {
+        'is_search': {'hostname': ['google.com', 'bing.com'], 'path': ['/search']},
+        'is_educational': {'hostname': ['.edu'], 'path': ['course']},
+    },
+}
+
+
+@pytest.fixture(scope='module')
+def heuristics():
+    return UrlHeuristics(TABLES)
+
+
+def categorize(heuristics, url):
+    return heuristics.categorize(heuristics.scan(url))
+
+
+@pytest.mark.parametrize('url, category', [
+    ('https://docs.python.org/3/', 'documentation'),
+    ('https://en.wikipedia.org/wiki/Python', 'documentation'),
+    ('https://www.google.com/search?q=x', 'search engine'),
+    ('https://docs.google.com/document/d/1', 'documentation'),  # Earlier category wins
+    ('https://drive.google.com/file/1', 'productivity'),       # Override of 'search engine'
+    ('https://www.notion.so/page', 'productivity'),
+    ('https://example.com/', 'general'),
+])
+def test_categories_in_file_order_with_overrides(heuristics, url, category):
+    assert categorize(heuristics, url) == category
+
+
+def test_hostname_terms_only_match_the_hostname(heuristics):
+    # 'docs.' in the path must not make the URL documentation
+    assert categorize(heuristics, 'https://example.com/docs.html') == 'general'
+
+
+def test_path_terms_only_match_the_path(heuristics):
+    assert 'is_educational' in heuristics.scan('https://example.com/course/101')
+    assert 'is_educational' not in heuristics.scan('https://course.example.com/')
+    assert 'is_educational' in heuristics.scan('https://cs.mit.edu/')
+
+
+def test_generic_blocked_keywords_match_anywhere(heuristics):
+    assert GENERIC_BLOCKED in heuristics.scan('https://example.com/free-games')
+    assert GENERIC_BLOCKED in heuristics.scan('https://casino.example.com/')
+    assert GENERIC_BLOCKED not in heuristics.scan('https://example.com/docs')
+
+
+def test_scan_accepts_a_parsed_url_and_ignores_case(heuristics):
+    url = 'HTTPS://WWW.BING.COM/Search?q=x'
+    assert heuristics.scan(url, urlparse(url)) == heuristics.scan(url.lower())
+    assert 'is_search' in heuristics.scan(url)
+
+
+def test_scan_hostname(heuristics):
+    assert heuristics.categorize(heuristics.scan_hostname('Docs.Example.com')) == 'documentation'
+    assert heuristics.scan_hostname('example.com') == frozenset()
+
+
+def test_suspicious_path_needs_a_whole_segment(heuristics):
+    assert heuristics.has_suspicious_path(['play', 'game'])
+    assert not heuristics.has_suspicious_path(['games'])
+
+
+def test_shipped_tables_load():
+    heuristics = UrlHeuristics.load()
+    assert categorize(heuristics, 'https://stackoverflow.com/questions/1') == 'documentation/reference'
+    assert 'is_search' in heuristics.scan('https://www.google.com/search?q=python')
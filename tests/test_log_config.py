@@ -0,0 +1,84 @@
+"""
+Tests for level parsing, stage sampling and deferred queue formatting (log_config.py).
+"""
+
+import logging
+import queue
+import sys
+
+from log_config import DeferredQueueHandler, StageSampler, level_from_name, parse_sample_rates
+
+
+def make_record(msg, *args, level=logging.DEBUG, exc_info=None):
+    return logging.LogRecord("test", level, __file__, 1, msg, args, exc_info)
+
+
+def test_level_from_name():
+    assert level_from_name("debug") == logging.DEBUG
+    assert level_from_name(" Warning ") == logging.WARNING
+    assert level_from_name("verbose", logging.ERROR) == logging.ERROR
+    assert level_from_name(None) == logging.INFO
+
+
+def test_parse_sample_rates_clamps_and_skips_malformed_entries():
+    rates = parse_sample_rates("analyze=0.25, analyze_batch=2,bad,=0.5,stage=x,quiet=-1")
+    assert rates == {"analyze": 0.25, "analyze_batch": 1.0, "quiet": 0.0}
+
+
+def test_sampler_uses_the_stage_prefix():
+    sampler = StageSampler({"analyze": 0.0})
+    assert not sampler.filter(make_record("analyze - Analyzing with context: %s", {"q": "a"}))
+    assert sampler.filter(make_record("analyze_batch - Cache hits: %s, pending: %s", 1, 2))
+    assert sampler.filter(make_record("no stage prefix here"))
+
+
+def test_sampler_keeps_the_configured_fraction():
+    draws = iter([0.05, 0.5, 0.09, 0.95])
+    sampler = StageSampler({"analyze": 0.1}, rng=lambda: next(draws))
+    kept = [sampler.filter(make_record("analyze - result %s", i)) for i in range(4)]
+    assert kept == [True, False, True, False]
+
+
+def test_sampler_never_drops_warnings():
+    sampler = StageSampler({"analyze": 0.0})
+    assert sampler.filter(make_record("analyze - failed", level=logging.WARNING))
+    assert sampler.filter(make_record("analyze - failed", level=logging.ERROR))
+
+
+def test_sampler_default_rate_applies_to_unlisted_stages():
+    sampler = StageSampler({"analyze": 1.0}, default=0.0)
+    assert sampler.filter(make_record("analyze - kept"))
+    assert not sampler.filter(make_record("get_question - dropped"))
+
+
+def test_deferred_handler_enqueues_scalar_records_unformatted():
+    handler = DeferredQueueHandler(queue.SimpleQueue())
+    record = make_record("analyze - Cache hit for %s", "https://example.com")
+    handler.emit(record)
+    queued = handler.queue.get_nowait()
+    assert queued is record
+    assert queued.msg == "analyze - Cache hit for %s"
+    assert queued.getMessage() == "analyze - Cache hit for https://example.com"
+
+
+def test_deferred_handler_formats_mutable_arguments_immediately():
+    handler = DeferredQueueHandler(queue.SimpleQueue())
+    context = {"q": "a"}
+    handler.emit(make_record("analyze - Analyzing with context: %s", context))
+    context["q"] = "changed"
+    queued = handler.queue.get_nowait()
+    assert queued.getMessage() == "analyze - Analyzing with context: {'q': 'a'}"
+    assert queued.args is None
+
+
+def test_deferred_handler_formats_exceptions_immediately():
+    handler = DeferredQueueHandler(queue.SimpleQueue())
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = make_record("analyze - failed", level=logging.ERROR, exc_info=sys.exc_info())
+    handler.emit(record)
+    queued = handler.queue.get_nowait()
+    assert queued is not record
+    assert queued.exc_info is None
+    assert "ValueError: boom" in queued.getMessage()
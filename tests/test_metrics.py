@@ -0,0 +1,135 @@
+"""
+Tests for the multi-process metrics registry (metrics.py).
+Each test points the module at its own metrics directory; other "workers"
+are simulated by writing their value files directly.
+"""
+
+import os
+
+import pytest
+
+import metrics
+from metrics import CACHE_LOOKUPS, Counter, Gauge, Histogram, Registry, mark_process_dead
+
+DEAD_PID = 999999999  # Above any pid_max, so never a running process
+
+
+@pytest.fixture
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(metrics, '_values', None)
+    yield tmp_path
+    if isinstance(metrics._values, metrics._MmapValues):
+        metrics._values.close()
+
+
+@pytest.fixture
+def registry(metrics_dir):
+    return Registry(str(metrics_dir))
+
+
+def worker_file(metrics_dir, pid):
+    return metrics._MmapValues(os.path.join(str(metrics_dir), f"{pid}.db"))
+
+
+def sample_lines(text, name):
+    return [line for line in text.splitlines() if line.startswith(name)]
+
+
+def test_counter_renders_with_labels(registry):
+    requests = Counter('test_requests_total', 'Requests.', ['code'], registry=registry)
+    requests.inc(code='200')
+    requests.inc(2, code='200')
+    requests.inc(code='500')
+    text = registry.render()
+    assert '# TYPE test_requests_total counter' in text
+    assert sample_lines(text, 'test_requests_total{') == [
+        'test_requests_total{code="200"} 3',
+        'test_requests_total{code="500"} 1',
+    ]
+
+
+def test_wrong_labels_are_rejected(registry):
+    requests = Counter('test_labelled_total', 'Requests.', ['code'], registry=registry)
+    with pytest.raises(ValueError):
+        requests.inc(path='/')
+
+
+def test_duplicate_registration_is_rejected(registry):
+    Counter('test_once_total', 'Once.', registry=registry)
+    with pytest.raises(ValueError):
+        Counter('test_once_total', 'Twice.', registry=registry)
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    latency = Histogram('test_latency_seconds', 'Latency.', buckets=(0.1, 0.5), registry=registry)
+    latency.observe(0.05)
+    latency.observe(0.3)
+    latency.observe(2.0)
+    assert sample_lines(registry.render(), 'test_latency_seconds_') == [
+        'test_latency_seconds_bucket{le="0.1"} 1',
+        'test_latency_seconds_bucket{le="0.5"} 2',
+        'test_latency_seconds_bucket{le="+Inf"} 3',
+        'test_latency_seconds_sum 2.35',
+        'test_latency_seconds_count 3',
+    ]
+
+
+def test_values_are_summed_across_worker_files(metrics_dir, registry):
+    requests = Counter('test_shared_total', 'Requests.', registry=registry)
+    requests.inc(2)
+    other = worker_file(metrics_dir, DEAD_PID)
+    other.add(metrics._sample_key('test_shared_total', '', ()), 5)
+    other.close()
+    assert sample_lines(registry.render(), 'test_shared_total ') == ['test_shared_total 7']
+
+
+def test_gauges_of_exited_workers_are_ignored(metrics_dir, registry):
+    in_flight = Gauge('test_in_flight', 'In flight.', registry=registry)
+    in_flight.set(1)
+    other = worker_file(metrics_dir, DEAD_PID)
+    other.set(metrics._sample_key('test_in_flight', '', ()), 4)
+    other.close()
+    assert sample_lines(registry.render(), 'test_in_flight ') == ['test_in_flight 1']
+
+
+def test_track_inprogress_restores_gauge(registry):
+    in_flight = Gauge('test_tracked', 'In flight.', registry=registry)
+    with in_flight.track_inprogress():
+        assert sample_lines(registry.render(), 'test_tracked ') == ['test_tracked 1']
+    assert sample_lines(registry.render(), 'test_tracked ') == ['test_tracked 0']
+
+
+def test_mark_process_dead_archives_counters_and_drops_gauges(metrics_dir):
+    counter_key = CACHE_LOOKUPS._key('', {'layer': 'url_cache', 'result': 'hit'})
+    gauge_key = metrics.IN_FLIGHT._key('', {'what': 'requests'})
+    other = worker_file(metrics_dir, DEAD_PID)
+    other.add(counter_key, 3)
+    other.set(gauge_key, 2)
+    other.close()
+
+    mark_process_dead(DEAD_PID, str(metrics_dir))
+    mark_process_dead(DEAD_PID, str(metrics_dir))  # A second call finds no file and changes nothing
+
+    assert not os.path.exists(os.path.join(str(metrics_dir), f"{DEAD_PID}.db"))
+    archived = dict(metrics._read_file(os.path.join(str(metrics_dir), metrics.ARCHIVE_FILE)))
+    assert archived == {counter_key: 3}
+
+
+def test_archived_counters_keep_counting(metrics_dir):
+    counter_key = CACHE_LOOKUPS._key('', {'layer': 'url_cache', 'result': 'hit'})
+    for pid in (DEAD_PID, DEAD_PID - 1):
+        other = worker_file(metrics_dir, pid)
+        other.add(counter_key, 2)
+        other.close()
+        mark_process_dead(pid, str(metrics_dir))
+    totals = Registry(str(metrics_dir))
+    totals.register(CACHE_LOOKUPS)
+    assert totals.collect()[counter_key] == 4
+
+
+def test_reset_metrics_dir_keeps_own_file(metrics_dir):
+    worker_file(metrics_dir, DEAD_PID).close()
+    worker_file(metrics_dir, os.getpid()).close()
+    metrics.reset_metrics_dir(str(metrics_dir))
+    assert sorted(os.listdir(str(metrics_dir))) == [f"{os.getpid()}.db"]
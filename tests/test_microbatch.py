@@ -0,0 +1,92 @@
+"""
+Tests for micro-batching of model calls (microbatch.py).
+"""
+
+import threading
+import time
+
+import pytest
+
+from microbatch import MicroBatcher, parse_numbered_verdicts
+
+
+class TestParseNumberedVerdicts:
+    def test_one_verdict_per_url(self):
+        reply = "1. ALLOW: documentation\n2. BLOCK: social media"
+        assert parse_numbered_verdicts(reply, 2) == {1: ('ALLOW', 'documentation'), 2: ('BLOCK', 'social media')}
+
+    @pytest.mark.parametrize('line', [
+        '1. ALLOW: reason',
+        '1) allow - reason',
+        'URL 1: ALLOW reason',
+        '**1.** Allow: reason',
+        '- 1. ALLOW: reason',
+    ])
+    def test_line_formats(self, line):
+        assert parse_numbered_verdicts(line, 1) == {1: ('ALLOW', 'reason')}
+
+    def test_order_and_surrounding_text(self):
+        reply = "Here are the verdicts:\n\n2. BLOCK: game\n1. ALLOW: docs\nHope this helps."
+        assert parse_numbered_verdicts(reply, 2) == {1: ('ALLOW', 'docs'), 2: ('BLOCK', 'game')}
+
+    @pytest.mark.parametrize('reply', [
+        "1. ALLOW: docs",                               # missing verdict
+        "1. ALLOW: docs\n2. BLOCK: game\n3. BLOCK: x",  # out of range
+        "1. ALLOW: docs\n2. BLOCK: game\n2. ALLOW: x",  # repeated number
+        "I cannot help with that.",
+        "",
+    ])
+    def test_reply_without_exactly_one_verdict_per_url_is_rejected(self, reply):
+        assert parse_numbered_verdicts(reply, 2) == {}
+
+
+class TestMicroBatcher:
+    def test_idle_submission_runs_alone(self):
+        batches = []
+
+        def run_batch(items):
+            batches.append(list(items))
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher(run_batch, max_items=8, max_wait=1.0)
+        assert batcher.submit('key', 21) == 42
+        assert batches == [[21]]
+
+    def test_concurrent_submissions_share_a_batch(self):
+        release = threading.Event()
+        batches = []
+
+        def run_batch(items):
+            batches.append(list(items))
+            release.wait(5)
+            return [f"result {item}" for item in items]
+
+        batcher = MicroBatcher(run_batch, max_items=3, max_wait=5.0)
+        results = {}
+        # The first submission runs alone and keeps a batch active, so the
+        # next three gather into one batch that is full at max_items.
+        first = threading.Thread(target=lambda: results.setdefault(0, batcher.submit('key', 0)))
+        first.start()
+        while not batches:
+            time.sleep(0.001)
+        others = [threading.Thread(target=lambda i=i: results.setdefault(i, batcher.submit('key', i))) for i in (1, 2, 3)]
+        for thread in others:
+            thread.start()
+        while len(batches) < 2:
+            time.sleep(0.001)
+        release.set()
+        for thread in [first] + others:
+            thread.join(5)
+        assert batches[0] == [0]
+        assert sorted(batches[1]) == [1, 2, 3]
+        assert results == {i: f"result {i}" for i in range(4)}
+
+    def test_errors_reach_every_submitter(self):
+        def run_batch(items):
+            raise RuntimeError("model down")
+
+        batcher = MicroBatcher(run_batch, max_items=4, max_wait=0.01)
+        with pytest.raises(RuntimeError, match="model down"):
+            batcher.submit('key', 1)
+        # The failed batch no longer counts as active
+        assert batcher._active == 0
@@ -0,0 +1,82 @@
+"""
+Tests for the compiled settings.json policy (policy.py).
+"""
+
+from policy import ALLOW, BLOCK, CompiledPolicy, DomainPolicy
+
+
+def make_policy(**settings) -> DomainPolicy:
+    return DomainPolicy('work', settings, memo_size=16)
+
+
+def decision(policy: DomainPolicy, url: str):
+    result = policy.evaluate(url)
+    return None if result is None else (result.verdict, result.rule_type, result.rule)
+
+
+class TestBlockedSpecific:
+    def test_host_blocks_host_and_subdomains(self):
+        policy = make_policy(blocked_specific=['youtube.com'])
+        assert decision(policy, 'https://youtube.com/watch?v=1') == (BLOCK, 'blocked_specific', 'youtube.com')
+        assert decision(policy, 'https://m.youtube.com/') == (BLOCK, 'blocked_specific', 'youtube.com')
+
+    def test_host_does_not_block_look_alikes(self):
+        policy = make_policy(blocked_specific=['youtube.com'])
+        assert decision(policy, 'https://notyoutube.com/') is None
+
+    def test_host_blocks_any_port(self):
+        policy = make_policy(blocked_specific=['youtube.com'])
+        assert decision(policy, 'https://youtube.com:8443/') == (BLOCK, 'blocked_specific', 'youtube.com')
+
+    def test_host_port_entry_blocks_that_port(self):
+        policy = make_policy(blocked_specific=['example.com:8080'])
+        assert decision(policy, 'http://example.com:8080/dashboard') == (BLOCK, 'blocked_specific', 'example.com:8080')
+        assert decision(policy, 'http://intranet.example.com:8080/') == (BLOCK, 'blocked_specific', 'example.com:8080')
+
+    def test_host_port_entry_ignores_other_ports(self):
+        policy = make_policy(blocked_specific=['example.com:8080'])
+        assert decision(policy, 'http://example.com/') is None
+        assert decision(policy, 'http://example.com:9090/') is None
+
+    def test_path_entry_blocks_exact_url_only(self):
+        policy = make_policy(blocked_specific=['https://example.com/games'])
+        assert decision(policy, 'https://example.com/games') == (BLOCK, 'blocked_specific', 'https://example.com/games')
+        assert decision(policy, 'https://example.com/docs') is None
+
+    def test_first_listed_entry_wins(self):
+        policy = make_policy(blocked_specific=['example.com:8080', 'example.com'])
+        assert decision(policy, 'http://example.com:8080/')[2] == 'example.com:8080'
+
+
+class TestPrecedence:
+    def test_allowed_platform_beats_blocked_specific(self):
+        policy = make_policy(productivity_tools=['docs.google.com'], blocked_specific=['google.com'])
+        assert decision(policy, 'https://docs.google.com/document/d/1') == (ALLOW, 'productivity_tools', 'docs.google.com')
+
+    def test_blocked_specific_beats_blocked_keyword(self):
+        policy = make_policy(blocked_specific=['reddit.com'], blocked_keywords=['game'])
+        assert decision(policy, 'https://reddit.com/r/game')[1] == 'blocked_specific'
+
+    def test_blocked_keyword_matches_in_path(self):
+        policy = make_policy(blocked_keywords=['game'])
+        assert decision(policy, 'https://example.com/free-games') == (BLOCK, 'blocked_keywords', 'game')
+
+    def test_no_rule(self):
+        assert decision(make_policy(blocked_keywords=['game']), 'https://example.com/docs') is None
+
+    def test_memoized_host_still_scans_each_path(self):
+        policy = make_policy(blocked_keywords=['game'])
+        assert decision(policy, 'https://example.com/docs') is None
+        assert decision(policy, 'https://example.com/games') == (BLOCK, 'blocked_keywords', 'game')
+
+
+class TestCompiledPolicy:
+    def test_skips_malformed_domains(self):
+        policy = CompiledPolicy({'domains': {'work': {'blocked_specific': ['x.com']}, 'broken': []}})
+        assert 'work' in policy
+        assert 'broken' not in policy
+
+    def test_version_follows_settings(self):
+        settings = {'domains': {'work': {'blocked_specific': ['x.com']}}}
+        assert CompiledPolicy(settings).version == CompiledPolicy(settings).version
+        assert CompiledPolicy(settings).version != CompiledPolicy({'domains': {}}).version
@@ -0,0 +1,95 @@
+"""
+Tests for batch context relevance scoring (relevance.py).
+"""
+
+import pytest
+
+import relevance
+from context_index import ContextIndex
+from relevance import QUERY_WEIGHT, URL_WEIGHT, context_vector, score_many, score_one
+
+ANSWERS = {
+    "What are you working on?": "Writing a Python asyncio tutorial about event loops",
+    "Which sites?": "docs.python.org, Stack Overflow and the Über café wiki",
+}
+URLS = [
+    "https://docs.python.org/3/library/asyncio-eventloop.html",
+    "https://www.google.com/search?q=python+asyncio+tutorial",
+    "https://stackoverflow.com/questions/tagged/PYTHON-ASYNCIO",
+    "https://de.wikipedia.org/wiki/%C3%BCber",
+    "https://über.example/café",
+    "https://games.example.com/play",
+    "",
+]
+QUERIES = ["", "python asyncio tutorial", None, "event loops in python", "", "stack overflow", "tutorial"]
+
+
+def batch(size=64):
+    """size URLs with their search queries, cycling through URLS and QUERIES."""
+    return ([URLS[i % len(URLS)] + (f"?page={i}" if i % 3 else "") for i in range(size)],
+            [QUERIES[i % len(QUERIES)] for i in range(size)])
+
+
+def test_score_one_weights_url_and_query_terms():
+    index = ContextIndex(ANSWERS)
+    result = score_one(index, "https://docs.python.org/asyncio", "Asyncio tutorial")
+    assert [match['location'] for match in result['matches']] == ['url'] * 3 + ['search_query'] * 3
+    assert result['matched_terms'] == ['asyncio', 'asyncio tutorial', 'docs.python.org', 'python', 'tutorial']
+    assert result['score'] == 1.0
+    assert score_one(index, "https://games.example.com/") == {
+        'score': 0.0, 'matched_terms': [], 'matches': [], 'error': None}
+    assert score_one(index, "https://example.com/python")['score'] == URL_WEIGHT
+    assert score_one(index, "https://example.com/", "python")['score'] == QUERY_WEIGHT
+
+
+def test_batch_matches_scoring_each_url_alone():
+    pytest.importorskip('numpy')
+    index = ContextIndex(ANSWERS)
+    urls, queries = batch()
+    expected = [score_one(index, url, query) for url, query in zip(urls, queries)]
+    assert score_many(index, urls, queries) == expected
+    assert any(result['matches'] for result in expected)
+    assert any(match['term'] == 'über' for result in expected for match in result['matches'])
+    assert any(match['term'] == 'python asyncio tutorial' for result in expected for match in result['matches'])
+
+
+def test_batch_without_search_queries():
+    pytest.importorskip('numpy')
+    index = ContextIndex(ANSWERS)
+    urls, _ = batch()
+    assert score_many(index, urls) == [score_one(index, url) for url in urls]
+
+
+def test_terms_sharing_a_slot_are_all_found(monkeypatch):
+    pytest.importorskip('numpy')
+    monkeypatch.setattr(relevance, 'MAX_SLOT_BITS', 4)  # 16 slots for 30 same-length terms
+    index = ContextIndex({"q": " ".join(f"term{i:02d}" for i in range(30))})
+    urls = [f"https://example.com/term{i:02d}/term{(i * 7) % 30:02d}" for i in range(40)]
+    vector = context_vector(index)
+    assert len(vector.groups[(6, False)][1]) > 1  # Overflow tables in use
+    assert score_many(index, urls) == [score_one(index, url) for url in urls]
+
+
+def test_batch_without_numpy_matches_url_by_url(monkeypatch):
+    monkeypatch.setattr(relevance, 'np', None)
+    index = ContextIndex(ANSWERS)
+    urls, queries = batch()
+    assert score_many(index, urls, queries) == [score_one(index, url, query) for url, query in zip(urls, queries)]
+
+
+def test_vector_is_cached_until_the_context_gains_terms():
+    pytest.importorskip('numpy')
+    index = ContextIndex(ANSWERS)
+    vector = context_vector(index)
+    assert context_vector(index) is vector
+    index.add_answer("Anything else?", "Flask blueprints")
+    assert index.vector is None
+    urls = [f"https://flask.palletsprojects.com/blueprints/{i}" for i in range(20)]
+    results = score_many(index, urls)
+    assert context_vector(index) is not vector
+    assert results[0]['matched_terms'] == ['blueprints', 'flask']
+
+
+def test_empty_context_scores_nothing():
+    urls, queries = batch(20)
+    assert all(result['score'] == 0.0 and not result['matches'] for result in score_many(ContextIndex(), urls, queries))
@@ -0,0 +1,79 @@
+"""
+Tests for request traces and the Server-Timing headers (tracing.py).
+"""
+
+import re
+
+from tracing import Trace, add_server_timing_headers, current_trace, decided_by, end_trace, span, start_trace
+
+ALLOWED = ["http://localhost:5000", "chrome-extension://*"]
+
+
+def finished_trace():
+    trace, token = start_trace('analyze')
+    try:
+        with span('cache', metric=False):
+            pass
+        decided_by('model')
+    finally:
+        end_trace(token)
+    return trace
+
+
+def test_spans_and_decisions_go_to_the_active_trace():
+    assert current_trace() is None
+    trace = finished_trace()
+    assert current_trace() is None
+    assert [stage for stage, _, _ in trace.spans] == ['cache']
+    assert trace.decision == 'model'
+
+
+def test_without_a_trace_spans_and_decisions_are_no_ops():
+    with span('cache', metric=False):
+        pass
+    decided_by('model')
+    assert current_trace() is None
+
+
+def test_batch_decisions_are_counted_per_stage():
+    trace = Trace('analyze_batch')
+    trace.decide('cache', 3)
+    trace.decide('model', 2)
+    trace.decide('fastpath', 0)
+    assert trace.decision == 'cache=3 model=2'
+
+
+def test_server_timing_sums_repeated_stages():
+    trace = Trace()
+    trace.add_span('prompt', trace.started, 0.001)
+    trace.add_span('prompt', trace.started, 0.002)
+    trace.add_span('model', trace.started, 0.010)
+    trace.decide('model')
+    value = trace.finish().server_timing()
+    assert value.startswith('prompt;dur=3.000;desc="x2", model;dur=10.000, total;dur=')
+    assert value.endswith('decision;desc="model"')
+
+
+def test_headers_set_server_timing_and_expose_it():
+    headers = {}
+    add_server_timing_headers(headers, finished_trace(), None, ALLOWED)
+    assert re.match(r'cache;dur=[\d.]+, total;dur=[\d.]+, decision;desc="model"$', headers['Server-Timing'])
+    assert headers['Access-Control-Expose-Headers'] == 'Server-Timing'
+    assert 'Timing-Allow-Origin' not in headers
+
+
+def test_expose_headers_are_merged_case_insensitively():
+    headers = {'Access-Control-Expose-Headers': 'Content-Type, X-CSRFToken,server-timing'}
+    add_server_timing_headers(headers, finished_trace(), None, ALLOWED)
+    assert headers['Access-Control-Expose-Headers'] == 'Content-Type, X-CSRFToken, server-timing'
+
+
+def test_timing_allow_origin_only_for_allowed_origins():
+    headers = {}
+    add_server_timing_headers(headers, finished_trace(), 'chrome-extension://abcdef', ALLOWED)
+    assert headers['Timing-Allow-Origin'] == 'chrome-extension://abcdef'
+
+    for origin in ('https://evil.example', 'null', ''):
+        headers = {}
+        add_server_timing_headers(headers, finished_trace(), origin, ALLOWED)
+        assert 'Timing-Allow-Origin' not in headers
@@ -0,0 +1,84 @@
+"""
+Tests for the striped LRU + TTL verdict cache (ttl_cache.py).
+"""
+
+from ttl_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_cache(**kwargs):
+    clock = FakeClock()
+    return TTLCache(60, stripes=1, sizeof=lambda value: 1, clock=clock, **kwargs), clock
+
+
+def test_get_returns_value_until_ttl():
+    cache, clock = make_cache()
+    cache.set('a', 1)
+    clock.now += 59
+    assert cache.get('a') == 1
+    clock.now += 1
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_per_entry_ttl():
+    cache, clock = make_cache()
+    cache.set('short', 1, ttl=5)
+    cache.set('long', 2)
+    clock.now += 10
+    assert cache.get('short') is None
+    assert cache.get('long') == 2
+
+
+def test_tag_must_match():
+    cache, _ = make_cache()
+    cache.set('a', 1, tag='session-1')
+    assert cache.get('a', 'session-2') is None
+    assert cache.get('a', 'session-1') == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache, _ = make_cache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_byte_budget():
+    cache = TTLCache(60, max_bytes=10, stripes=1, sizeof=len)
+    cache.set('a', 'x' * 6)
+    cache.set('b', 'y' * 6)
+    assert cache.get('a') is None
+    assert cache.get('b') == 'y' * 6
+    assert cache.bytes == 6
+
+
+def test_overwrite_replaces_entry_and_size():
+    cache = TTLCache(60, stripes=1, sizeof=len)
+    cache.set('a', 'x' * 6)
+    cache.set('a', 'x' * 2)
+    assert len(cache) == 1
+    assert cache.bytes == 2
+
+
+def test_expire_and_delete_where():
+    cache, clock = make_cache()
+    cache.set(('u1', 'work'), 1, ttl=5)
+    cache.set(('u2', 'work'), 2)
+    cache.set(('u3', 'school'), 3)
+    clock.now += 10
+    assert cache.expire() == 1
+    assert cache.delete_where(lambda key: key[1] == 'work') == 1
+    assert cache.get(('u3', 'school')) == 3
+    assert len(cache) == 1
@@ -0,0 +1,78 @@
+"""
+Tests for URL template verdicts (url_templates.py).
+"""
+
+import doctest
+
+import pytest
+
+import url_templates
+from url_templates import TemplateVerdicts, template_key, url_template
+
+ALLOW = {'isProductive': True, 'explanation': 'Documentation.'}
+BLOCK = {'isProductive': False, 'explanation': 'Entertainment.'}
+
+
+def test_doctests():
+    assert doctest.testmod(url_templates).failed == 0
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://www.youtube.com/shorts/aB3dE5fG7hI', 'youtube.com/shorts/*'),
+    ('https://github.com/org/repo/issues/12345', 'github.com/org/repo/issues/*'),
+    ('https://example.com/t/how-to-read-a-file', 'example.com/t/*'),
+    ('https://example.com/u/550e8400-e29b-41d4-a716-446655440000', 'example.com/u/*'),
+    ('https://docs.python.org/3.12/library/os.path.html', 'docs.python.org/3.12/library/*.html'),
+    ('https://example.com/search?sort=new&page=2', 'example.com/search?page=*&sort=new'),
+])
+def test_url_template(url, expected):
+    assert url_template(url) == expected
+
+
+@pytest.mark.parametrize('url', ['https://example.com/', 'https://example.com/about/team', 'not a url'])
+def test_nothing_to_generalize(url):
+    assert url_template(url) is None
+
+
+def test_spellings_share_a_template():
+    assert url_template('https://www.youtube.com/watch?v=dQw4w9WgXcQ&utm_source=x') == \
+        url_template('https://youtube.com/watch?v=9bZkp7q19f0')
+
+
+class TestTemplateVerdicts:
+    key = ('work', 'v1', 'ctx', 'youtube.com/watch?v=*')
+
+    def test_needs_min_samples(self):
+        verdicts = TemplateVerdicts(maxsize=10, min_samples=3, verify_every=0)
+        for _ in range(2):
+            verdicts.record(self.key, BLOCK)
+        assert verdicts.lookup(self.key) is None
+        verdicts.record(self.key, BLOCK)
+        result = verdicts.lookup(self.key)
+        assert result['isProductive'] is False
+        assert 'Entertainment.' in result['explanation']
+
+    def test_needs_agreement(self):
+        verdicts = TemplateVerdicts(maxsize=10, min_samples=3, min_agreement=0.9, verify_every=0)
+        for result in (ALLOW, ALLOW, ALLOW, BLOCK):
+            verdicts.record(self.key, result)
+        assert verdicts.lookup(self.key) is None
+
+    def test_every_nth_answer_is_reverified(self):
+        verdicts = TemplateVerdicts(maxsize=10, min_samples=1, verify_every=3)
+        verdicts.record(self.key, ALLOW)
+        answers = [verdicts.lookup(self.key) is not None for _ in range(6)]
+        assert answers == [True, True, False, True, True, False]
+
+    def test_lru_eviction(self):
+        verdicts = TemplateVerdicts(maxsize=2, min_samples=1, verify_every=0)
+        keys = [('work', 'v1', 'ctx', f"example.com/{n}/*") for n in range(3)]
+        for key in keys:
+            verdicts.record(key, ALLOW)
+        assert len(verdicts) == 2
+        assert verdicts.lookup(keys[0]) is None
+
+    def test_template_key(self):
+        assert template_key('https://example.com/', 'work', 'v1', 'ctx') is None
+        assert template_key('https://example.com/p/12345', 'work', 'v1', 'ctx') == \
+            ('work', 'v1', 'ctx', 'example.com/p/*')
@@ -0,0 +1,106 @@
+"""
+Tests for the shared verdict cache (verdict_cache.py).
+"""
+
+import json
+import time
+
+import pytest
+
+from verdict_cache import InMemoryBackend, NearCache, RedisBackend, VerdictCacheBackend, shared_verdict_key
+from verdict_store import verdict_key
+
+CONTEXT = {"What are you working on?": "Studying python"}
+
+
+class RecordingRedis:
+    """Minimal client exposing the calls RedisBackend makes."""
+
+    def __init__(self):
+        self.data = {}
+        self.mget_calls = 0
+
+    def mget(self, keys):
+        self.mget_calls += 1
+        return [self.data.get(key) for key in keys]
+
+    def pipeline(self, transaction=False):
+        return self
+
+    def set(self, key, value, px=None):
+        self.data[key] = value
+
+    def execute(self):
+        pass
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+class FailingBackend(InMemoryBackend):
+    def get_many(self, keys):
+        raise ConnectionError("down")
+
+    def set_many(self, items, ttl):
+        raise ConnectionError("down")
+
+
+def test_shared_key_matches_verdict_store_key():
+    url = "https://docs.python.org/3/?utm_source=x#intro"
+    assert shared_verdict_key("v1", "work", CONTEXT, url) == verdict_key(url, "work", "v1", CONTEXT)
+
+
+def test_shared_key_ignores_tracking_parameters_but_not_context_or_policy():
+    key = shared_verdict_key("v1", "work", CONTEXT, "https://docs.python.org/3/")
+    assert shared_verdict_key("v1", "work", CONTEXT, "https://docs.python.org/3/?utm_source=x") == key
+    assert shared_verdict_key("v2", "work", CONTEXT, "https://docs.python.org/3/") != key
+    assert shared_verdict_key("v1", "school", CONTEXT, "https://docs.python.org/3/") != key
+    assert shared_verdict_key("v1", "work", {"What are you working on?": "Taxes"}, "https://docs.python.org/3/") != key
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        VerdictCacheBackend()
+
+
+def test_in_memory_backend_expires_entries():
+    backend = InMemoryBackend()
+    backend.set("a", {"isProductive": True}, ttl=0.05)
+    assert backend.get("a") == {"isProductive": True}
+    time.sleep(0.1)
+    assert backend.get("a") is None
+    assert len(backend) == 0
+
+
+def test_in_memory_backend_evicts_least_recently_written():
+    backend = InMemoryBackend(max_entries=2)
+    backend.set_many({"a": 1, "b": 2}, ttl=60)
+    backend.set("c", 3, ttl=60)
+    assert backend.get_many(["a", "b", "c"]) == {"b": 2, "c": 3}
+
+
+def test_redis_backend_uses_one_mget_per_batch():
+    client = RecordingRedis()
+    backend = RedisBackend("redis://unused", prefix="p:", client=client)
+    backend.set_many({"a": {"isProductive": True}, "b": {"isProductive": False}}, ttl=60)
+    assert json.loads(client.data["p:a"]) == {"isProductive": True}
+    assert backend.get_many(["a", "b", "missing"]) == {"a": {"isProductive": True}, "b": {"isProductive": False}}
+    assert client.mget_calls == 1
+    backend.delete_many(["a"])
+    assert backend.get("a") is None
+
+
+def test_near_cache_serves_repeat_reads_locally():
+    client = RecordingRedis()
+    cache = NearCache(RedisBackend("redis://unused", client=client), local_ttl=60)
+    client.data["eclipse-shield:verdict:a"] = json.dumps({"isProductive": True})
+    assert cache.get("a") == {"isProductive": True}
+    assert cache.get("a") == {"isProductive": True}
+    assert client.mget_calls == 1
+
+
+def test_near_cache_treats_backend_failures_as_misses():
+    cache = NearCache(FailingBackend(), local_ttl=0)
+    assert cache.get("a") is None
+    cache.set("a", {"isProductive": True}, ttl=60)  # Must not raise
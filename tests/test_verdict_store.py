@@ -0,0 +1,40 @@
+"""
+Tests for the SQLite verdict store (verdict_store.py).
+"""
+
+import time
+
+from verdict_store import SOURCE_AI, SOURCE_AI_FALLBACK, VerdictStore, open_verdict_store, verdict_key
+
+
+def test_put_and_get(tmp_path):
+    store = VerdictStore(str(tmp_path / 'verdicts.sqlite3'))
+    key = verdict_key('https://example.com/a', 'work', 'v1', {})
+    store.put(key, {'isProductive': True, 'explanation': 'Docs.'}, SOURCE_AI)
+    assert store.get(key) == {'isProductive': True, 'explanation': 'Docs.'}
+    assert store.get(verdict_key('https://example.com/b', 'work', 'v1', {})) is None
+
+
+def test_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'verdicts.sqlite3')
+    VerdictStore(path).put('k', {'isProductive': False, 'explanation': 'Game.'}, SOURCE_AI)
+    assert VerdictStore(path).get('k') == {'isProductive': False, 'explanation': 'Game.'}
+
+
+def test_expired_and_disabled_sources(tmp_path):
+    store = VerdictStore(str(tmp_path / 'verdicts.sqlite3'), ttls={SOURCE_AI: 0.05, SOURCE_AI_FALLBACK: 0})
+    store.put('k', {'isProductive': True, 'explanation': ''}, SOURCE_AI)
+    store.put('f', {'isProductive': True, 'explanation': ''}, SOURCE_AI_FALLBACK)
+    assert store.get('f') is None
+    time.sleep(0.1)
+    assert store.get('k') is None
+    assert store.prune() == 1
+
+
+def test_key_covers_policy_version_and_canonical_url():
+    assert verdict_key('https://Example.com/a#x', 'work', 'v1', {}) == verdict_key('https://example.com/a', 'work', 'v1', {})
+    assert verdict_key('https://example.com/a', 'work', 'v1', {}) != verdict_key('https://example.com/a', 'work', 'v2', {})
+
+
+def test_disabled_store():
+    assert open_verdict_store('') is None
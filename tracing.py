@@ -0,0 +1,181 @@
+"""
+Per-request trace spans for Eclipse Shield.
+Analysis code marks its stages with span() and records the stage that
+settled the verdict with decided_by(); both are no-ops for the trace when
+none is active. The web apps start a Trace per analysis request and turn it
+into a Server-Timing header (and, when enabled, a JSON trace in the body).
+Every span is also observed in the eclipse_shield_stage_seconds histogram.
+Nothing here depends on Flask.
+"""
+
+import fnmatch
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, MutableMapping, Optional, Sequence, Tuple
+
+from metrics import STAGE_SECONDS
+
+# Add a Server-Timing header to analysis responses
+SERVER_TIMING = os.getenv("ECLIPSE_SHIELD_SERVER_TIMING", "1") == "1"
+# Allow clients to ask for the full trace in the JSON body ("debug_trace": true)
+DEBUG_TRACE = os.getenv("ECLIPSE_SHIELD_DEBUG_TRACE", "0") == "1"
+
+_current: ContextVar[Optional['Trace']] = ContextVar('eclipse_shield_trace', default=None)
+
+
+class Trace:
+    """Spans and deciding stages of one request.
+
+    A single analysis has one deciding stage; a batch counts how many URLs
+    each stage decided. Spans from a batch may arrive from several threads
+    or tasks, so updates are serialized by a lock.
+    """
+
+    def __init__(self, name: str = 'request'):
+        self.name = name
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.spans: List[Tuple[str, float, float]] = []  # (stage, offset, duration) in seconds
+        self.decisions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, stage: str, start: float, duration: float) -> None:
+        with self._lock:
+            self.spans.append((stage, start - self.started, duration))
+
+    def decide(self, stage: str, count: int = 1) -> None:
+        if count <= 0:
+            return
+        with self._lock:
+            self.decisions[stage] = self.decisions.get(stage, 0) + count
+
+    @property
+    def decision(self) -> Optional[str]:
+        """The deciding stage, 'stage=count' pairs for a batch, or None."""
+        with self._lock:
+            decisions = dict(self.decisions)
+        if not decisions:
+            return None
+        if len(decisions) == 1 and sum(decisions.values()) == 1:
+            return next(iter(decisions))
+        return ' '.join(f"{stage}={count}" for stage, count in decisions.items())
+
+    def finish(self) -> 'Trace':
+        if self.duration is None:
+            self.duration = time.perf_counter() - self.started
+        return self
+
+    def totals(self) -> Dict[str, Tuple[float, int]]:
+        """Stage -> (total seconds, span count), in order of first appearance."""
+        totals: Dict[str, Tuple[float, int]] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for stage, _, duration in spans:
+            total, count = totals.get(stage, (0.0, 0))
+            totals[stage] = (total + duration, count + 1)
+        return totals
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: one metric per stage, the total, and the deciding stage."""
+        parts = []
+        for stage, (total, count) in self.totals().items():
+            part = f"{stage};dur={total * 1000:.3f}"
+            if count > 1:
+                part += f';desc="x{count}"'
+            parts.append(part)
+        elapsed = self.duration if self.duration is not None else time.perf_counter() - self.started
+        parts.append(f"total;dur={elapsed * 1000:.3f}")
+        decision = self.decision
+        if decision:
+            parts.append(f'decision;desc="{decision}"')
+        return ', '.join(parts)
+
+    def to_dict(self) -> dict:
+        """JSON-serializable trace: spans with start offsets and durations in milliseconds."""
+        with self._lock:
+            spans = list(self.spans)
+        elapsed = self.duration if self.duration is not None else time.perf_counter() - self.started
+        return {
+            'name': self.name,
+            'decision': self.decision,
+            'decisions': dict(self.decisions),
+            'total_ms': round(elapsed * 1000, 3),
+            'spans': [
+                {'stage': stage, 'start_ms': round(offset * 1000, 3), 'duration_ms': round(duration * 1000, 3)}
+                for stage, offset, duration in spans
+            ],
+        }
+
+
+class span:
+    """Context manager timing one pipeline stage.
+
+    The duration goes to the active trace (if any) and, unless metric is
+    False, to the stage histogram.
+    """
+
+    __slots__ = ('stage', 'metric', 'start')
+
+    def __init__(self, stage: str, metric: bool = True):
+        self.stage = stage
+        self.metric = metric
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.start
+        trace = _current.get()
+        if trace is not None:
+            trace.add_span(self.stage, self.start, duration)
+        if self.metric:
+            STAGE_SECONDS.observe(duration, stage=self.stage)
+        return False
+
+
+def decided_by(stage: str, count: int = 1) -> None:
+    """Record the stage that settled the verdict (of count URLs, for a batch) in the active trace."""
+    trace = _current.get()
+    if trace is not None:
+        trace.decide(stage, count)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def start_trace(name: str = 'request') -> Tuple[Trace, object]:
+    """Make a new Trace the active one; returns (trace, token for end_trace)."""
+    trace = Trace(name)
+    return trace, _current.set(trace)
+
+
+def end_trace(token) -> None:
+    """Restore the trace that was active before start_trace."""
+    try:
+        _current.reset(token)
+    except ValueError:  # Token from another context (the server switched contexts mid-request)
+        _current.set(None)
+
+
+def add_server_timing_headers(headers: MutableMapping[str, str], trace: Trace,
+                              origin: Optional[str], allowed_origins: Sequence[str]) -> None:
+    """Set Server-Timing for trace and expose it to the CORS origins the app allows.
+
+    Access-Control-Expose-Headers is merged with whatever the CORS handlers
+    already set, so call this after them. Timing-Allow-Origin names the
+    request's origin only when it matches allowed_origins (fnmatch patterns
+    such as 'chrome-extension://*'); same-origin callers see timings anyway.
+    """
+    headers['Server-Timing'] = trace.finish().server_timing()
+    exposed: Dict[str, str] = {}  # Lowercased name -> name as first written
+    for name in (headers.get('Access-Control-Expose-Headers') or '').split(',') + ['Server-Timing']:
+        name = name.strip()
+        if name:
+            exposed.setdefault(name.lower(), name)
+    headers['Access-Control-Expose-Headers'] = ', '.join(exposed.values())
+    if origin and origin != 'null' and any(fnmatch.fnmatchcase(origin, allowed) for allowed in allowed_origins):
+        headers['Timing-Allow-Origin'] = origin
@@ -0,0 +1,172 @@
+"""
+In-process verdict cache for Eclipse Shield.
+A striped LRU cache with per-entry TTL and entry/byte budgets. Each entry is
+one record (value, tag, expiry, size); recency is kept by an ordered dict and
+expiry by a min-heap per stripe, so lookups, inserts and expiry cost O(1) /
+O(log n) instead of a scan of every key. Keys are spread over independently
+locked stripes so threaded workers do not serialize on one lock.
+"""
+
+import heapq
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+def approximate_size(value: Any) -> int:
+    """Rough deep size in bytes of a JSON-like value (dicts, lists, strings, numbers)."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += approximate_size(key) + approximate_size(item)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += approximate_size(item)
+    return size
+
+
+class _Entry:
+    __slots__ = ('value', 'tag', 'expires_at', 'size', 'seq')
+
+    def __init__(self, value: Any, tag: Any, expires_at: float, size: int, seq: int):
+        self.value = value
+        self.tag = tag
+        self.expires_at = expires_at
+        self.size = size
+        self.seq = seq
+
+
+class _Stripe:
+    __slots__ = ('lock', 'entries', 'heap', 'bytes')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: 'OrderedDict[Hashable, _Entry]' = OrderedDict()
+        self.heap: List[Tuple[float, int, Hashable]] = []  # (expires_at, seq, key); stale records skipped
+        self.bytes = 0
+
+
+class TTLCache:
+    """Striped LRU + TTL cache with an entry count and byte budget.
+
+    get(key, tag) returns the cached value only if it has not expired and was
+    stored with an equal tag (used for the per-session check on verdicts).
+    Budgets are divided evenly between stripes; exceeding one evicts that
+    stripe's least recently used entries.
+    """
+
+    def __init__(self, ttl: float, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 stripes: int = 16, sizeof: Callable[[Any], int] = approximate_size,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self._stripes = [_Stripe() for _ in range(max(1, stripes))]
+        count = len(self._stripes)
+        self._max_entries = -(-max_entries // count) if max_entries else None
+        self._max_bytes = -(-max_bytes // count) if max_bytes else None
+        self._sizeof = sizeof
+        self._clock = clock
+        self._seq = 0
+        self._seq_lock = threading.Lock()
+
+    def _stripe(self, key: Hashable) -> _Stripe:
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    def _next_seq(self) -> int:
+        with self._seq_lock:
+            self._seq += 1
+            return self._seq
+
+    def __len__(self) -> int:
+        return sum(len(stripe.entries) for stripe in self._stripes)
+
+    @property
+    def bytes(self) -> int:
+        return sum(stripe.bytes for stripe in self._stripes)
+
+    def get(self, key: Hashable, tag: Any = None) -> Optional[Any]:
+        stripe = self._stripe(key)
+        with stripe.lock:
+            entry = stripe.entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= self._clock():
+                self._remove(stripe, key)
+                return None
+            if entry.tag != tag:
+                return None
+            stripe.entries.move_to_end(key)
+            return entry.value
+
+    def set(self, key: Hashable, value: Any, tag: Any = None, ttl: Optional[float] = None) -> None:
+        now = self._clock()
+        entry = _Entry(value, tag, now + (self.ttl if ttl is None else ttl), self._sizeof(value), self._next_seq())
+        stripe = self._stripe(key)
+        with stripe.lock:
+            self._expire_stripe(stripe, now)
+            if key in stripe.entries:
+                self._remove(stripe, key)
+            stripe.entries[key] = entry
+            stripe.bytes += entry.size
+            heapq.heappush(stripe.heap, (entry.expires_at, entry.seq, key))
+            self._enforce_budget(stripe)
+
+    def delete(self, key: Hashable) -> None:
+        stripe = self._stripe(key)
+        with stripe.lock:
+            if key in stripe.entries:
+                self._remove(stripe, key)
+
+    def delete_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Remove every entry whose key satisfies predicate; returns the count (scans all keys)."""
+        removed = 0
+        for stripe in self._stripes:
+            with stripe.lock:
+                for key in [key for key in stripe.entries if predicate(key)]:
+                    self._remove(stripe, key)
+                    removed += 1
+        return removed
+
+    def expire(self) -> int:
+        """Drop expired entries from every stripe; returns the count."""
+        now = self._clock()
+        removed = 0
+        for stripe in self._stripes:
+            with stripe.lock:
+                removed += self._expire_stripe(stripe, now)
+        return removed
+
+    def clear(self) -> None:
+        for stripe in self._stripes:
+            with stripe.lock:
+                stripe.entries.clear()
+                stripe.heap.clear()
+                stripe.bytes = 0
+
+    # The helpers below expect stripe.lock to be held.
+
+    def _remove(self, stripe: _Stripe, key: Hashable) -> None:
+        entry = stripe.entries.pop(key)
+        stripe.bytes -= entry.size
+
+    def _expire_stripe(self, stripe: _Stripe, now: float) -> int:
+        removed = 0
+        heap = stripe.heap
+        while heap and heap[0][0] <= now:
+            _, seq, key = heapq.heappop(heap)
+            entry = stripe.entries.get(key)
+            if entry is not None and entry.seq == seq:
+                self._remove(stripe, key)
+                removed += 1
+        # Overwritten/evicted entries leave stale heap records; rebuild before they dominate.
+        if len(heap) > 2 * len(stripe.entries) + 64:
+            stripe.heap = [(entry.expires_at, entry.seq, key) for key, entry in stripe.entries.items()]
+            heapq.heapify(stripe.heap)
+        return removed
+
+    def _enforce_budget(self, stripe: _Stripe) -> None:
+        while stripe.entries and (
+            (self._max_entries is not None and len(stripe.entries) > self._max_entries) or
+            (self._max_bytes is not None and stripe.bytes > self._max_bytes)
+        ):
+            self._remove(stripe, next(iter(stripe.entries)))
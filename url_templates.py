@@ -0,0 +1,197 @@
+"""
+URL template verdicts for Eclipse Shield.
+Video pages, threads and docs pages on one site usually get the same AI
+verdict, yet each distinct URL is its own verdict-store key. This module
+reduces URLs to templates per host (ID-like path segments and query values
+become '*', e.g. youtube.com/watch?v=* or docs.python.org/3/library/*.html),
+tracks how often the model agreed on each template under a given domain,
+policy version and task context, and answers new URLs from templates whose
+verdicts have been consistent. Every Nth such answer is sent to the model
+anyway so a template that stops being right loses its confidence.
+"""
+
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from canonical import canonical_url
+
+logger = logging.getLogger(__name__)
+
+# Templates tracked per worker (0 disables template verdicts)
+URL_TEMPLATE_CACHE_SIZE = int(os.getenv("ECLIPSE_SHIELD_URL_TEMPLATE_CACHE_SIZE", "5000"))
+# Model verdicts a template needs before it answers on its own
+URL_TEMPLATE_MIN_SAMPLES = int(os.getenv("ECLIPSE_SHIELD_URL_TEMPLATE_MIN_SAMPLES", "3"))
+# Share of those verdicts that must agree
+URL_TEMPLATE_MIN_AGREEMENT = float(os.getenv("ECLIPSE_SHIELD_URL_TEMPLATE_MIN_AGREEMENT", "0.9"))
+# Every Nth URL a template could answer goes to the model instead (0 never re-verifies)
+URL_TEMPLATE_VERIFY_EVERY = int(os.getenv("ECLIPSE_SHIELD_URL_TEMPLATE_VERIFY_EVERY", "20"))
+
+# Counts are halved past this many verdicts, so recent verdicts outweigh old ones
+_MAX_SAMPLES = 50
+
+_UUID = re.compile(r"^[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}$", re.IGNORECASE)
+_HEX = re.compile(r"^(?=.*\d)[0-9a-f]{8,}$", re.IGNORECASE)
+_NUMBER = re.compile(r"^\d{3,}$")
+_TOKEN = re.compile(r"^[A-Za-z0-9_-]{6,}$")
+_PAGE_FILE = re.compile(r"^.+\.(html?|php|aspx?|jsp|md|txt|pdf)$", re.IGNORECASE)
+_ENUM_VALUE = re.compile(r"^[a-z]{1,16}$")
+
+
+def _is_id_like(segment: str) -> bool:
+    """Numbers, UUIDs, hashes, opaque tokens ('dQw4w9WgXcQ', '1abc2x') and title slugs."""
+    if _NUMBER.match(segment) or _UUID.match(segment) or _HEX.match(segment):
+        return True
+    if _TOKEN.match(segment) and any(char.isalpha() for char in segment):
+        digits = sum(char.isdigit() for char in segment)
+        mixed_case = segment.lower() != segment and segment.upper() != segment
+        if digits >= 2 or (digits and mixed_case):
+            return True
+    # 'how-to-read-a-file' or 'some_thread_title': three or more words
+    return len(re.findall(r"[-_]", segment)) >= 2
+
+
+def url_template(url: str) -> Optional[str]:
+    """Template of url (host without 'www.', generalized path and query).
+
+    None when nothing in the URL is generalized: such a template would only
+    ever match the URL itself, which the verdict store already covers.
+
+    >>> url_template('https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42')
+    'youtube.com/watch?t=*&v=*'
+    >>> url_template('https://docs.python.org/3/library/os.html')
+    'docs.python.org/3/library/*.html'
+    """
+    try:
+        parts = urlsplit(canonical_url(url))
+    except ValueError:
+        return None
+    host = parts.hostname or ''
+    if not host:
+        return None
+    if host.startswith('www.'):
+        host = host[4:]
+
+    segments = [segment for segment in parts.path.split('/') if segment]
+    template = []
+    generalized = False
+    for position, segment in enumerate(segments):
+        page = _PAGE_FILE.match(segment) if position == len(segments) - 1 else None
+        if page:
+            template.append(f"*.{page.group(1).lower()}")
+            generalized = True
+        elif _is_id_like(segment):
+            template.append('*')
+            generalized = True
+        else:
+            template.append(segment.lower())
+
+    result = host + '/' + '/'.join(template)
+    if parts.query:
+        params = []
+        for name, value in parse_qsl(parts.query, keep_blank_values=True):
+            if not _ENUM_VALUE.match(value):
+                value = '*'
+                generalized = True
+            params.append(f"{name}={value}")
+        result += '?' + '&'.join(sorted(params))
+    return result if generalized else None
+
+
+class _TemplateStats:
+    __slots__ = ('allow', 'block', 'explanations', 'answered')
+
+    def __init__(self):
+        self.allow = 0
+        self.block = 0
+        self.explanations = {True: '', False: ''}  # Latest model explanation per verdict
+        self.answered = 0  # URLs this template could have answered
+
+    def majority(self) -> Tuple[bool, int, int]:
+        """(majority verdict, its count, total count)."""
+        total = self.allow + self.block
+        if self.allow >= self.block:
+            return True, self.allow, total
+        return False, self.block, total
+
+
+class TemplateVerdicts:
+    """LRU of per-template verdict counts keyed by (domain, policy version, context fingerprint, template).
+
+    lookup() returns a result for URLs whose template has at least
+    min_samples model verdicts agreeing at least min_agreement of the time,
+    except for every verify_every-th such URL, which is left to the model.
+    record() feeds model verdicts back in.
+    """
+
+    def __init__(self, maxsize: int = URL_TEMPLATE_CACHE_SIZE, min_samples: int = URL_TEMPLATE_MIN_SAMPLES,
+                 min_agreement: float = URL_TEMPLATE_MIN_AGREEMENT, verify_every: int = URL_TEMPLATE_VERIFY_EVERY):
+        self.maxsize = maxsize
+        self.min_samples = max(1, min_samples)
+        self.min_agreement = min_agreement
+        self.verify_every = verify_every
+        self._stats: 'OrderedDict[Tuple[str, str, str, str], _TemplateStats]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def lookup(self, key: Tuple[str, str, str, str]) -> Optional[dict]:
+        """The template's verdict as an analysis result, or None if it is not confident (or due a re-check)."""
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                return None
+            self._stats.move_to_end(key)
+            verdict, agreeing, total = stats.majority()
+            if total < self.min_samples or agreeing < self.min_agreement * total:
+                return None
+            stats.answered += 1
+            if self.verify_every > 0 and stats.answered % self.verify_every == 0:
+                logger.debug("TemplateVerdicts.lookup - re-verifying %s with the model", key[3])
+                return None
+            explanation = stats.explanations[verdict]
+        return {
+            'isProductive': verdict,
+            'explanation': f"Same verdict as {agreeing} of {total} similar pages ({key[3]}): {explanation}",
+        }
+
+    def record(self, key: Tuple[str, str, str, str], result: dict) -> None:
+        """Count a model verdict for the template."""
+        verdict = bool(result.get('isProductive'))
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _TemplateStats()
+                while len(self._stats) > self.maxsize:
+                    self._stats.popitem(last=False)
+            else:
+                self._stats.move_to_end(key)
+            if verdict:
+                stats.allow += 1
+            else:
+                stats.block += 1
+            if stats.allow + stats.block > _MAX_SAMPLES:
+                stats.allow //= 2
+                stats.block //= 2
+            stats.explanations[verdict] = str(result.get('explanation', ''))
+
+
+def template_key(url: str, domain: str, policy_version: str, fingerprint: str) -> Optional[Tuple[str, str, str, str]]:
+    """TemplateVerdicts key for url, or None when it has no template."""
+    template = url_template(url)
+    if template is None:
+        return None
+    return domain, policy_version, fingerprint, template
+
+
+def open_template_verdicts(maxsize: int = URL_TEMPLATE_CACHE_SIZE) -> Optional[TemplateVerdicts]:
+    """The configured template verdict cache, or None when it is disabled."""
+    if maxsize <= 0:
+        logger.info("open_template_verdicts - URL template verdicts disabled")
+        return None
+    return TemplateVerdicts(maxsize)
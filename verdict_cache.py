@@ -0,0 +1,219 @@
+"""
+Shared verdict cache for Eclipse Shield.
+A pluggable key/value cache for /analyze results that every gunicorn worker
+(and every node) can see, so adding workers raises the hit rate instead of
+splitting it. Redis is used when REDIS_URL is set; an in-process backend with
+the same interface serves tests and single-process setups. A short-lived
+local near-cache sits in front of remote backends to absorb repeat reads.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Optional
+
+from verdict_store import verdict_key
+
+try:
+    import redis
+except ImportError:  # Optional dependency; the shared cache is simply not used without it
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "")
+# Seconds a verdict read from the shared backend is reused without asking it again
+NEAR_CACHE_TTL = float(os.getenv("ECLIPSE_SHIELD_NEAR_CACHE_TTL", "5"))
+NEAR_CACHE_MAX_ENTRIES = int(os.getenv("ECLIPSE_SHIELD_NEAR_CACHE_MAX_ENTRIES", "10000"))
+KEY_PREFIX = "eclipse-shield:verdict:"
+
+
+def shared_verdict_key(policy_version: str, domain: str, context: Any, url: str) -> str:
+    """Shared-cache key, built like the verdict store's: policy version, domain,
+    context fingerprint and canonical URL.
+
+    Sessions asking about the same URL with the same context share an entry; the
+    policy version makes a settings reload bypass old entries.
+    """
+    return verdict_key(url, domain, policy_version, context)
+
+
+class VerdictCacheBackend(ABC):
+    """Interface of a verdict cache backend.
+
+    Values are JSON-serializable dicts. get_many/set_many/delete_many are the
+    primitives every backend implements (one round trip each on remote
+    backends); get/set are conveniences.
+    """
+
+    @abstractmethod
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Values for the keys that are present and not expired."""
+
+    @abstractmethod
+    def set_many(self, items: Dict[str, Any], ttl: float) -> None:
+        """Store every item for ttl seconds."""
+
+    @abstractmethod
+    def delete_many(self, keys: Iterable[str]) -> None:
+        """Drop the keys (missing keys are ignored)."""
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_many([key]).get(key)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.set_many({key: value}, ttl)
+
+
+class InMemoryBackend(VerdictCacheBackend):
+    """Process-local backend with per-entry TTL, used for tests and without Redis."""
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries
+        self._entries: Dict[str, tuple] = {}  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[0] <= now:
+                    del self._entries[key]
+                else:
+                    found[key] = entry[1]
+        return found
+
+    def set_many(self, items: Dict[str, Any], ttl: float) -> None:
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            for key, value in items.items():
+                self._entries.pop(key, None)  # Re-insert so dict order tracks recency
+                self._entries[key] = (expires_at, value)
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    del self._entries[next(iter(self._entries))]
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend(VerdictCacheBackend):
+    """Redis backend; reads use one MGET and writes one pipelined batch of SET ... PX."""
+
+    def __init__(self, url: str, prefix: str = KEY_PREFIX, client=None):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("The redis package is required for the Redis verdict cache")
+            client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.client = client
+        self.prefix = prefix
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        raw_values = self.client.mget([self.prefix + key for key in keys])
+        found = {}
+        for key, raw in zip(keys, raw_values):
+            if raw is None:
+                continue
+            try:
+                found[key] = json.loads(raw)
+            except ValueError:
+                logger.warning("RedisBackend.get_many - discarding undecodable entry for %s", key)
+        return found
+
+    def set_many(self, items: Dict[str, Any], ttl: float) -> None:
+        if not items:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.set(self.prefix + key, json.dumps(value), px=max(1, int(ttl * 1000)))
+        pipe.execute()
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        keys = [self.prefix + key for key in keys]
+        if keys:
+            self.client.delete(*keys)
+
+
+class NearCache(VerdictCacheBackend):
+    """Local short-TTL cache in front of a shared backend.
+
+    Backend failures are logged and treated as misses (reads) or dropped
+    (writes): the shared cache is an optimization and must never fail a
+    request.
+    """
+
+    def __init__(self, backend: VerdictCacheBackend, local_ttl: float = NEAR_CACHE_TTL,
+                 max_entries: int = NEAR_CACHE_MAX_ENTRIES):
+        self.backend = backend
+        self.local_ttl = local_ttl
+        self.local = InMemoryBackend(max_entries=max_entries)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        found = self.local.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            try:
+                remote = self.backend.get_many(missing)
+            except Exception as e:
+                logger.warning("NearCache.get_many - shared backend unavailable: %s", e)
+                remote = {}
+            if remote and self.local_ttl:
+                self.local.set_many(remote, self.local_ttl)
+            found.update(remote)
+        return found
+
+    def set_many(self, items: Dict[str, Any], ttl: float) -> None:
+        if self.local_ttl:
+            self.local.set_many(items, min(ttl, self.local_ttl))
+        try:
+            self.backend.set_many(items, ttl)
+        except Exception as e:
+            logger.warning("NearCache.set_many - shared backend unavailable: %s", e)
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        self.local.delete_many(keys)
+        try:
+            self.backend.delete_many(keys)
+        except Exception as e:
+            logger.warning("NearCache.delete_many - shared backend unavailable: %s", e)
+
+
+def create_verdict_cache(redis_url: str = REDIS_URL) -> Optional[VerdictCacheBackend]:
+    """Build the shared verdict cache from configuration.
+
+    Returns a near-cached Redis backend when redis_url is set and the redis
+    package is installed, otherwise None (each worker keeps only its own cache).
+    """
+    if not redis_url:
+        return None
+    if redis is None:
+        logger.warning("create_verdict_cache - REDIS_URL is set but the redis package is not installed; shared cache disabled")
+        return None
+    try:
+        backend = RedisBackend(redis_url)
+    except Exception as e:
+        logger.warning("create_verdict_cache - could not create Redis client: %s; shared cache disabled", e)
+        return None
+    logger.info("create_verdict_cache - using Redis for the shared verdict cache")
+    return NearCache(backend)
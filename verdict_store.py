@@ -0,0 +1,138 @@
+"""
+Persistent verdict store for Eclipse Shield.
+Keeps AI verdicts in a SQLite database (WAL mode) shared by every worker, so
+gunicorn worker recycling and service restarts do not send popular URLs back
+to the model. Entries are keyed by normalized URL, domain, policy version and
+task-context fingerprint, and expire after a TTL chosen by verdict source.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from coalesce import coalesce_key
+
+logger = logging.getLogger(__name__)
+
+# Empty string disables the store
+VERDICT_DB = os.getenv(
+    "ECLIPSE_SHIELD_VERDICT_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "verdicts.sqlite3")
+)
+
+# Verdict sources
+SOURCE_AI = 'ai'                    # Model answered ALLOW/BLOCK
+SOURCE_AI_FALLBACK = 'ai_fallback'  # Model answered, but not in the expected format
+
+DEFAULT_TTLS = {
+    SOURCE_AI: float(os.getenv("ECLIPSE_SHIELD_VERDICT_TTL_AI", "86400")),
+    SOURCE_AI_FALLBACK: float(os.getenv("ECLIPSE_SHIELD_VERDICT_TTL_AI_FALLBACK", "300")),
+}
+
+_PRUNE_EVERY = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    key TEXT PRIMARY KEY,
+    is_productive INTEGER NOT NULL,
+    explanation TEXT NOT NULL,
+    source TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+
+def verdict_key(url: str, domain: str, policy_version: str, context) -> str:
+    """Store key: policy version + normalized URL, domain and context fingerprint."""
+    return f"{policy_version}|{coalesce_key(url, domain, context)}"
+
+
+class VerdictStore:
+    """SQLite-backed verdict cache safe to share between threads and processes.
+
+    Each thread gets its own connection; WAL mode lets readers in every worker
+    proceed while one writer commits. Storage errors are logged and treated as
+    misses so the store can never fail an analysis.
+    """
+
+    def __init__(self, path: str = VERDICT_DB, ttls: Optional[Dict[str, float]] = None):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        try:
+            self._connection().execute(_SCHEMA)
+            self.prune()
+        except sqlite3.Error as e:
+            logger.warning("VerdictStore.__init__ - verdict store at %s unavailable: %s", path, e)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            # Connections must not cross a fork (gunicorn preload_app), so reopen per pid.
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the stored result for key, or None if missing or expired."""
+        try:
+            row = self._connection().execute(
+                "SELECT is_productive, explanation FROM verdicts WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("VerdictStore.get - lookup failed: %s", e)
+            return None
+        if row is None:
+            return None
+        return {'isProductive': bool(row[0]), 'explanation': row[1]}
+
+    def put(self, key: str, result: dict, source: str) -> None:
+        """Store an analysis result; sources without a TTL are not stored."""
+        ttl = self.ttls.get(source)
+        if not ttl or ttl <= 0:
+            return
+        now = time.time()
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO verdicts (key, is_productive, explanation, source, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, int(bool(result.get('isProductive'))), str(result.get('explanation', '')), source, now, now + ttl)
+            )
+        except sqlite3.Error as e:
+            logger.warning("VerdictStore.put - write failed: %s", e)
+            return
+
+        with self._writes_lock:
+            self._writes += 1
+            due = self._writes % _PRUNE_EVERY == 0
+        if due:
+            self.prune()
+
+    def prune(self) -> int:
+        """Delete expired entries; returns how many were removed."""
+        try:
+            cursor = self._connection().execute("DELETE FROM verdicts WHERE expires_at <= ?", (time.time(),))
+            if cursor.rowcount:
+                logger.debug("VerdictStore.prune - removed %s expired verdicts", cursor.rowcount)
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.warning("VerdictStore.prune - failed: %s", e)
+            return 0
+
+
+def open_verdict_store(path: str = VERDICT_DB) -> Optional[VerdictStore]:
+    """Open the configured store, or None when it is disabled."""
+    if not path:
+        logger.info("open_verdict_store - persistent verdict store disabled")
+        return None
+    return VerdictStore(path)
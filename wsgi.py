@@ -14,53 +14,46 @@ from logging.handlers import RotatingFileHandler
 project_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_dir)
 
+from log_config import LOG_FORMAT, LOG_LEVEL, configure_logging
+
 # Configure production logging
 def setup_production_logging():
-    """Configure production-grade logging with rotation."""
+    """Configure production-grade logging with rotation.
+
+    Handlers are served by a background queue listener (see log_config), so
+    request threads only enqueue records and never wait on file or console I/O.
+    """
+    formatter = logging.Formatter(LOG_FORMAT)
+
     # Skip file logging in Docker environments
     if os.getenv('RUNNING_IN_DOCKER') or os.path.exists('/.dockerenv'):
         # Use console logging only in Docker
         console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        formatter = logging.Formatter(
-            '%(asctime)s %(name)s %(levelname)s %(filename)s:%(lineno)d %(message)s'
-        )
         console_handler.setFormatter(formatter)
-        
-        root_logger = logging.getLogger()
-        root_logger.setLevel(logging.INFO)
-        root_logger.addHandler(console_handler)
+        configure_logging([console_handler], level=LOG_LEVEL)
         return
     
     # File logging for non-Docker environments
-    log_dir = os.path.join(project_dir, 'logs')
-    os.makedirs(log_dir, exist_ok=True)
+    log_file = os.getenv('LOG_FILE') or os.path.join(project_dir, 'logs', 'eclipse_shield.log')
+    if not os.path.isabs(log_file):
+        log_file = os.path.join(project_dir, log_file)
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
     
     # Create rotating file handler
-    log_file = os.path.join(log_dir, 'eclipse_shield.log')
     file_handler = RotatingFileHandler(
         log_file,
         maxBytes=10*1024*1024,  # 10MB
         backupCount=10,
         encoding='utf-8'
     )
-    
-    # Set log format
-    formatter = logging.Formatter(
-        '%(asctime)s %(name)s %(levelname)s %(filename)s:%(lineno)d %(message)s'
-    )
     file_handler.setFormatter(formatter)
     
-    # Configure root logger
-    root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(file_handler)
-    
     # Add console handler for errors
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.ERROR)
     console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
+
+    configure_logging([file_handler, console_handler], level=LOG_LEVEL)
 
 # Setup logging for production
 setup_production_logging()